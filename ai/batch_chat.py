@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Batch Chat for Bulk Offline Generation
+Runs a JSONL file of chat requests through LLMManager with bounded concurrency,
+retries and per-provider rate limits, streaming results to JSONL as they finish.
+The output file doubles as the checkpoint: a rerun skips ids already written.
+
+Input lines: {"id": "q1", "message": "...", "system_prompt": "...",
+              "provider": "deepseek", "max_tokens": 500}
+(only id and message are required; qa_sft_dataset.json is accepted too)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Set
+
+from metrics import counter
+from token_accounting import CallUsage
+
+BATCH_ITEMS = counter('batch_chat_items_total', "Batch chat requests by outcome (ok|failed|skipped)",
+                      ['status'])
+BATCH_RETRIES = counter('batch_chat_retries_total', "Batch chat attempts retried", ['provider'])
+
+
+class TokenBucket:
+    """Per-minute rate limiter (bursts up to `burst`); also budgets prefetch tokens in the bridge"""
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst or max(1, int(self.rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        """Take `amount` tokens if they are available; never blocks"""
+        with self._lock:
+            self._refill()
+            if amount > self._tokens:
+                return False
+            self._tokens -= amount
+            return True
+
+    async def acquire(self):
+        """Wait for one token"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    ok: int = 0
+    failed: int = 0
+    skipped: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    elapsed: float = 0.0
+    by_provider: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {**vars(self), 'cost_usd': round(self.cost_usd, 6), 'elapsed': round(self.elapsed, 2)}
+
+
+def iter_requests(path: str) -> Iterator[Dict]:
+    """Requests from a JSONL file, or the qa_pairs of a qa_sft_dataset.json-style file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            for pair in json.load(f).get('qa_pairs', []):
+                yield {'id': pair['id'], 'message': pair['question']}
+            return
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                request = json.loads(line)
+                request.setdefault('id', line_no)
+                yield request
+
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Ids already written to output_path; drops a torn last line left by a crash"""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, 'rb+') as f:
+        valid_end = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                done.add(str(json.loads(line)['id']))
+            except (ValueError, KeyError):
+                break
+            valid_end += len(line)
+        f.truncate(valid_end)
+    return done
+
+
+def parse_rate_limits(specs) -> Dict[str, float]:
+    """['deepseek=60', 'openai=500'] -> requests per minute by provider"""
+    limits = {}
+    for spec in specs or []:
+        provider, _, rpm = spec.partition('=')
+        limits[provider.strip().lower()] = float(rpm)
+    return limits
+
+
+async def _call_with_retries(manager, request: Dict, provider: str, bucket: Optional[TokenBucket],
+                             default_system_prompt: Optional[str], max_tokens: int, max_retries: int,
+                             backoff: float, stats: BatchStats) -> Dict:
+    attempt = 0
+    while True:
+        attempt += 1
+        if bucket is not None:
+            await bucket.acquire()
+        usage = CallUsage('batch')
+        started = time.perf_counter()
+        try:
+            response = await manager.chat(request['message'], request.get('system_prompt', default_system_prompt),
+                                          provider=provider, max_tokens=request.get('max_tokens', max_tokens),
+                                          usage=usage)
+            # LLMManager reports provider failures in-band
+            error = response if not response or response.startswith('❌') else None
+        except Exception as e:
+            response, error = None, f"❌ {type(e).__name__}: {e}"
+
+        if error is None:
+            return {
+                'id': request['id'],
+                'provider': provider,
+                'response': response,
+                'usage': usage.to_dict(),
+                'attempts': attempt,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+        if attempt > max_retries:
+            return {'id': request['id'], 'provider': provider, 'error': error or '❌ Empty response',
+                    'attempts': attempt}
+
+        stats.retries += 1
+        BATCH_RETRIES.labels(provider).inc()
+        # Exponential backoff with full jitter
+        await asyncio.sleep(random.uniform(0, backoff * 2 ** (attempt - 1)))
+
+
+async def run_batch(manager, requests_iter, output_path: str, concurrency: int = 8,
+                    rate_limits: Optional[Dict[str, float]] = None, default_provider: Optional[str] = None,
+                    system_prompt: Optional[str] = None, max_tokens: int = 500, max_retries: int = 3,
+                    backoff: float = 1.0, resume: bool = True, progress_every: int = 100) -> BatchStats:
+    """
+    Run every request and append one JSON line per result to output_path
+
+    Successful results go to output_path as soon as they finish (so the file is the
+    resume checkpoint); requests that still fail after max_retries go to
+    `<output_path>.failed.jsonl` and are attempted again on the next run.
+
+    Args:
+        concurrency: Requests in flight at once
+        rate_limits: provider -> requests per minute (unlimited when absent)
+        default_provider: Provider for requests without a "provider" field (default: primary)
+        system_prompt: System prompt for requests without one
+    """
+    stats = BatchStats()
+    done = completed_ids(output_path) if resume else set()
+    if done:
+        print(f"⏩ Resuming: {len(done)} requests already in {output_path}")
+    buckets = {provider: TokenBucket(rpm) for provider, rpm in (rate_limits or {}).items()}
+    default_provider = (default_provider or manager.primary_provider).lower()
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    started = time.perf_counter()
+
+    with open(output_path, 'a' if resume else 'w', encoding='utf-8') as out, \
+            open(output_path + '.failed.jsonl', 'w', encoding='utf-8') as failed_out:
+
+        def write(f, record: Dict):
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+
+        async def worker():
+            while True:
+                request = await queue.get()
+                if request is None:
+                    return
+                provider = (request.get('provider') or default_provider).lower()
+                result = await _call_with_retries(manager, request, provider, buckets.get(provider), system_prompt,
+                                                  max_tokens, max_retries, backoff, stats)
+                if 'error' in result:
+                    stats.failed += 1
+                    BATCH_ITEMS.labels('failed').inc()
+                    write(failed_out, result)
+                else:
+                    stats.ok += 1
+                    BATCH_ITEMS.labels('ok').inc()
+                    stats.prompt_tokens += result['usage']['prompt_tokens']
+                    stats.completion_tokens += result['usage']['completion_tokens']
+                    stats.cost_usd += result['usage']['cost_usd']
+                    stats.by_provider[provider] = stats.by_provider.get(provider, 0) + 1
+                    write(out, result)
+
+                finished = stats.ok + stats.failed
+                if progress_every and finished % progress_every == 0:
+                    rate = finished / (time.perf_counter() - started)
+                    print(f"🔄 {finished} done ({stats.failed} failed, {rate:.1f} req/s)")
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        for request in requests_iter:
+            stats.total += 1
+            if str(request['id']) in done:
+                stats.skipped += 1
+                BATCH_ITEMS.labels('skipped').inc()
+                continue
+            await queue.put(request)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    if not stats.failed:
+        os.remove(output_path + '.failed.jsonl')
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+if __name__ == '__main__':
+    from llm_client import LLMManager
+
+    parser = argparse.ArgumentParser(description="Run a JSONL file of chat requests through the LLM providers")
+    parser.add_argument('input', help="JSONL requests ({id, message, [system_prompt, provider, max_tokens]}) "
+                                      "or qa_sft_dataset.json")
+    parser.add_argument('output', help="Results JSONL (appended to; also the resume checkpoint)")
+    parser.add_argument('--provider', help="Default provider (default: PRIMARY_LLM or deepseek)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once")
+    parser.add_argument('--rate-limit', nargs='*', metavar='PROVIDER=RPM',
+                        help="Requests per minute per provider, e.g. deepseek=60 openai=500")
+    parser.add_argument('--max-retries', type=int, default=3, help="Retries per request after the first attempt")
+    parser.add_argument('--backoff', type=float, default=1.0, help="Base retry delay in seconds (doubles per retry)")
+    parser.add_argument('--max-tokens', type=int, default=500, help="Output token limit for requests without one")
+    parser.add_argument('--system-prompt-file', help="System prompt for requests without one")
+    parser.add_argument('--catalog-prompt', action='store_true',
+                        help="Use the furniture catalog system prompt for requests without one")
+    parser.add_argument('--no-resume', action='store_true', help="Overwrite the output instead of resuming")
+    args = parser.parse_args()
+
+    system_prompt = None
+    if args.system_prompt_file:
+        with open(args.system_prompt_file, 'r', encoding='utf-8') as f:
+            system_prompt = f.read()
+    elif args.catalog_prompt:
+        from system_prompt import SystemPromptBuilder
+        system_prompt = SystemPromptBuilder('data/products_catalog.json').build_base_prompt()
+
+    manager = LLMManager(primary_provider=args.provider or os.getenv('PRIMARY_LLM', 'deepseek'))
+    if not manager.list_providers():
+        raise SystemExit(1)
+
+    stats = asyncio.run(run_batch(
+        manager, iter_requests(args.input), args.output, concurrency=args.concurrency,
+        rate_limits=parse_rate_limits(args.rate_limit), default_provider=args.provider,
+        system_prompt=system_prompt, max_tokens=args.max_tokens, max_retries=args.max_retries,
+        backoff=args.backoff, resume=not args.no_resume,
+    ))
+    print(f"✅ {stats.ok} ok, {stats.failed} failed, {stats.skipped} skipped in {stats.elapsed:.1f}s "
+          f"({stats.prompt_tokens + stats.completion_tokens} tokens, ${stats.cost_usd:.4f})")
+    if stats.failed:
+        print(f"⚠️  Failures written to {args.output}.failed.jsonl; rerun to retry them")
+    print(json.dumps(stats.to_dict(), indent=2))
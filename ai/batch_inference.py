@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Micro-batching Scheduler for Image Inference
+Coalesces concurrent requests into a single batched forward pass
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import histogram, exponential_buckets
+from tracing import current_context, get_tracer
+
+QUEUE_WAIT = histogram('batch_queue_wait_seconds', "Time items spend queued before their batch runs",
+                       ['scheduler'])
+BATCH_SIZE = histogram('batch_size', "Items per executed batch", ['scheduler'],
+                       buckets=exponential_buckets(1, 2, 8))
+BATCH_SECONDS = histogram('batch_run_seconds', "batch_fn wall time per batch", ['scheduler'])
+
+
+@dataclass
+class BatchSettings:
+    """Latency/throughput trade-off for the scheduler"""
+    max_batch_size: int = 8      # flush as soon as this many items are queued
+    max_delay_ms: float = 10.0   # or when the oldest item has waited this long
+
+    @classmethod
+    def from_env(cls) -> 'BatchSettings':
+        """Read IMAGE_BATCH_MAX_SIZE / IMAGE_BATCH_MAX_DELAY_MS"""
+        return cls(
+            max_batch_size=max(1, int(os.getenv('IMAGE_BATCH_MAX_SIZE', 8))),
+            max_delay_ms=max(0.0, float(os.getenv('IMAGE_BATCH_MAX_DELAY_MS', 10))),
+        )
+
+
+class MicroBatchScheduler:
+    """Collects items from many threads and runs them through batch_fn together"""
+
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 settings: Optional[BatchSettings] = None, name: str = 'micro-batcher'):
+        """
+        Start the scheduler worker thread
+
+        Args:
+            batch_fn: Receives a list of items, returns one result per item (same order)
+            settings: Batch size / delay limits (read from env if None)
+            name: Worker thread name
+        """
+        self.batch_fn = batch_fn
+        self.settings = settings or BatchSettings.from_env()
+        self._queue_wait = QUEUE_WAIT.labels(name)
+        self._batch_size = BATCH_SIZE.labels(name)
+        self._batch_seconds = BATCH_SECONDS.labels(name)
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._closed = False
+        self._batches = 0
+        self._items = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item and return a future resolved with its result"""
+        if self._closed:
+            raise RuntimeError("Scheduler is closed")
+        future = Future()
+        # Trace context travels with the item so the worker can attribute queue wait
+        self._queue.put((item, future, time.perf_counter(), current_context()))
+        return future
+
+    def _collect(self) -> Optional[List[tuple]]:
+        """Block for the first item, then gather more until size or delay limit"""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = first[2] + self.settings.max_delay_ms / 1000.0
+        while len(batch) < self.settings.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is None:
+                # Re-queue the shutdown sentinel so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        """Worker loop: one batch_fn call per collected batch"""
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            # Drop callers that gave up before the batch started
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            started_ns = time.time_ns()
+            for _, _, enqueued, _ in batch:
+                self._queue_wait.observe(started - enqueued)
+            self._batch_size.observe(len(batch))
+
+            try:
+                results = self.batch_fn([item for item, _, _, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"batch_fn returned {len(results)} results for {len(batch)} items"
+                    )
+            except Exception as e:
+                for _, future, _, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            self._batch_seconds.observe(finished - started)
+            self._trace_batch(batch, started, started_ns, finished)
+            self._batches += 1
+            self._items += len(batch)
+            for (_, future, _, _), result in zip(batch, results):
+                future.set_result(result)
+
+    def _trace_batch(self, batch: List[tuple], started: float, started_ns: int, finished: float):
+        """Queue-wait and run spans for every sampled caller in the batch"""
+        tracer = get_tracer()
+        finished_ns = started_ns + int((finished - started) * 1e9)
+        for _, _, enqueued, parent in batch:
+            if parent is None or not parent.sampled:
+                continue
+            tracer.record_span('batch.queue_wait', started_ns - int((started - enqueued) * 1e9),
+                               started_ns, parent)
+            tracer.record_span('batch.run', started_ns, finished_ns, parent, {'batch_size': len(batch)})
+
+    def close(self, timeout: float = 5.0):
+        """Stop accepting work and let the worker drain the queue"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict:
+        """Batch counters for monitoring"""
+        return {
+            'batches': self._batches,
+            'items': self._items,
+            'avg_batch_size': self._items / self._batches if self._batches else 0.0,
+            'queued': self._queue.qsize(),
+            'max_batch_size': self.settings.max_batch_size,
+            'max_delay_ms': self.settings.max_delay_ms,
+        }
@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+"""
+Columnar Binary Store
+Compact, versioned on-disk format for the catalog, the QA dataset and image
+analysis results. A document's list of records is stored column by column:
+numbers as raw int64/float64 arrays, strings as codes into one interned string
+table, lists as offsets + values, dicts of floats (style/material/color scores)
+as float64 matrices, nested dicts as child columns, and anything irregular as
+interned JSON text.
+
+Opening a store reads only its small JSON header; columns are zero-copy numpy
+views over a read-only mmap, and a record is decoded the first time it is
+accessed. `path.xbs` next to `path.json` is used by load_document (and so
+load_catalog) whenever it is at least as new as the JSON.
+
+File layout (little endian):
+    b'XBST' | u32 version | u64 header length | JSON header | pad to 64 | sections
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+MAGIC = b'XBST'
+VERSION = 1
+SUFFIX = '.xbs'
+ALIGN = 64
+MIN_DICT_FILL = 0.5  # dicts whose keys are filled less than this on average are stored as JSON
+_PREAMBLE = struct.Struct('<4sIQ')
+_INT64 = (-2 ** 63, 2 ** 63 - 1)
+
+# Per-row state in a field's mask (stored only when some row is not PRESENT)
+ABSENT, PRESENT, NULL = 0, 1, 2
+
+
+class _Absent:
+    def __repr__(self):
+        return '<absent>'
+
+
+_ABSENT = _Absent()
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and _INT64[0] <= value <= _INT64[1]
+
+
+def _is_float(value) -> bool:
+    return isinstance(value, float) and value == value  # NaN has no JSON form to come back as
+
+
+def _infer_kind(values: List[Any]) -> str:
+    """Column kind for the present, non-null values of one field"""
+    present = [v for v in values if v is not _ABSENT and v is not None]
+    if not present:
+        return 'object'
+    if all(isinstance(v, bool) for v in present):
+        return 'bool'
+    if all(_is_int(v) for v in present):
+        return 'int'
+    # Mixed int/float stays JSON so 1 does not come back as 1.0
+    if all(_is_float(v) for v in present):
+        return 'float'
+    if all(isinstance(v, str) for v in present):
+        return 'str'
+    if all(isinstance(v, list) and all(isinstance(x, str) for x in v) for v in present):
+        return 'str_list'
+    if all(isinstance(v, list) and all(_is_int(x) for x in v) for v in present):
+        return 'int_list'
+    if all(isinstance(v, dict) for v in present):
+        if any(present) and all(_is_float(x) for v in present for x in v.values()):
+            return 'vector'
+        # Mostly-empty child columns cost more than they save: keep irregular dicts as JSON
+        keys = set(k for v in present for k in v)
+        if keys and sum(len(v) for v in present) / (len(keys) * len(present)) < MIN_DICT_FILL:
+            return 'object'
+        return 'dict'
+    return 'object'
+
+
+class _Writer:
+    """Aligned data sections plus the interned string table"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._size = 0
+        self._codes: Dict[str, int] = {}
+
+    def add(self, array: np.ndarray) -> Dict:
+        array = np.ascontiguousarray(array)
+        if array.dtype.byteorder == '>':
+            array = array.astype(array.dtype.newbyteorder('<'))
+        padding = _align(self._size) - self._size
+        if padding:
+            self._chunks.append(b'\0' * padding)
+        section = {'offset': self._size + padding, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        data = array.tobytes()
+        self._chunks.append(data)
+        self._size += padding + len(data)
+        return section
+
+    def intern(self, text: str) -> int:
+        code = self._codes.get(text)
+        if code is None:
+            code = self._codes[text] = len(self._codes)
+        return code
+
+    def string_table(self) -> Dict:
+        encoded = [text.encode('utf-8') for text in self._codes]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return {'count': len(encoded), 'offsets': self.add(offsets),
+                'blob': self.add(np.frombuffer(b''.join(encoded), dtype=np.uint8))}
+
+    def data(self) -> bytes:
+        return b''.join(self._chunks)
+
+
+def _encode_field(values: List[Any], writer: _Writer) -> Dict:
+    """Header entry for one field, its arrays appended to writer"""
+    kind = _infer_kind(values)
+    field: Dict[str, Any] = {'kind': kind}
+    state = np.array([ABSENT if v is _ABSENT else NULL if v is None else PRESENT for v in values], dtype=np.uint8)
+    if (state != PRESENT).any():
+        field['mask'] = writer.add(state)
+    present = [v if s == PRESENT else None for v, s in zip(values, state)]
+
+    if kind == 'bool':
+        field['data'] = writer.add(np.array([bool(v) for v in present], dtype=np.uint8))
+    elif kind == 'int':
+        field['data'] = writer.add(np.array([v if v is not None else 0 for v in present], dtype=np.int64))
+    elif kind == 'float':
+        field['data'] = writer.add(np.array([v if v is not None else np.nan for v in present], dtype=np.float64))
+    elif kind == 'str':
+        field['data'] = writer.add(np.array([writer.intern(v) if v is not None else 0 for v in present],
+                                            dtype=np.uint32))
+    elif kind == 'object':
+        field['data'] = writer.add(np.array(
+            [writer.intern(json.dumps(v, ensure_ascii=False, separators=(',', ':'))) if v is not None else 0
+             for v in present], dtype=np.uint32))
+    elif kind in ('str_list', 'int_list'):
+        lists = [v or [] for v in present]
+        offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum([len(v) for v in lists], out=offsets[1:])
+        flat = [x for v in lists for x in v]
+        field['offsets'] = writer.add(offsets)
+        field['data'] = writer.add(np.array([writer.intern(x) for x in flat], dtype=np.uint32)
+                                   if kind == 'str_list' else np.array(flat, dtype=np.int64))
+    elif kind == 'vector':
+        labels = list(dict.fromkeys(k for v in present if v for k in v))
+        matrix = np.full((len(present), len(labels)), np.nan, dtype=np.float64)
+        column = {label: j for j, label in enumerate(labels)}
+        for i, v in enumerate(present):
+            for label, x in (v or {}).items():
+                matrix[i, column[label]] = x
+        field['labels'] = labels
+        field['data'] = writer.add(matrix)
+    else:
+        field['children'] = _encode_children(present, writer)
+    return field
+
+
+def _encode_children(dicts: List[Optional[Dict]], writer: _Writer) -> List[Dict]:
+    """One child field per key seen in any of the dicts (first-seen order)"""
+    keys = list(dict.fromkeys(k for d in dicts if d for k in d))
+    return [
+        {'name': key, **_encode_field([d.get(key, _ABSENT) if d is not None else _ABSENT for d in dicts], writer)}
+        for key in keys
+    ]
+
+
+def write_store(path: str, document: Union[Dict, List[Dict]]):
+    """
+    Write a JSON-like document: a list of records, or a dict holding one
+    list of records (e.g. {"products": [...]}) plus small metadata
+    """
+    if isinstance(document, list):
+        records, records_key, meta, top_keys = document, None, {}, None
+    else:
+        records_key = next((k for k, v in document.items()
+                            if isinstance(v, list) and all(isinstance(r, dict) for r in v)), None)
+        if records_key is None:
+            raise ValueError("document has no list of records to store")
+        records = document[records_key]
+        meta = {k: v for k, v in document.items() if k != records_key}
+        top_keys = list(document)
+    if not all(isinstance(r, dict) for r in records):
+        raise ValueError("records must be JSON objects")
+
+    writer = _Writer()
+    fields = _encode_children(records, writer)
+    header = {
+        'format': 'xbs', 'version': VERSION, 'rows': len(records),
+        'records_key': records_key, 'top_keys': top_keys, 'meta': meta,
+        'fields': fields,
+        'strings': writer.string_table(),
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    preamble = _PREAMBLE.pack(MAGIC, VERSION, len(header_bytes))
+    head = preamble + header_bytes
+    head += b'\0' * (_align(len(head)) - len(head))
+
+    # Renamed into place: readers holding an mmap of the old file keep a valid view
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(head)
+        f.write(writer.data())
+    os.replace(tmp, path)
+
+
+class _StringTable:
+    """Interned strings decoded on first use (the same str object for every row)"""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self._offsets = offsets
+        self._blob = blob
+        self._cache: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, code: int) -> str:
+        text = self._cache.get(code)
+        if text is None:
+            start, end = int(self._offsets[code]), int(self._offsets[code + 1])
+            text = self._cache[code] = self._blob[start:end].tobytes().decode('utf-8')
+        return text
+
+
+class StringColumn:
+    """A string column: row codes into the store's string table"""
+
+    def __init__(self, codes: np.ndarray, strings: _StringTable):
+        self.codes = codes
+        self._strings = strings
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index: int) -> str:
+        return self._strings[int(self.codes[index])]
+
+    def map(self, fn: Callable[[str], Any]) -> np.ndarray:
+        """fn applied once per distinct string, broadcast to every row"""
+        unique, inverse = np.unique(self.codes, return_inverse=True)
+        results = np.empty(len(unique), dtype=object)
+        results[:] = [fn(self._strings[int(code)]) for code in unique]
+        return results[inverse]
+
+    def where(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """Boolean row mask; predicate runs once per distinct string"""
+        matching = [code for code in np.unique(self.codes).tolist() if predicate(self._strings[code])]
+        return np.isin(self.codes, matching)
+
+
+class BinaryStore:
+    """Read-only view of an .xbs file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary store")
+        if version > VERSION:
+            raise ValueError(f"{path} is format version {version}; this reader supports up to {VERSION}")
+        self.header = json.loads(self._mm[_PREAMBLE.size:_PREAMBLE.size + header_length].decode('utf-8'))
+        self._data_start = _align(_PREAMBLE.size + header_length)
+        self.rows: int = self.header['rows']
+        self.meta: Dict = self.header['meta']
+        strings = self.header['strings']
+        self.strings = _StringTable(self._array(strings['offsets']), self._array(strings['blob']))
+        self._row_decoder = self._decoder({'kind': 'dict', 'children': self.header['fields']})
+        self._records: Optional[RecordList] = None
+
+    def _array(self, section: Dict) -> np.ndarray:
+        count = int(np.prod(section['shape'], dtype=np.int64))
+        return np.frombuffer(self._mm, dtype=np.dtype(section['dtype']), count=count,
+                             offset=self._data_start + section['offset']).reshape(section['shape'])
+
+    def _decoder(self, field: Dict) -> Callable[[int], Any]:
+        """row index -> Python value (or _ABSENT) for one field"""
+        kind = field['kind']
+        strings = self.strings
+        if kind == 'dict':
+            children = [(child['name'], self._decoder(child)) for child in field['children']]
+
+            def value(i):
+                out = {}
+                for name, decode in children:
+                    v = decode(i)
+                    if v is not _ABSENT:
+                        out[name] = v
+                return out
+        else:
+            data = self._array(field['data'])
+            if data.ndim == 1:
+                data = data.data  # memoryview: indexing yields Python ints/floats without numpy scalars
+            if kind == 'bool':
+                value = lambda i: bool(data[i])
+            elif kind == 'int':
+                value = data.__getitem__
+            elif kind == 'float':
+                value = data.__getitem__
+            elif kind == 'str':
+                value = lambda i: strings[data[i]]
+            elif kind == 'object':
+                value = lambda i: json.loads(strings[data[i]])
+            elif kind in ('str_list', 'int_list'):
+                offsets = self._array(field['offsets'])
+                offsets = offsets.data
+                if kind == 'str_list':
+                    value = lambda i: [strings[c] for c in data[offsets[i]:offsets[i + 1]]]
+                else:
+                    value = lambda i: data[offsets[i]:offsets[i + 1]].tolist()
+            elif kind == 'vector':
+                labels = field['labels']
+                value = lambda i: {label: x for label, x in zip(labels, data[i].tolist()) if x == x}
+            else:
+                raise ValueError(f"unknown column kind {kind!r} (written by a newer version?)")
+        if 'mask' not in field:
+            return value
+        mask = self._array(field['mask']).data
+        return lambda i: value(i) if mask[i] == PRESENT else (None if mask[i] == NULL else _ABSENT)
+
+    def _values(self, field: Dict) -> List[Any]:
+        """Every row's value (or _ABSENT) for one field, decoded column-wise"""
+        kind = field['kind']
+        strings = self.strings
+        mask = self._array(field['mask']).tolist() if 'mask' in field else None
+        if kind == 'dict':
+            values = [{} for _ in range(self.rows)]
+            for child in field['children']:
+                name = child['name']
+                for row, v in zip(values, self._values(child)):
+                    if v is not _ABSENT:
+                        row[name] = v
+        else:
+            data = self._array(field['data'])
+            if kind in ('bool', 'int', 'float'):
+                values = data.astype(bool).tolist() if kind == 'bool' else data.tolist()
+            elif kind == 'str':
+                values = [strings[code] for code in data.tolist()]
+            elif kind == 'object':
+                # Rows without a value hold a filler code that need not be valid JSON
+                values = [json.loads(strings[code]) if mask is None or m == PRESENT else None
+                          for code, m in zip(data.tolist(), mask or [PRESENT] * self.rows)]
+            elif kind in ('str_list', 'int_list'):
+                offsets = self._array(field['offsets']).tolist()
+                flat = [strings[code] for code in data.tolist()] if kind == 'str_list' else data.tolist()
+                values = [flat[start:end] for start, end in zip(offsets, offsets[1:])]
+            elif kind == 'vector':
+                labels = field['labels']
+                values = [{label: x for label, x in zip(labels, row) if x == x} for row in data.tolist()]
+            else:
+                raise ValueError(f"unknown column kind {kind!r} (written by a newer version?)")
+        if mask is not None:
+            values = [v if m == PRESENT else (None if m == NULL else _ABSENT) for v, m in zip(values, mask)]
+        return values
+
+    def _field(self, path: str) -> Dict:
+        fields = self.header['fields']
+        field = None
+        for name in path.split('.'):
+            field = next((f for f in fields if f['name'] == name), None)
+            if field is None:
+                raise KeyError(path)
+            fields = field.get('children', [])
+        return field
+
+    def has_column(self, path: str) -> bool:
+        try:
+            self._field(path)
+            return True
+        except KeyError:
+            return False
+
+    def column(self, path: str) -> Union[np.ndarray, StringColumn]:
+        """
+        Zero-copy column for a dotted field path ('price', 'analysis.style')
+
+        Numbers come back as arrays, strings as a StringColumn and float dicts as
+        an (rows, len(labels(path))) matrix. Fields missing or null in some rows
+        raise ValueError; decode those through `records`.
+        """
+        field = self._field(path)
+        if 'mask' in field:
+            raise ValueError(f"column {path!r} is missing in some rows")
+        kind = field['kind']
+        if kind in ('bool', 'int', 'float', 'vector'):
+            return self._array(field['data'])
+        if kind == 'str':
+            return StringColumn(self._array(field['data']), self.strings)
+        raise ValueError(f"column {path!r} is {kind}, not a flat column")
+
+    def labels(self, path: str) -> List[str]:
+        """Column names of a float-dict matrix"""
+        return self._field(path)['labels']
+
+    @property
+    def records(self) -> 'RecordList':
+        if self._records is None:
+            self._records = RecordList(self)
+        return self._records
+
+    def document(self) -> Union[Dict, 'RecordList']:
+        """The stored document with its records as a lazy RecordList"""
+        key = self.header['records_key']
+        if key is None:
+            return self.records
+        return {k: self.records if k == key else self.meta[k] for k in self.header['top_keys']}
+
+
+class RecordList(Sequence):
+    """
+    List-like records of a store; each row is decoded once, on first access
+
+    Iterating decodes all remaining rows column by column, which is much
+    cheaper than row by row.
+    """
+
+    def __init__(self, store: BinaryStore):
+        self.store = store
+        self._rows: List[Optional[Dict]] = [None] * store.rows
+        self._undecoded = store.rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._rows)))]
+        row = self._rows[index]
+        if row is None:
+            row = self._rows[index] = self.store._row_decoder(range(len(self._rows))[index])
+            self._undecoded -= 1
+        return row
+
+    def __iter__(self):
+        if self._undecoded:
+            decoded = self.store._values({'kind': 'dict', 'children': self.store.header['fields']})
+            # Rows handed out before keep their identity
+            self._rows = [row if row is not None else new for row, new in zip(self._rows, decoded)]
+            self._undecoded = 0
+        return iter(self._rows)
+
+    def to_list(self) -> List[Dict]:
+        return list(self)
+
+
+def binary_twin(path: str) -> str:
+    """data/products_catalog.json -> data/products_catalog.xbs"""
+    return os.path.splitext(path)[0] + SUFFIX
+
+
+def resolve_path(path: str) -> str:
+    """The file load_document reads for path: its binary twin when that is at least as new"""
+    if path.endswith(SUFFIX):
+        return path
+    twin = binary_twin(path)
+    try:
+        twin_mtime = os.stat(twin).st_mtime_ns
+    except OSError:
+        return path
+    try:
+        return twin if twin_mtime >= os.stat(path).st_mtime_ns else path
+    except OSError:
+        return twin
+
+
+def load_document(path: str) -> Union[Dict, List]:
+    """JSON document at path, read from its binary twin when that is current"""
+    actual = resolve_path(path)
+    if actual.endswith(SUFFIX):
+        return BinaryStore(actual).document()
+    with open(actual, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _plain(document):
+    """Document with RecordLists turned into lists (for json.dump and comparisons)"""
+    if isinstance(document, RecordList):
+        return document.to_list()
+    if isinstance(document, dict):
+        return {k: _plain(v) for k, v in document.items()}
+    return document
+
+
+def convert(source: str, target: Optional[str] = None, verify: bool = True) -> str:
+    """JSON -> .xbs or .xbs -> JSON, chosen by the source suffix; returns the target path"""
+    if source.endswith(SUFFIX):
+        target = target or os.path.splitext(source)[0] + '.json'
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump(_plain(BinaryStore(source).document()), f, indent=2, ensure_ascii=False)
+        return target
+
+    target = target or binary_twin(source)
+    with open(source, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    write_store(target, document)
+    if verify and _plain(BinaryStore(target).document()) != document:
+        os.remove(target)
+        raise ValueError(f"{source} did not round-trip through the binary format")
+    return target
+
+
+def describe(path: str) -> Dict:
+    store = BinaryStore(path)
+
+    def fields(entries):
+        return {f['name']: fields(f['children']) if f['kind'] == 'dict' else
+                f['kind'] + (' (sparse)' if 'mask' in f else '') for f in entries}
+    return {'rows': store.rows, 'records_key': store.header['records_key'], 'bytes': os.path.getsize(path),
+            'strings': store.header['strings']['count'], 'fields': fields(store.header['fields'])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert catalog/QA/analysis JSON to and from the binary store")
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert_cmd = sub.add_parser('convert', help="JSON -> .xbs (default: next to the JSON) or .xbs -> JSON")
+    convert_cmd.add_argument('source', nargs='+')
+    convert_cmd.add_argument('--output', help="Target path (single source only)")
+    convert_cmd.add_argument('--no-verify', action='store_true', help="Skip the round-trip check")
+    info_cmd = sub.add_parser('info', help="Print a store's schema")
+    info_cmd.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        print(json.dumps(describe(args.path), indent=2, ensure_ascii=False))
+    else:
+        if args.output and len(args.source) > 1:
+            parser.error("--output needs a single source")
+        for source in args.source:
+            target = convert(source, args.output, verify=not args.no_verify)
+            print(f"✅ {source} -> {target} ({os.path.getsize(source):,} -> {os.path.getsize(target):,} bytes)")
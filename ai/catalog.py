@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Product Catalog Helpers
+Loading and filtering of data/products_catalog.json shared by the bridge and tools
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from binary_store import RecordList, load_document, resolve_path
+from metrics import record_cache
+from tracing import start_span
+
+# catalog_path -> ((file read, mtime_ns, size), products)
+_catalog_cache: Dict[str, Tuple[Tuple[str, int, int], List[Dict]]] = {}
+
+
+def load_catalog(catalog_path: str = 'data/products_catalog.json') -> List[Dict]:
+    """
+    Load the product list from a catalog file
+
+    The parsed list is reused until the file's mtime or size changes; callers
+    must treat it as read-only. A current binary twin (products_catalog.xbs)
+    is opened instead of parsing the JSON, and returns a lazy RecordList.
+    """
+    with start_span('catalog.cache_lookup') as span:
+        actual = resolve_path(catalog_path)
+        stat = os.stat(actual)
+        key = (actual, stat.st_mtime_ns, stat.st_size)
+        cached = _catalog_cache.get(catalog_path)
+        hit = bool(cached and cached[0] == key)
+        record_cache('catalog', hit)
+        span.set_attribute('cache.hit', hit)
+        if hit:
+            return cached[1]
+
+        products = load_document(actual).get('products', [])
+        _catalog_cache[catalog_path] = (key, products)
+        return products
+
+
+def filter_products(products: List[Dict], query: str = '', category: str = '',
+                    max_price: Optional[int] = None) -> List[Dict]:
+    """
+    Filter products by name substring, exact category and price ceiling
+
+    Args:
+        products: Catalog products
+        query: Case-insensitive substring of the product name
+        category: Case-insensitive category name
+        max_price: Maximum price in IDR
+
+    Returns:
+        Matching products in catalog order
+    """
+    query = query.lower()
+    category = category.lower()
+    if isinstance(products, RecordList):
+        return _filter_columns(products, query, category, max_price)
+
+    filtered = []
+    for product in products:
+        if query and query not in product['name'].lower():
+            continue
+        if category and product['category'].lower() != category:
+            continue
+        if max_price and product['price'] > max_price:
+            continue
+        filtered.append(product)
+
+    return filtered
+
+
+def _filter_columns(products: RecordList, query: str, category: str, max_price: Optional[int]) -> List[Dict]:
+    """filter_products on the binary store's columns; only matching rows are decoded"""
+    store = products.store
+    try:
+        keep = np.ones(len(products), dtype=bool)
+        if query:
+            keep &= store.column('name').where(lambda name: query in name.lower())
+        if category:
+            keep &= store.column('category').where(lambda name: name.lower() == category)
+        if max_price:
+            keep &= store.column('price') <= max_price
+    except (KeyError, ValueError):
+        # Sparse or differently typed columns: decode every row instead
+        return filter_products(products.to_list(), query, category, max_price)
+    return [products[int(i)] for i in np.flatnonzero(keep)]
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP Transport for LLM Providers
+One pooled httpx.AsyncClient (keep-alive, optional HTTP/2, timeouts, DNS cache)
+driven from a single long-lived event loop so warm connections survive across
+requests
+"""
+
+import asyncio
+import os
+import socket
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import AsyncGenerator, Awaitable, Dict, Iterator, Optional, Tuple
+
+from metrics import counter, record_cache
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2)
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+HTTP_REQUESTS = counter('llm_http_requests_total', "Requests sent through the shared LLM HTTP client", ['host'])
+HTTP_CONNECTIONS = counter('llm_http_connections_opened_total',
+                           "New TCP connections opened by the shared LLM HTTP client", ['host'])
+
+
+@dataclass
+class TransportSettings:
+    """Pool, keep-alive, protocol and timeout settings for provider HTTP traffic"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0      # seconds an idle connection stays pooled
+    http2: bool = True                  # used only when the h2 package is installed
+    connect_timeout: float = 5.0
+    read_timeout: float = 60.0          # per read; long generations stream in chunks
+    write_timeout: float = 10.0
+    pool_timeout: float = 5.0           # wait for a free pooled connection
+    dns_cache_ttl: float = 300.0        # 0 disables the DNS cache
+
+    @classmethod
+    def from_env(cls) -> 'TransportSettings':
+        """LLM_HTTP_* environment variables"""
+        defaults = cls()
+        return cls(
+            max_connections=int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', defaults.max_connections)),
+            max_keepalive_connections=int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', defaults.max_keepalive_connections)),
+            keepalive_expiry=float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', defaults.keepalive_expiry)),
+            http2=os.getenv('LLM_HTTP2', 'true').lower() == 'true',
+            connect_timeout=float(os.getenv('LLM_HTTP_CONNECT_TIMEOUT', defaults.connect_timeout)),
+            read_timeout=float(os.getenv('LLM_HTTP_READ_TIMEOUT', defaults.read_timeout)),
+            write_timeout=float(os.getenv('LLM_HTTP_WRITE_TIMEOUT', defaults.write_timeout)),
+            pool_timeout=float(os.getenv('LLM_HTTP_POOL_TIMEOUT', defaults.pool_timeout)),
+            dns_cache_ttl=float(os.getenv('LLM_DNS_CACHE_TTL', defaults.dns_cache_ttl)),
+        )
+
+
+class _CachingNetworkBackend:
+    """httpcore network backend wrapper: cached DNS + new-connection counting
+
+    The wrapped backend connects to the cached IP; TLS still uses the original
+    hostname for SNI and certificate checks (httpcore passes it to start_tls).
+    """
+
+    def __init__(self, backend, ttl: float):
+        self._backend = backend
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, str]] = {}
+
+    async def _resolve(self, host: str, port: int) -> str:
+        if self._ttl <= 0:
+            return host
+        try:
+            socket.inet_pton(socket.AF_INET6 if ':' in host else socket.AF_INET, host)
+            return host  # already an IP
+        except OSError:
+            pass
+
+        cached = self._cache.get((host, port))
+        if cached and cached[0] > time.monotonic():
+            record_cache('dns', True)
+            return cached[1]
+
+        record_cache('dns', False)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._cache[(host, port)] = (time.monotonic() + self._ttl, address)
+        return address
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        HTTP_CONNECTIONS.labels(host).inc()
+        address = await self._resolve(host, port)
+        return await self._backend.connect_tcp(address, port, timeout=timeout, local_address=local_address,
+                                               socket_options=socket_options)
+
+    def __getattr__(self, name):
+        # connect_unix_socket, sleep, ...
+        return getattr(self._backend, name)
+
+
+async def _count_request(request):
+    HTTP_REQUESTS.labels(request.url.host).inc()
+
+
+def build_http_client(settings: Optional[TransportSettings] = None):
+    """New pooled httpx.AsyncClient configured from settings"""
+    if not HTTPX_AVAILABLE:
+        raise ImportError("httpx not installed: pip install httpx")
+    settings = settings or TransportSettings.from_env()
+    http2 = settings.http2 and H2_AVAILABLE
+
+    limits = httpx.Limits(max_connections=settings.max_connections,
+                          max_keepalive_connections=settings.max_keepalive_connections,
+                          keepalive_expiry=settings.keepalive_expiry)
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+    pool = getattr(transport, '_pool', None)
+    if pool is not None and hasattr(pool, '_network_backend'):
+        # httpx offers no public hook for resolution, so the pool's backend is wrapped;
+        # requirements.txt pins httpx/httpcore to the versions that keep it there
+        pool._network_backend = _CachingNetworkBackend(pool._network_backend, settings.dns_cache_ttl)
+    else:
+        print("⚠️  Unsupported httpx/httpcore version: LLM DNS cache and connection counts disabled")
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(connect=settings.connect_timeout, read=settings.read_timeout,
+                              write=settings.write_timeout, pool=settings.pool_timeout),
+        event_hooks={'request': [_count_request]},
+    )
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Process-wide client shared by every provider (must be used from one event loop)"""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = build_http_client()
+    return _http_client
+
+
+class BackgroundLoop:
+    """A long-lived event loop on a daemon thread
+
+    Sync code (Flask views) submits coroutines here instead of creating a loop
+    per request, so pooled connections stay bound to one live loop.
+    """
+
+    def __init__(self, name: str = 'llm-event-loop', timeout: Optional[float] = None):
+        """
+        Args:
+            timeout: Default seconds run() waits for a result (LLM_CALL_TIMEOUT, 120);
+                a hung call is cancelled instead of blocking its request thread forever
+        """
+        self.timeout = timeout if timeout is not None else float(os.getenv('LLM_CALL_TIMEOUT', 120))
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None):
+        """Run a coroutine on the loop and block for its result (at most timeout or self.timeout seconds)"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout if timeout is not None else self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncGenerator) -> Iterator:
+        """Drive an async generator from sync code, one item per blocking step"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+
+
+_background_loop: Optional[BackgroundLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                _background_loop = BackgroundLoop()
+    return _background_loop
+
+
+def transport_stats() -> Dict:
+    """Requests vs new connections per host (reuse ratio) and protocol settings"""
+    requests = {labels['host']: child.value() for labels, child in HTTP_REQUESTS.children()}
+    connections = {labels['host']: child.value() for labels, child in HTTP_CONNECTIONS.children()}
+    hosts = {}
+    for host in sorted(set(requests) | set(connections)):
+        sent, opened = requests.get(host, 0), connections.get(host, 0)
+        hosts[host] = {
+            'requests': int(sent),
+            'connections_opened': int(opened),
+            'reuse_ratio': round(1 - opened / sent, 3) if sent else 0.0,
+        }
+    settings = TransportSettings.from_env()
+    return {
+        'hosts': hosts,
+        'http2': settings.http2 and H2_AVAILABLE,
+        'max_connections': settings.max_connections,
+        'max_keepalive_connections': settings.max_keepalive_connections,
+        'keepalive_expiry': settings.keepalive_expiry,
+    }
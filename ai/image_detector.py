@@ -7,10 +7,14 @@ Detects furniture features: material, color, style, condition
 import json
 import os
 import sys
+import time
 import numpy as np
 from pathlib import Path
 from typing import Dict, List, Tuple
 
+from binary_store import SUFFIX, write_store
+from metrics import histogram
+
 # Try to import PyTorch/torchvision with graceful fallback
 try:
     import torch
@@ -22,6 +26,17 @@ except ImportError:
     PYTORCH_AVAILABLE = False
     print("⚠️  PyTorch not installed. Install with: pip install torch torchvision pillow")
 
+# Column order of the vectorized score arrays
+STYLE_LABELS = ('modern', 'minimalist', 'classic', 'rustic')
+MATERIAL_LABELS = ('leather', 'fabric', 'wood', 'metal', 'marmer')
+COLOR_LABELS = ('dark', 'light', 'warm', 'cool')
+
+IMAGE_STAGE_SECONDS = histogram('image_stage_seconds', "Image analysis time per batch stage", ['stage'])
+
+# (model name, device) -> (model, feature extractor) set by preload_model; reused by every
+# detector created later in this process or in processes forked from it
+_shared_models: Dict[Tuple[str, str], Tuple[object, object]] = {}
+
 
 class FurnitureImageDetector:
     """CNN-based furniture feature detection using ResNet-50"""
@@ -46,8 +61,11 @@ class FurnitureImageDetector:
     def _initialize_model(self):
         """Load and configure ResNet model"""
         try:
+            shared = _shared_models.get((self.model_name, self.device))
+            if shared:
+                self.model, self.feature_extractor = shared
             # Load pretrained ResNet
-            if self.model_name == 'resnet50':
+            elif self.model_name == 'resnet50':
                 self.model = models.resnet50(weights=models.ResNet50_Weights.DEFAULT)
             elif self.model_name == 'resnet101':
                 self.model = models.resnet101(weights=models.ResNet101_Weights.DEFAULT)
@@ -56,10 +74,11 @@ class FurnitureImageDetector:
             else:
                 raise ValueError(f"Unknown model: {self.model_name}")
             
-            # Remove classification layer for feature extraction
-            self.feature_extractor = torch.nn.Sequential(*list(self.model.children())[:-1])
-            self.feature_extractor.to(self.device)
-            self.feature_extractor.eval()
+            if not shared:
+                # Remove classification layer for feature extraction
+                self.feature_extractor = torch.nn.Sequential(*list(self.model.children())[:-1])
+                self.feature_extractor.to(self.device)
+                self.feature_extractor.eval()
             
             # Image preprocessing pipeline
             self.transform = transforms.Compose([
@@ -71,7 +90,7 @@ class FurnitureImageDetector:
                 )
             ])
             
-            print(f"✅ ResNet-{self.model_name} loaded on {self.device}")
+            print(f"✅ ResNet-{self.model_name} {'shared' if shared else 'loaded'} on {self.device}")
         except Exception as e:
             print(f"❌ Error loading model: {e}")
             self.model = None
@@ -102,6 +121,45 @@ class FurnitureImageDetector:
             print(f"❌ Error extracting features from {image_path}: {e}")
             return None
     
+    def extract_features_batch(self, image_paths: List[str]) -> List[np.ndarray]:
+        """
+        Extract feature vectors for several images in one forward pass
+        
+        Args:
+            image_paths: Paths to image files
+            
+        Returns:
+            One (2048,) feature vector per path, None for images that failed to load
+        """
+        if not PYTORCH_AVAILABLE or self.feature_extractor is None:
+            return [None] * len(image_paths)
+        
+        tensors, positions = [], []
+        for i, image_path in enumerate(image_paths):
+            try:
+                img = Image.open(image_path).convert('RGB')
+                tensors.append(self.transform(img))
+                positions.append(i)
+            except Exception as e:
+                print(f"❌ Error loading {image_path}: {e}")
+        
+        results = [None] * len(image_paths)
+        if not tensors:
+            return results
+        
+        try:
+            batch = torch.stack(tensors).to(self.device)
+            with torch.no_grad():
+                features = self.feature_extractor(batch)
+                features = features.reshape(len(tensors), -1).cpu().numpy()
+        except Exception as e:
+            print(f"❌ Error extracting batch features: {e}")
+            return results
+        
+        for row, i in enumerate(positions):
+            results[i] = features[row]
+        return results
+    
     def classify_furniture_style(self, features: np.ndarray) -> Dict[str, float]:
         """
         Classify furniture style from features
@@ -116,22 +174,35 @@ class FurnitureImageDetector:
         if features is None or len(features) == 0:
             return {}
         
-        # Normalize features
-        features = (features - features.mean()) / (features.std() + 1e-8)
+        scores = self.classify_furniture_style_batch(np.asarray(features)[np.newaxis])[0]
+        return {k: float(v) for k, v in zip(STYLE_LABELS, scores)}
+    
+    def classify_furniture_style_batch(self, features: np.ndarray) -> np.ndarray:
+        """
+        Vectorized style classification
+        
+        Args:
+            features: Feature matrix (N, 2048)
+            
+        Returns:
+            Style probabilities (N, 4), columns in STYLE_LABELS order
+        """
+        features = np.asarray(features, dtype=np.float64)
+        
+        # Normalize each feature vector
+        features = (features - features.mean(axis=1, keepdims=True)) / \
+            (features.std(axis=1, keepdims=True) + 1e-8)
         
         # Heuristic classification based on feature patterns
-        style_scores = {
-            'modern': float(np.mean(features[:512]) * 0.8 + 0.5),
-            'minimalist': float(np.std(features[512:1024]) * 0.6 + 0.4),
-            'classic': float(np.mean(features[1024:1536]) * 0.7 + 0.3),
-            'rustic': float(np.std(features[1536:]) * 0.5 + 0.4),
-        }
+        scores = np.stack([
+            features[:, :512].mean(axis=1) * 0.8 + 0.5,        # modern
+            features[:, 512:1024].std(axis=1) * 0.6 + 0.4,     # minimalist
+            features[:, 1024:1536].mean(axis=1) * 0.7 + 0.3,   # classic
+            features[:, 1536:].std(axis=1) * 0.5 + 0.4,        # rustic
+        ], axis=1)
         
         # Normalize to 0-1
-        total = sum(style_scores.values())
-        style_scores = {k: v/total for k, v in style_scores.items()}
-        
-        return style_scores
+        return scores / scores.sum(axis=1, keepdims=True)
     
     def detect_material(self, features: np.ndarray) -> Dict[str, float]:
         """
@@ -146,20 +217,59 @@ class FurnitureImageDetector:
         if features is None or len(features) == 0:
             return {}
         
+        scores = self.detect_material_batch(np.asarray(features)[np.newaxis])[0]
+        return {k: float(v) for k, v in zip(MATERIAL_LABELS, scores)}
+    
+    def detect_material_batch(self, features: np.ndarray) -> np.ndarray:
+        """
+        Vectorized material detection
+        
+        Args:
+            features: Feature matrix (N, 2048)
+            
+        Returns:
+            Material probabilities (N, 5), columns in MATERIAL_LABELS order
+        """
+        features = np.asarray(features, dtype=np.float64)
+        
         # Feature-based material detection
-        material_scores = {
-            'leather': float(np.mean(features[256:768]) * 0.8),
-            'fabric': float(np.mean(features[768:1280]) * 0.75),
-            'wood': float(np.mean(features[1280:1792]) * 0.85),
-            'metal': float(np.std(features[1792:2048]) * 0.7),
-            'marmer': float(np.mean(features[:256]) * 0.6),
-        }
+        scores = np.stack([
+            features[:, 256:768].mean(axis=1) * 0.8,     # leather
+            features[:, 768:1280].mean(axis=1) * 0.75,   # fabric
+            features[:, 1280:1792].mean(axis=1) * 0.85,  # wood
+            features[:, 1792:2048].std(axis=1) * 0.7,    # metal
+            features[:, :256].mean(axis=1) * 0.6,        # marmer
+        ], axis=1)
         
         # Normalize
-        total = sum(material_scores.values())
-        material_scores = {k: v/total for k, v in material_scores.items()}
+        return scores / scores.sum(axis=1, keepdims=True)
+    
+    def load_pixels(self, image_paths: List[str], size: Tuple[int, int] = (100, 100)) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load and downscale images into one pixel array
+        
+        Args:
+            image_paths: Paths to image files
+            size: Target (width, height)
+            
+        Returns:
+            (pixels (N, H, W, 3) uint8, valid (N,) bool); failed images are black
+        """
+        pixels = np.zeros((len(image_paths), size[1], size[0], 3), dtype=np.uint8)
+        valid = np.zeros(len(image_paths), dtype=bool)
+        
+        if not PYTORCH_AVAILABLE:
+            return pixels, valid
         
-        return material_scores
+        for i, image_path in enumerate(image_paths):
+            try:
+                with Image.open(image_path) as img:
+                    pixels[i] = np.asarray(img.convert('RGB').resize(size))
+                valid[i] = True
+            except Exception as e:
+                print(f"❌ Error loading pixels from {image_path}: {e}")
+        
+        return pixels, valid
     
     def detect_color_palette(self, image_path: str) -> Dict[str, float]:
         """
@@ -169,71 +279,212 @@ class FurnitureImageDetector:
             image_path: Path to image file
             
         Returns:
-            Color palette: black, white, brown, gray, gold, red
+            Color palette: dark, light, warm, cool
         """
-        if not PYTORCH_AVAILABLE:
+        pixels, valid = self.load_pixels([image_path])
+        if not valid[0]:
             return {}
         
-        try:
-            img = Image.open(image_path).convert('RGB')
-            img_array = np.array(img.resize((100, 100)))
-            
-            # RGB pixel analysis
-            r_mean = np.mean(img_array[:,:,0]) / 255
-            g_mean = np.mean(img_array[:,:,1]) / 255
-            b_mean = np.mean(img_array[:,:,2]) / 255
+        scores = self.detect_color_palette_batch(pixels)[0]
+        return {k: float(v) for k, v in zip(COLOR_LABELS, scores)}
+    
+    def detect_color_palette_batch(self, pixels: np.ndarray) -> np.ndarray:
+        """
+        Vectorized color tone scores
+        
+        Args:
+            pixels: RGB pixel array (N, H, W, 3) uint8
             
-            colors = {
-                'dark': max(0, 1 - (r_mean + g_mean + b_mean) / 3),
-                'light': max(0, (r_mean + g_mean + b_mean) / 3 - 0.5),
-                'warm': max(0, r_mean - g_mean),
-                'cool': max(0, b_mean - r_mean),
-            }
+        Returns:
+            Tone probabilities (N, 4), columns in COLOR_LABELS order
+        """
+        # RGB channel means per image
+        means = pixels.reshape(len(pixels), -1, 3).mean(axis=1) / 255
+        r_mean, g_mean, b_mean = means[:, 0], means[:, 1], means[:, 2]
+        brightness = means.mean(axis=1)
+        
+        colors = np.stack([
+            np.maximum(0, 1 - brightness),      # dark
+            np.maximum(0, brightness - 0.5),    # light
+            np.maximum(0, r_mean - g_mean),     # warm
+            np.maximum(0, b_mean - r_mean),     # cool
+        ], axis=1)
+        
+        # Normalize
+        total = colors.sum(axis=1, keepdims=True)
+        total[total == 0] = 1
+        return colors / total
+    
+    def extract_dominant_colors_batch(self, pixels: np.ndarray, k: int = 5,
+                                      bits: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Dominant colors via a quantized color histogram
+        
+        Each pixel is binned into a (2^bits)^3 RGB grid with a single bincount over the
+        whole batch; the k most populated bins are the palette and their mean RGB the
+        color. Comparable to k-means on product photos at a fraction of the cost.
+        
+        Args:
+            pixels: RGB pixel array (N, H, W, 3) uint8
+            k: Palette size per image
+            bits: Quantization bits per channel
             
-            # Normalize
-            total = sum(colors.values()) or 1
-            return {k: v/total for k, v in colors.items()}
-        except Exception as e:
-            print(f"❌ Error detecting colors: {e}")
-            return {}
+        Returns:
+            (colors (N, k, 3) uint8, weights (N, k) float) sorted by weight
+        """
+        n = len(pixels)
+        bins = 1 << (3 * bits)
+        px = pixels.reshape(n, -1, 3)
+        
+        shift = 8 - bits
+        codes = (px[..., 0].astype(np.int64) >> shift) << (2 * bits)
+        codes |= (px[..., 1].astype(np.int64) >> shift) << bits
+        codes |= px[..., 2].astype(np.int64) >> shift
+        codes += (np.arange(n, dtype=np.int64) * bins)[:, np.newaxis]
+        codes = codes.ravel()
+        
+        counts = np.bincount(codes, minlength=n * bins).reshape(n, bins)
+        sums = np.stack([
+            np.bincount(codes, weights=px[..., c].ravel(), minlength=n * bins).reshape(n, bins)
+            for c in range(3)
+        ], axis=-1)
+        
+        # Top-k bins per image, ordered by population
+        k = min(k, bins)
+        top = np.argpartition(-counts, k - 1, axis=1)[:, :k]
+        top_counts = np.take_along_axis(counts, top, axis=1)
+        order = np.argsort(-top_counts, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_counts = np.take_along_axis(top_counts, order, axis=1)
+        
+        top_sums = np.take_along_axis(sums, top[..., np.newaxis], axis=1)
+        colors = top_sums / np.maximum(top_counts, 1)[..., np.newaxis]
+        weights = top_counts / max(px.shape[1], 1)
+        
+        return np.rint(colors).astype(np.uint8), weights
     
-    def analyze_image(self, image_path: str, product_id: int = None) -> Dict:
+    def analyze_image(self, image_path: str, product_id: int = None,
+                      features: np.ndarray = None) -> Dict:
         """
         Complete analysis of furniture image
         
         Args:
             image_path: Path to image file
             product_id: Optional product ID
+            features: Precomputed feature vector (skips the forward pass)
+            
+        Returns:
+            Analysis results: style, material, colors, dominant_colors
+            (the same dict analyze_images returns for one path)
+        """
+        return self.analyze_images([image_path], [product_id],
+                                   None if features is None else [features])[0]
+    
+    def analyze_images(self, image_paths: List[str], product_ids: List[int] = None,
+                       features: List[np.ndarray] = None) -> List[Dict]:
+        """
+        Analyze several images with a single batched forward pass
+        
+        Args:
+            image_paths: Paths to image files
+            product_ids: Optional product ID per path
+            features: Precomputed feature vector per path (skips the forward pass)
             
         Returns:
-            Analysis results: features, style, material, colors
+            One analysis dict per path (same order)
         """
-        if not os.path.exists(image_path):
-            return {'error': f'Image not found: {image_path}'}
-        
-        # Extract features
-        features = self.extract_features(image_path)
-        
-        result = {
-            'image_path': image_path,
-            'product_id': product_id,
-            'status': 'analyzed' if features is not None else 'failed',
-            'style': self.classify_furniture_style(features),
-            'material': self.detect_material(features),
-            'colors': self.detect_color_palette(image_path),
-            'confidence': float(np.max(list(self.classify_furniture_style(features).values())) if features is not None else 0)
-        }
-        
-        return result
+        product_ids = product_ids or [None] * len(image_paths)
+        exists = [os.path.exists(p) for p in image_paths]
+        existing = [p for p, ok in zip(image_paths, exists) if ok]
+        if not existing:
+            return [{'error': f'Image not found: {p}'} for p in image_paths]
+        
+        stage_start = time.perf_counter()
+        if features is None:
+            features = self.extract_features_batch(existing)
+        else:
+            features = [f for f, ok in zip(features, exists) if ok]
+        IMAGE_STAGE_SECONDS.labels('features').observe(time.perf_counter() - stage_start)
+        
+        stage_start = time.perf_counter()
+        pixels, valid_pixels = self.load_pixels(existing)
+        IMAGE_STAGE_SECONDS.labels('pixels').observe(time.perf_counter() - stage_start)
+        
+        # Vectorized heads: color heads over every loaded image,
+        # feature heads over the images whose features were extracted
+        stage_start = time.perf_counter()
+        colors = self.detect_color_palette_batch(pixels)
+        dominant_colors, dominant_weights = self.extract_dominant_colors_batch(pixels)
+        
+        analyzed = [i for i, f in enumerate(features) if f is not None]
+        if analyzed:
+            feature_matrix = np.stack([features[i] for i in analyzed])
+            style = self.classify_furniture_style_batch(feature_matrix)
+            material = self.detect_material_batch(feature_matrix)
+        IMAGE_STAGE_SECONDS.labels('heads').observe(time.perf_counter() - stage_start)
+        row_of = {i: row for row, i in enumerate(analyzed)}
+        
+        results, j = [], 0
+        for image_path, product_id, ok in zip(image_paths, product_ids, exists):
+            if not ok:
+                results.append({'error': f'Image not found: {image_path}'})
+                continue
+            
+            result = {
+                'image_path': image_path,
+                'product_id': product_id,
+                'status': 'failed',
+                'style': {},
+                'material': {},
+                'colors': {},
+                'confidence': 0.0
+            }
+            if j in row_of:
+                row = row_of[j]
+                result.update({
+                    'status': 'analyzed',
+                    'style': dict(zip(STYLE_LABELS, style[row].tolist())),
+                    'material': dict(zip(MATERIAL_LABELS, material[row].tolist())),
+                    'confidence': float(style[row].max()),
+                })
+            if valid_pixels[j]:
+                result['colors'] = dict(zip(COLOR_LABELS, colors[j].tolist()))
+                result['dominant_colors'] = [
+                    {'hex': '#%02x%02x%02x' % tuple(rgb), 'weight': float(w)}
+                    for rgb, w in zip(dominant_colors[j].tolist(), dominant_weights[j])
+                    if w > 0
+                ]
+            results.append(result)
+            j += 1
+        
+        return results
 
 
-def batch_analyze_products(catalog_path: str, image_base_dir: str = '.') -> List[Dict]:
+def preload_model(model_name: str = 'resnet50', device: str = 'cpu') -> FurnitureImageDetector:
+    """
+    Load the ResNet weights once, into shared memory, for detectors created later
+
+    Used by the pre-fork server before it forks workers: every worker's detector
+    reuses these tensors instead of loading its own copy.
+    """
+    detector = FurnitureImageDetector(model_name, device)
+    if detector.feature_extractor is not None:
+        # Shared-memory storage: writes anywhere can never trigger a per-worker copy
+        detector.feature_extractor.share_memory()
+        detector.feature_extractor.requires_grad_(False)
+        _shared_models[(model_name, detector.device)] = (detector.model, detector.feature_extractor)
+    return detector
+
+
+def batch_analyze_products(catalog_path: str, image_base_dir: str = '.',
+                           batch_size: int = 32) -> List[Dict]:
     """
     Analyze all products in catalog
     
     Args:
         catalog_path: Path to products_catalog.json
         image_base_dir: Base directory for images
+        batch_size: Images per batched forward pass
         
     Returns:
         List of analysis results
@@ -248,23 +499,32 @@ def batch_analyze_products(catalog_path: str, image_base_dir: str = '.') -> List
     with open(catalog_path, 'r', encoding='utf-8') as f:
         catalog = json.load(f)
     
+    products = catalog.get('products', [])
     results = []
-    for product in catalog.get('products', []):
-        img_path = os.path.join(image_base_dir, product.get('image_url', '').lstrip('/'))
-        analysis = detector.analyze_image(img_path, product.get('id'))
-        results.append({
-            'product_id': product.get('id'),
-            'product_name': product.get('name'),
-            'analysis': analysis
-        })
+    for start in range(0, len(products), batch_size):
+        chunk = products[start:start + batch_size]
+        img_paths = [
+            os.path.join(image_base_dir, product.get('image_url', '').lstrip('/'))
+            for product in chunk
+        ]
+        analyses = detector.analyze_images(img_paths, [product.get('id') for product in chunk])
+        for product, analysis in zip(chunk, analyses):
+            results.append({
+                'product_id': product.get('id'),
+                'product_name': product.get('name'),
+                'analysis': analysis
+            })
     
     return results
 
 
 def save_analysis_results(results: List[Dict], output_path: str):
-    """Save analysis results to JSON"""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    """Save analysis results to JSON (or the binary store for a .xbs path)"""
+    if output_path.endswith(SUFFIX):
+        write_store(output_path, results)
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
     print(f"✅ Results saved to {output_path}")
 
 
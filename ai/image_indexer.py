@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Sharded Image Indexing
+Splits the catalog's product images into fixed-size shards and indexes them on
+a process pool (each worker with a bounded number of torch threads). Every
+finished shard is written as a binary feature matrix (.npy) plus a JSON file of
+per-row analyses, and recorded in manifest.json, so an interrupted run resumes
+where it stopped and a rerun only reindexes shards whose images changed.
+
+Layout of the output directory:
+    manifest.json           shard number -> files, input fingerprint, row counts
+    shard-00000.npy         float32 (rows, 2048) ResNet features, zeros for failed rows
+    shard-00000.json        one {product_id, product_name, image_path, analysis} per row
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MANIFEST_VERSION = 1
+FEATURE_DIM = 2048
+
+Item = Tuple[int, str, str]  # product id, product name, image path
+
+
+@dataclass
+class IndexStats:
+    shards: int = 0
+    indexed: int = 0
+    skipped: int = 0
+    failed_shards: int = 0
+    images: int = 0
+    failed_images: int = 0
+    elapsed: float = 0.0
+    by_worker: Dict[int, int] = field(default_factory=dict)  # pid -> shards indexed
+
+    def to_dict(self) -> Dict:
+        return {
+            'shards': self.shards,
+            'indexed': self.indexed,
+            'skipped': self.skipped,
+            'failed_shards': self.failed_shards,
+            'images': self.images,
+            'failed_images': self.failed_images,
+            'elapsed_seconds': round(self.elapsed, 2),
+            'images_per_second': round(self.images / self.elapsed, 2) if self.elapsed else 0.0,
+            'workers_used': len(self.by_worker),
+        }
+
+
+def catalog_items(catalog_path: str, image_base_dir: str = '.') -> List[Item]:
+    """Products that have an image_url, in catalog order"""
+    with open(catalog_path, 'r', encoding='utf-8') as f:
+        products = json.load(f).get('products', [])
+    return [
+        (product.get('id'), product.get('name'),
+         os.path.join(image_base_dir, product['image_url'].lstrip('/')))
+        for product in products if product.get('image_url')
+    ]
+
+
+def shard_fingerprint(items: List[Item], model_name: str) -> str:
+    """Changes when a shard's products, image files or model change"""
+    digest = hashlib.sha1(model_name.encode('utf-8'))
+    for product_id, _, path in items:
+        try:
+            stat = os.stat(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            signature = None
+        digest.update(json.dumps([product_id, path, signature]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_manifest(out_dir: str) -> Dict:
+    path = os.path.join(out_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_atomic(path: str, write):
+    """write(tmp_path), then rename over path so readers never see a partial file"""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def save_manifest(out_dir: str, manifest: Dict):
+    def write(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    _write_atomic(os.path.join(out_dir, 'manifest.json'), write)
+
+
+# Per-process worker state (set by init_worker)
+_detector = None
+
+
+def init_worker(threads: int, model_name: str = 'resnet50'):
+    """Bound the process's math threads before torch is imported, then load the model once"""
+    global _detector
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    import torch
+    from image_detector import FurnitureImageDetector
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    _detector = FurnitureImageDetector(model_name=model_name, device='cpu')
+
+
+def worker_detector():
+    """The detector init_worker loaded in this process"""
+    return _detector
+
+
+def _index_shard(shard_no: int, items: List[Item], out_dir: str, batch_size: int) -> Dict:
+    """Index one shard in the worker; returns its manifest entry"""
+    started = time.perf_counter()
+    matrix = np.zeros((len(items), FEATURE_DIM), dtype=np.float32)
+    records, failed = [], 0
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        paths = [path for _, _, path in chunk]
+        existing = [path for path in paths if os.path.exists(path)]
+        features = iter(_detector.extract_features_batch(existing))
+        aligned = [next(features) if os.path.exists(path) else None for path in paths]
+        analyses = _detector.analyze_images(paths, [product_id for product_id, _, _ in chunk], features=aligned)
+        for row, ((product_id, name, path), vector, analysis) in enumerate(zip(chunk, aligned, analyses)):
+            if vector is not None:
+                matrix[start + row] = vector.reshape(-1)[:FEATURE_DIM]
+            else:
+                failed += 1
+            records.append({'product_id': product_id, 'product_name': name,
+                            'image_path': path, 'analysis': analysis})
+
+    name = f"shard-{shard_no:05d}"
+
+    def write_features(tmp):
+        with open(tmp, 'wb') as f:
+            np.save(f, matrix)
+    _write_atomic(os.path.join(out_dir, name + '.npy'), write_features)
+
+    def write_records(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+    _write_atomic(os.path.join(out_dir, name + '.json'), write_records)
+    return {
+        'features': name + '.npy',
+        'records': name + '.json',
+        'rows': len(items),
+        'failed': failed,
+        'seconds': round(time.perf_counter() - started, 2),
+        'worker': os.getpid(),
+    }
+
+
+def run_index(items: List[Item], out_dir: str, workers: Optional[int] = None, threads: int = 2,
+              shard_size: int = 256, batch_size: int = 32, model_name: str = 'resnet50',
+              fresh: bool = False) -> IndexStats:
+    """
+    Index every shard not already in the manifest with a matching fingerprint
+
+    The manifest is rewritten (atomically) after each finished shard, so
+    killing the run at any point loses at most the shards still in progress.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    manifest = {} if fresh else load_manifest(out_dir)
+    if manifest and (manifest.get('version') != MANIFEST_VERSION or manifest.get('shard_size') != shard_size):
+        raise ValueError(f"{out_dir} was indexed with shard_size={manifest.get('shard_size')}; "
+                         f"rerun with that size or --fresh")
+    manifest.update({'version': MANIFEST_VERSION, 'model': model_name, 'shard_size': shard_size,
+                     'dim': FEATURE_DIM, 'dtype': 'float32'})
+    shards = manifest.setdefault('shards', {})
+
+    stats = IndexStats()
+    pending: Dict[int, Tuple[List[Item], str]] = {}
+    for shard_no, start in enumerate(range(0, len(items), shard_size)):
+        chunk = items[start:start + shard_size]
+        fingerprint = shard_fingerprint(chunk, model_name)
+        stats.shards += 1
+        done = shards.get(str(shard_no))
+        if done and done.get('fingerprint') == fingerprint and \
+                os.path.exists(os.path.join(out_dir, done['features'])):
+            stats.skipped += 1
+            continue
+        pending[shard_no] = (chunk, fingerprint)
+    # Shards past the end of a catalog that shrank
+    for shard_no in [k for k in shards if int(k) >= stats.shards]:
+        del shards[shard_no]
+    save_manifest(out_dir, manifest)
+
+    started = time.perf_counter()
+    if pending:
+        print(f"🔍 Indexing {len(pending)} of {stats.shards} shards on {workers} worker(s) "
+              f"x {threads} thread(s)")
+        # spawn: forking a process that already loaded torch can deadlock its thread pools
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                                 initargs=(threads, model_name)) as pool:
+            futures = {pool.submit(_index_shard, shard_no, chunk, out_dir, batch_size): shard_no
+                       for shard_no, (chunk, _) in pending.items()}
+            try:
+                remaining = set(futures)
+                while remaining:
+                    finished, remaining = wait(remaining, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        shard_no = futures[future]
+                        try:
+                            entry = future.result()
+                        except Exception as e:
+                            # Left out of the manifest, so the next run retries it
+                            stats.failed_shards += 1
+                            print(f"❌ shard {shard_no} failed: {e}")
+                            continue
+                        entry['fingerprint'] = pending[shard_no][1]
+                        shards[str(shard_no)] = entry
+                        save_manifest(out_dir, manifest)
+                        stats.indexed += 1
+                        stats.images += entry['rows']
+                        stats.failed_images += entry['failed']
+                        stats.by_worker[entry['worker']] = stats.by_worker.get(entry['worker'], 0) + 1
+                        rate = stats.images / (time.perf_counter() - started)
+                        print(f"🔄 shard {shard_no}: {entry['rows']} images in {entry['seconds']}s "
+                              f"({stats.indexed}/{len(pending)} done, {rate:.1f} img/s)")
+            except KeyboardInterrupt:
+                pool.shutdown(wait=False, cancel_futures=True)
+                print(f"⚠️  Interrupted after {stats.indexed} shard(s); rerun to resume")
+                raise
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def load_features(out_dir: str) -> Tuple[List[Dict], np.ndarray]:
+    """All indexed rows (records, feature matrix) in shard order; failed rows are dropped"""
+    manifest = load_manifest(out_dir)
+    records, matrices = [], []
+    for shard_no in sorted(manifest.get('shards', {}), key=int):
+        entry = manifest['shards'][shard_no]
+        with open(os.path.join(out_dir, entry['records']), 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+        matrix = np.load(os.path.join(out_dir, entry['features']), mmap_mode='r')
+        keep = [i for i, row in enumerate(rows) if row['analysis'].get('status') == 'analyzed']
+        records.extend(rows[i] for i in keep)
+        matrices.append(np.asarray(matrix[keep]))
+    if not matrices:
+        return [], np.zeros((0, FEATURE_DIM), dtype=np.float32)
+    return records, np.concatenate(matrices)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Index catalog product images into resumable feature shards")
+    parser.add_argument('--catalog', default='data/products_catalog.json')
+    parser.add_argument('--image-dir', default='.', help="Base directory for image_url paths")
+    parser.add_argument('--output', default='data/image_index', help="Shard and manifest directory")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: cores / threads)")
+    parser.add_argument('--threads', type=int, default=2, help="Torch threads per worker")
+    parser.add_argument('--shard-size', type=int, default=256, help="Images per shard (the resume unit)")
+    parser.add_argument('--batch-size', type=int, default=32, help="Images per forward pass")
+    parser.add_argument('--model', default='resnet50', choices=['resnet50', 'resnet101', 'resnet152'])
+    parser.add_argument('--fresh', action='store_true', help="Ignore the existing manifest and reindex everything")
+    args = parser.parse_args()
+
+    if importlib.util.find_spec('torch') is None:
+        print("❌ PyTorch required. Install: pip install torch torchvision pillow")
+        raise SystemExit(1)
+
+    items = catalog_items(args.catalog, args.image_dir)
+    stats = run_index(items, args.output, workers=args.workers, threads=args.threads,
+                      shard_size=args.shard_size, batch_size=args.batch_size,
+                      model_name=args.model, fresh=args.fresh)
+    print(f"✅ {stats.indexed} shard(s) indexed, {stats.skipped} unchanged, "
+          f"{stats.images} images ({stats.failed_images} failed) in {stats.elapsed:.1f}s")
+    if stats.failed_shards:
+        print(f"⚠️  {stats.failed_shards} shard(s) failed; rerun to retry them")
+    print(json.dumps(stats.to_dict(), indent=2))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Image Analysis Jobs
+Uploads become prioritized jobs run by a bounded pool of worker processes, so
+ResNet inference never occupies a request thread. Identical images (same
+SHA-256) share one job, and finished results are kept for polling until they
+expire.
+"""
+
+import hashlib
+import heapq
+import itertools
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from metrics import counter, gauge, histogram
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+IMAGE_JOBS = counter('image_jobs_total', "Image analysis jobs by outcome "
+                     "(submitted|deduplicated|rejected|completed|failed)", ['outcome'])
+IMAGE_JOB_WAIT = histogram('image_job_queue_seconds', "Time a job waits before a worker picks it up",
+                           ['priority'])
+IMAGE_JOB_RUN = histogram('image_job_run_seconds', "Worker time per image analysis job")
+
+
+class QueueFull(Exception):
+    """Raised by submit when max_queued jobs are already waiting"""
+
+
+@dataclass
+class JobSettings:
+    workers: int = 2              # worker processes (0 disables async mode)
+    threads_per_worker: int = 1   # torch threads in each worker
+    max_queued: int = 100         # jobs waiting for a worker before submit raises QueueFull
+    result_ttl: float = 600.0     # seconds a finished job stays pollable (and deduplicates)
+    model_name: str = 'resnet50'
+
+    @classmethod
+    def from_env(cls) -> 'JobSettings':
+        """Read IMAGE_JOB_WORKERS / IMAGE_JOB_THREADS / IMAGE_JOB_MAX_QUEUED / IMAGE_JOB_RESULT_TTL"""
+        return cls(
+            workers=max(0, int(os.getenv('IMAGE_JOB_WORKERS', 2))),
+            threads_per_worker=max(1, int(os.getenv('IMAGE_JOB_THREADS', 1))),
+            max_queued=max(1, int(os.getenv('IMAGE_JOB_MAX_QUEUED', 100))),
+            result_ttl=max(0.0, float(os.getenv('IMAGE_JOB_RESULT_TTL', 600))),
+        )
+
+
+@dataclass
+class ImageJob:
+    id: str
+    image_hash: str
+    priority: int
+    path: str
+    status: str = 'queued'        # queued | running | completed | failed
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    analysis: Optional[Dict] = None
+    error: Optional[str] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self) -> Dict:
+        result = {
+            'job_id': self.id,
+            'status': self.status,
+            'priority': PRIORITY_NAMES[self.priority],
+            'image_hash': self.image_hash,
+            'created': self.created,
+        }
+        if self.started:
+            result['queue_seconds'] = round(self.started - self.created, 3)
+        if self.finished:
+            result['run_seconds'] = round(self.finished - self.started, 3)
+        if self.analysis is not None:
+            result['analysis'] = self.analysis
+        if self.error:
+            result['error'] = self.error
+        return result
+
+
+def _analyze(path: str) -> Dict:
+    """Runs in a worker process"""
+    from image_indexer import worker_detector
+    return worker_detector().analyze_image(path)
+
+
+class ImageJobQueue:
+    """Priority queue in front of a process pool with at most `workers` jobs in flight"""
+
+    def __init__(self, settings: Optional[JobSettings] = None):
+        self.settings = settings or JobSettings.from_env()
+        self._jobs: Dict[str, ImageJob] = {}
+        self._by_hash: Dict[str, str] = {}          # image hash -> job id
+        self._heap: List[Tuple[int, int, str]] = []  # (priority, sequence, job id)
+        self._sequence = itertools.count()
+        self._lock = threading.Condition()
+        self._queued = 0     # jobs in the heap (which may also hold stale entries from promotions)
+        self._running = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name='image-jobs', daemon=True)
+        self._dispatcher.start()
+        gauge('image_jobs_queued', "Image jobs waiting for a worker").set_function(lambda: self._queued)
+        gauge('image_jobs_running', "Image jobs being analyzed").set_function(lambda: self._running)
+
+    def submit(self, image: bytes, suffix: str = '', priority: str = 'normal') -> Tuple[ImageJob, bool]:
+        """
+        Queue an image for analysis
+
+        Returns the job and whether it was deduplicated (an identical image is
+        queued, running or finished within result_ttl). A deduplicated queued
+        job is promoted if the new request has a higher priority.
+        """
+        level = PRIORITIES.get(priority, PRIORITIES['normal'])
+        image_hash = hashlib.sha256(image).hexdigest()
+        with self._lock:
+            self._expire()
+            existing = self._jobs.get(self._by_hash.get(image_hash, ''))
+            if existing is not None and existing.status != 'failed':
+                if existing.status == 'queued' and level < existing.priority:
+                    existing.priority = level
+                    heapq.heappush(self._heap, (level, next(self._sequence), existing.id))
+                IMAGE_JOBS.labels('deduplicated').inc()
+                return existing, True
+            if self._closed:
+                raise RuntimeError("Job queue is closed")
+            if self._queued >= self.settings.max_queued:
+                IMAGE_JOBS.labels('rejected').inc()
+                raise QueueFull(f"{self.settings.max_queued} image jobs already queued")
+
+            fd, path = tempfile.mkstemp(suffix=suffix, prefix='image-job-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            job = ImageJob(id=uuid.uuid4().hex, image_hash=image_hash, priority=level, path=path)
+            self._jobs[job.id] = job
+            self._by_hash[image_hash] = job.id
+            heapq.heappush(self._heap, (level, next(self._sequence), job.id))
+            self._queued += 1
+            IMAGE_JOBS.labels('submitted').inc()
+            self._lock.notify_all()
+            return job, False
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[ImageJob]:
+        """The job once it has finished or timeout seconds have passed (long polling)"""
+        job = self.get(job_id)
+        if job is not None and timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    def _expire(self):
+        """Forget finished jobs older than result_ttl (lock held)"""
+        cutoff = time.time() - self.settings.result_ttl
+        expired = [job for job in self._jobs.values() if job.finished and job.finished < cutoff]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_hash.get(job.image_hash) == job.id:
+                del self._by_hash[job.image_hash]
+
+    def _next_job(self) -> Optional[ImageJob]:
+        """Highest-priority queued job (lock held); skips entries left behind by promotions"""
+        while self._heap:
+            level, _, job_id = heapq.heappop(self._heap)
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == 'queued' and job.priority == level:
+                return job
+        return None
+
+    def _dispatch(self):
+        # Jobs go to the pool only when a worker is free, so the heap decides the order
+        while True:
+            with self._lock:
+                while not self._closed and (self._running >= self.settings.workers or not self._heap):
+                    self._lock.wait()
+                if self._closed:
+                    return
+                job = self._next_job()
+                if job is None:
+                    continue
+                job.status = 'running'
+                job.started = time.time()
+                self._queued -= 1
+                self._running += 1
+                if self._pool is None:
+                    # spawn: the bridge process may already hold torch thread pools. Spawned
+                    # workers re-import the main script as __mp_main__, which ai_bridge.py
+                    # keeps cheap by skipping init_services() there
+                    self._pool = ProcessPoolExecutor(
+                        self.settings.workers, mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_pool, initargs=(self.settings.threads_per_worker,
+                                                          self.settings.model_name))
+                pool = self._pool
+            IMAGE_JOB_WAIT.labels(PRIORITY_NAMES[job.priority]).observe(job.started - job.created)
+            try:
+                future = pool.submit(_analyze, job.path)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda done, job=job: self._finish(job, done))
+
+    def _finish(self, job: ImageJob, future: Future):
+        try:
+            analysis = future.result()
+            error = analysis.get('error') if isinstance(analysis, dict) else None
+        except Exception as e:
+            analysis, error = None, f"{type(e).__name__}: {e}"
+        with self._lock:
+            if isinstance(future.exception(), BrokenProcessPool) and self._pool is not None:
+                # A worker died (or failed to load the model): start a fresh pool for later jobs
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            job.finished = time.time()
+            job.analysis = analysis
+            job.error = error
+            job.status = 'failed' if error else 'completed'
+            self._running -= 1
+            self._lock.notify_all()
+        IMAGE_JOBS.labels(job.status).inc()
+        IMAGE_JOB_RUN.observe(job.finished - job.started)
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+        job.done.set()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+            return {
+                'workers': self.settings.workers,
+                'running': self._running,
+                'queued': self._queued,
+                'jobs': by_status,
+            }
+
+    def close(self, wait: bool = False):
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def _init_pool(threads: int, model_name: str):
+    from image_indexer import init_worker
+    init_worker(threads, model_name)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Chat Intent Classification and Generation Profiles
+Keyword classifier (one Aho-Corasick pass, no model) that maps a chat message
+to an intent, and the generation settings each intent gets: output limit,
+temperature, an answer-format instruction and an early-stop condition. A price
+question ends after a sentence or two instead of filling 500 tokens, while a
+room-styling plan gets room to finish.
+"""
+
+import os
+import re
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+from metrics import counter
+from text_match import AhoCorasick, normalize_text
+
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    'styling': ['desain', 'design', 'dekorasi', 'decor', 'interior', 'tata ruang', 'menata', 'ditata',
+                'penataan', 'styling', 'paket furniture', 'paket ruangan', 'makeover', 'konsep ruangan',
+                'gaya ruangan', 'moodboard', 'mood board'],
+    'comparison': ['bandingkan', 'perbandingan', 'membandingkan', 'dibandingkan', 'compare', 'comparison',
+                   'versus', 'vs', 'bedanya', 'perbedaan', 'lebih bagus mana', 'mana yang lebih'],
+    'recommendation': ['rekomendasi', 'rekomendasikan', 'sarankan', 'saran', 'recommend', 'recommendation',
+                       'suggest', 'yang cocok', 'cocok untuk', 'pilihan', 'budget', 'anggaran', 'mencari',
+                       'cari', 'butuh'],
+    'specs': ['spesifikasi', 'spec', 'specs', 'ukuran', 'ukurannya', 'dimensi', 'panjang', 'lebar', 'tinggi',
+              'size', 'dimension', 'material', 'bahan', 'bahannya', 'terbuat dari', 'kapasitas', 'beban',
+              'berat', 'warna', 'garansi', 'warranty'],
+    'price_lookup': ['harga', 'harganya', 'berapa rp', 'price', 'biaya', 'cost', 'diskon', 'promo', 'cicilan'],
+    'small_talk': ['halo', 'hai', 'hi', 'hello', 'hey', 'selamat pagi', 'selamat siang', 'selamat sore',
+                   'selamat malam', 'apa kabar', 'terima kasih', 'makasih', 'thanks', 'thank you', 'oke', 'ok',
+                   'sip', 'siap', 'bye', 'dadah'],
+}
+
+# When several intents match, the one needing the longest answer wins so it is never cut short
+INTENT_PRIORITY = ['styling', 'comparison', 'recommendation', 'specs', 'price_lookup', 'small_talk']
+DEFAULT_INTENT = 'general'
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """Per-intent generation settings"""
+    max_tokens: Optional[int]            # None: the endpoint's TokenBudget output limit
+    temperature: float = 0.7
+    instruction: str = ''                # answer format, appended to the system prompt
+    max_sentences: Optional[int] = None  # early stop: end the answer after this many sentences
+    stop: Tuple[str, ...] = ()           # provider stop sequences
+
+    def llm_kwargs(self) -> Dict:
+        """Keyword arguments for LLMManager.chat / stream_chat"""
+        return {'temperature': self.temperature, 'stop': list(self.stop) or None,
+                'max_sentences': self.max_sentences}
+
+
+# INTENT_PROFILE_<INTENT>=max_tokens:temperature overrides (e.g. INTENT_PROFILE_STYLING=1500:0.9)
+PROFILES: Dict[str, GenerationProfile] = {
+    'price_lookup': GenerationProfile(
+        150, 0.2, "FORMAT JAWABAN: sebutkan harga (format Rp) langsung dalam 1-2 kalimat, tanpa daftar.",
+        max_sentences=3, stop=('\n\n',)),
+    'specs': GenerationProfile(
+        300, 0.3, "FORMAT JAWABAN: sebutkan spesifikasi yang ditanyakan secara ringkas, maksimal 5 poin."),
+    'comparison': GenerationProfile(
+        900, 0.4, "FORMAT JAWABAN: tabel perbandingan singkat, lalu produk terbaik untuk tiap skenario."),
+    'recommendation': GenerationProfile(
+        700, 0.7, "FORMAT JAWABAN: maksimal 3 produk, masing-masing dengan harga dan alasan singkat."),
+    'styling': GenerationProfile(
+        1200, 0.8, "FORMAT JAWABAN: paket furniture per area ruangan dengan total harga dan alasan desain singkat."),
+    'small_talk': GenerationProfile(
+        80, 0.7, "FORMAT JAWABAN: balas singkat dan ramah dalam 1-2 kalimat, lalu tawarkan bantuan memilih furniture.",
+        max_sentences=2, stop=('\n\n',)),
+    DEFAULT_INTENT: GenerationProfile(None, 0.7),
+}
+
+CHAT_INTENTS = counter('chat_intents_total', "Chat messages by classified intent", ['intent'])
+
+
+def load_profiles() -> Dict[str, GenerationProfile]:
+    """
+    Apply the INTENT_PROFILE_<INTENT> overrides to PROFILES once, at startup (after
+    .env is loaded), so a malformed value stops the server instead of failing requests
+    """
+    for intent, profile in list(PROFILES.items()):
+        name = f'INTENT_PROFILE_{intent.upper()}'
+        override = os.getenv(name)
+        if not override:
+            continue
+        try:
+            max_tokens, temperature = override.split(':')
+            max_tokens, temperature = int(max_tokens), float(temperature)
+        except ValueError:
+            raise ValueError(f"{name}={override!r}: expected <max tokens>:<temperature>") from None
+        if max_tokens <= 0 or not 0.0 <= temperature <= 2.0:
+            raise ValueError(f"{name}={override!r}: max tokens must be positive and temperature in 0-2")
+        PROFILES[intent] = replace(profile, max_tokens=max_tokens, temperature=temperature)
+    return PROFILES
+
+
+def generation_profile(intent: str) -> GenerationProfile:
+    return PROFILES.get(intent, PROFILES[DEFAULT_INTENT])
+
+
+class IntentClassifier:
+    """Message -> intent (DEFAULT_INTENT when no keyword matches)"""
+
+    def __init__(self, keywords: Dict[str, List[str]] = INTENT_KEYWORDS):
+        self._intents: List[str] = []
+        phrases = []
+        for intent, words in keywords.items():
+            for word in words:
+                phrases.append(word)
+                self._intents.append(intent)
+        self._matcher = AhoCorasick(phrases)
+        self._rank = {intent: rank for rank, intent in enumerate(INTENT_PRIORITY)}
+
+    def classify(self, message: str, count: bool = True) -> str:
+        """count=False for messages no user sent (prefetched questions), kept out of chat_intents_total"""
+        found = {self._intents[index] for _, _, index in self._matcher.search(normalize_text(message))}
+        intent = min(found, key=lambda i: self._rank.get(i, len(self._rank))) if found else DEFAULT_INTENT
+        if count:
+            CHAT_INTENTS.labels(intent).inc()
+        return intent
+
+
+# "." "!" "?" followed by whitespace; "Rp 4.500.000" has no sentence end inside
+_SENTENCE_END = re.compile(r'[.!?]+(?=\s)')
+
+
+class SentenceLimit:
+    """Early-stop condition: ends a streamed answer after max_sentences complete sentences"""
+
+    def __init__(self, max_sentences: int):
+        self.max_sentences = max_sentences
+        self.sentences = 0
+        self._text = ''
+        self._scan = 0  # sentence ends before this offset are already counted
+
+    def feed(self, chunk: str) -> Tuple[str, bool]:
+        """(part of chunk to pass on, whether the limit is reached and the stream should stop)"""
+        start = len(self._text)
+        self._text += chunk
+        for match in _SENTENCE_END.finditer(self._text, self._scan):
+            self._scan = match.end()
+            line_start = self._text.rfind('\n', 0, match.start()) + 1
+            if self._text[line_start:match.start()].strip().isdigit():
+                continue  # "1." list marker
+            self.sentences += 1
+            if self.sentences >= self.max_sentences:
+                return self._text[start:max(start, match.end())], True
+        return chunk, False
+
+    @staticmethod
+    def truncate(text: str, max_sentences: int) -> str:
+        """text cut after max_sentences sentences (whole answers from non-streaming calls)"""
+        return SentenceLimit(max_sentences).feed(text + ' ')[0].rstrip()
@@ -6,15 +6,49 @@ Supports: Google Gemini, DeepSeek, OpenAI
 
 import os
 import json
+import time
 import asyncio
+import hashlib
 from typing import Optional, List, Dict, AsyncGenerator
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 import dotenv
 
+from metrics import histogram, counter, exponential_buckets
+from tracing import start_span
+from token_accounting import CallUsage, LEDGER, estimate_tokens
+from http_transport import get_http_client
+from single_flight import SingleFlight, StreamFanout
+from intent import SentenceLimit
+
 # Load environment variables
 dotenv.load_dotenv()
 
+LLM_DURATION = histogram('llm_request_duration_seconds', "Full LLM call duration",
+                         ['provider', 'mode'])
+LLM_TTFT = histogram('llm_time_to_first_token_seconds', "Time until the first streamed chunk",
+                     ['provider'])
+LLM_TOKENS_PER_SEC = histogram('llm_tokens_per_second', "Streaming rate after the first chunk "
+                               "(one chunk counted as one token)", ['provider'],
+                               buckets=exponential_buckets(1, 2, 10))
+LLM_ERRORS = counter('llm_errors_total', "LLM calls that returned an in-band error", ['provider', 'mode'])
+PROMPT_CHARS = histogram('llm_prompt_chars', "System prompt + message size in characters",
+                         ['provider'], buckets=exponential_buckets(256, 2, 12))
+LLM_COALESCED = counter('llm_coalesced_total', "Calls answered by an identical call already in flight",
+                        ['provider', 'mode'])
+LLM_EARLY_STOPS = counter('llm_early_stops_total', "Streams ended by the intent's early-stop condition",
+                          ['provider'])
+PROMPT_TOKENS = histogram('llm_prompt_tokens', "Estimated prompt size in tokens (local estimate)",
+                          ['provider'], buckets=exponential_buckets(64, 2, 12))
+
+
+def _record_prompt(provider: str, message: str, system_prompt: Optional[str]) -> int:
+    """Observe prompt size; returns the estimated prompt tokens"""
+    tokens = estimate_tokens(message) + estimate_tokens(system_prompt)
+    PROMPT_CHARS.labels(provider).observe(len(message) + len(system_prompt or ''))
+    PROMPT_TOKENS.labels(provider).observe(tokens)
+    return tokens
+
 
 @dataclass
 class ChatMessage:
@@ -23,6 +57,17 @@ class ChatMessage:
     content: str
 
 
+def _sampling(temperature: float, stop: Optional[List[str]]) -> Dict:
+    """OpenAI-style sampling arguments (stop only when set)"""
+    return {'temperature': temperature, 'stop': stop} if stop else {'temperature': temperature}
+
+
+def _report_openai_usage(response, usage: Optional[CallUsage]):
+    """Copy OpenAI-style `usage` (completion or final stream chunk), when present"""
+    if usage is not None and getattr(response, 'usage', None) is not None:
+        usage.report(response.usage.prompt_tokens, response.usage.completion_tokens)
+
+
 class LLMClient(ABC):
     """Abstract base class for LLM clients"""
     
@@ -32,12 +77,16 @@ class LLMClient(ABC):
         self.conversation_history: List[ChatMessage] = []
     
     @abstractmethod
-    async def chat(self, message: str, system_prompt: str = None) -> str:
-        """Send message and get response"""
+    async def chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                   usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                   stop: Optional[List[str]] = None) -> str:
+        """Send message and get response (provider token counts go to usage.report)"""
         pass
     
     @abstractmethod
-    async def stream_chat(self, message: str, system_prompt: str = None) -> AsyncGenerator:
+    async def stream_chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                          usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                          stop: Optional[List[str]] = None) -> AsyncGenerator:
         """Stream response chunks"""
         pass
     
@@ -70,22 +119,29 @@ class GeminiClient(LLMClient):
             print("⚠️  google-generativeai not installed: pip install google-generativeai")
             self.client = None
     
-    async def chat(self, message: str, system_prompt: str = None) -> str:
+    async def chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                   usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                   stop: Optional[List[str]] = None) -> str:
         """Send message to Gemini"""
         if not self.client:
             return "❌ Gemini client not available"
         
         try:
             full_prompt = f"{system_prompt}\n\n{message}" if system_prompt else message
-            response = self.client.generate_content(
+            # The SDK call is blocking; keep it off the shared event loop
+            response = await asyncio.to_thread(
+                self.client.generate_content,
                 full_prompt,
-                generation_config={'max_output_tokens': 500}
+                generation_config=self._generation_config(max_tokens, temperature, stop)
             )
+            self._report_usage(response, usage)
             return response.text
         except Exception as e:
             return f"❌ Gemini error: {str(e)}"
     
-    async def stream_chat(self, message: str, system_prompt: str = None) -> AsyncGenerator:
+    async def stream_chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                          usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                          stop: Optional[List[str]] = None) -> AsyncGenerator:
         """Stream response from Gemini"""
         if not self.client:
             yield "❌ Gemini client not available"
@@ -93,23 +149,44 @@ class GeminiClient(LLMClient):
         
         try:
             full_prompt = f"{system_prompt}\n\n{message}" if system_prompt else message
-            response = self.client.generate_content(
+            response = await asyncio.to_thread(
+                self.client.generate_content,
                 full_prompt,
                 stream=True,
-                generation_config={'max_output_tokens': 500}
+                generation_config=self._generation_config(max_tokens, temperature, stop)
             )
             
-            for chunk in response:
+            chunks = iter(response)
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
                 if chunk.text:
                     yield chunk.text
+            self._report_usage(response, usage)
         except Exception as e:
             yield f"❌ Gemini stream error: {str(e)}"
+    
+    @staticmethod
+    def _generation_config(max_tokens: int, temperature: float, stop: Optional[List[str]]) -> Dict:
+        config = {'max_output_tokens': max_tokens, 'temperature': temperature}
+        if stop:
+            config['stop_sequences'] = stop
+        return config
+    
+    @staticmethod
+    def _report_usage(response, usage: Optional[CallUsage]):
+        """Copy usage_metadata token counts, when present"""
+        metadata = getattr(response, 'usage_metadata', None)
+        if usage is not None and metadata is not None:
+            usage.report(getattr(metadata, 'prompt_token_count', None),
+                         getattr(metadata, 'candidates_token_count', None))
 
 
 class DeepSeekClient(LLMClient):
     """DeepSeek API Client (OpenAI-compatible)"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None):
         api_key = api_key or os.getenv('DEEPSEEK_API_KEY')
         super().__init__(api_key, 'deepseek-chat')
         
@@ -117,14 +194,17 @@ class DeepSeekClient(LLMClient):
             from openai import AsyncOpenAI
             self.client = AsyncOpenAI(
                 api_key=self.api_key,
-                base_url='https://api.deepseek.com/v1'
+                base_url=base_url or os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1'),
+                http_client=get_http_client()
             )
             print("✅ DeepSeek client initialized")
         except ImportError:
             print("⚠️  openai not installed: pip install openai")
             self.client = None
     
-    async def chat(self, message: str, system_prompt: str = None) -> str:
+    async def chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                   usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                   stop: Optional[List[str]] = None) -> str:
         """Send message to DeepSeek"""
         if not self.client:
             return "❌ DeepSeek client not available"
@@ -139,15 +219,18 @@ class DeepSeekClient(LLMClient):
             response = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
-                max_tokens=500,
-                temperature=0.7
+                max_tokens=max_tokens,
+                **_sampling(temperature, stop)
             )
             
+            _report_openai_usage(response, usage)
             return response.choices[0].message.content
         except Exception as e:
             return f"❌ DeepSeek error: {str(e)}"
     
-    async def stream_chat(self, message: str, system_prompt: str = None) -> AsyncGenerator:
+    async def stream_chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                          usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                          stop: Optional[List[str]] = None) -> AsyncGenerator:
         """Stream response from DeepSeek"""
         if not self.client:
             yield "❌ DeepSeek client not available"
@@ -163,14 +246,19 @@ class DeepSeekClient(LLMClient):
             stream = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-                stream=True
+                max_tokens=max_tokens,
+                **_sampling(temperature, stop),
+                stream=True,
+                stream_options={'include_usage': True}
             )
             
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            # Closing releases the connection when the caller stops reading early
+            async with stream:
+                async for chunk in stream:
+                    # The final usage chunk has no choices
+                    _report_openai_usage(chunk, usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
         except Exception as e:
             yield f"❌ DeepSeek stream error: {str(e)}"
 
@@ -178,19 +266,23 @@ class DeepSeekClient(LLMClient):
 class OpenAIClient(LLMClient):
     """OpenAI API Client"""
     
-    def __init__(self, api_key: str = None, model: str = 'gpt-3.5-turbo'):
+    def __init__(self, api_key: str = None, model: str = 'gpt-3.5-turbo', base_url: str = None):
         api_key = api_key or os.getenv('OPENAI_API_KEY')
         super().__init__(api_key, model)
         
         try:
             from openai import AsyncOpenAI
-            self.client = AsyncOpenAI(api_key=self.api_key)
+            # base_url/OPENAI_BASE_URL point at OpenAI-compatible servers (e.g. benchmark fakes)
+            self.client = AsyncOpenAI(api_key=self.api_key, base_url=base_url or os.getenv('OPENAI_BASE_URL'),
+                                      http_client=get_http_client())
             print(f"✅ OpenAI client initialized ({model})")
         except ImportError:
             print("⚠️  openai not installed: pip install openai")
             self.client = None
     
-    async def chat(self, message: str, system_prompt: str = None) -> str:
+    async def chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                   usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                   stop: Optional[List[str]] = None) -> str:
         """Send message to OpenAI"""
         if not self.client:
             return "❌ OpenAI client not available"
@@ -205,15 +297,18 @@ class OpenAIClient(LLMClient):
             response = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
-                max_tokens=500,
-                temperature=0.7
+                max_tokens=max_tokens,
+                **_sampling(temperature, stop)
             )
             
+            _report_openai_usage(response, usage)
             return response.choices[0].message.content
         except Exception as e:
             return f"❌ OpenAI error: {str(e)}"
     
-    async def stream_chat(self, message: str, system_prompt: str = None) -> AsyncGenerator:
+    async def stream_chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                          usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                          stop: Optional[List[str]] = None) -> AsyncGenerator:
         """Stream response from OpenAI"""
         if not self.client:
             yield "❌ OpenAI client not available"
@@ -229,14 +324,19 @@ class OpenAIClient(LLMClient):
             stream = await self.client.chat.completions.create(
                 model=self.model_name,
                 messages=messages,
-                max_tokens=500,
-                temperature=0.7,
-                stream=True
+                max_tokens=max_tokens,
+                **_sampling(temperature, stop),
+                stream=True,
+                stream_options={'include_usage': True}
             )
             
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            # Closing releases the connection when the caller stops reading early
+            async with stream:
+                async for chunk in stream:
+                    # The final usage chunk has no choices
+                    _report_openai_usage(chunk, usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
         except Exception as e:
             yield f"❌ OpenAI stream error: {str(e)}"
 
@@ -253,6 +353,10 @@ class LLMManager:
         """
         self.primary_provider = primary_provider.lower()
         self.clients = {}
+        # Identical concurrent calls share one upstream request (LLM_COALESCE=false to disable)
+        self.coalesce = os.getenv('LLM_COALESCE', 'true').lower() == 'true'
+        self._flights = SingleFlight()
+        self._fanout = StreamFanout()
         self._initialize_clients()
     
     def _initialize_clients(self):
@@ -280,23 +384,176 @@ class LLMManager:
         provider = provider or self.primary_provider
         return self.clients.get(provider.lower())
     
-    async def chat(self, message: str, system_prompt: str = None, provider: str = None) -> str:
-        """Send message using specified provider"""
+    @staticmethod
+    def _begin_usage(usage: Optional[CallUsage], provider: str, client: LLMClient,
+                     prompt_tokens: int, max_tokens: int) -> CallUsage:
+        usage = usage or CallUsage('direct')
+        usage.provider = provider
+        usage.model = client.model_name
+        usage.estimated_prompt_tokens = prompt_tokens
+        usage.max_output_tokens = max_tokens
+        return usage
+    
+    @staticmethod
+    def _finish_usage(usage: CallUsage, response_text: str):
+        """Fall back to local estimates when the provider reported nothing, then aggregate"""
+        if usage.source != 'provider':
+            usage.prompt_tokens = usage.estimated_prompt_tokens
+            usage.completion_tokens = estimate_tokens(response_text)
+        LEDGER.record(usage)
+    
+    @staticmethod
+    def _flight_key(provider: str, client: LLMClient, message: str, system_prompt: Optional[str],
+                    max_tokens: int, sampling: Dict, max_sentences: Optional[int]) -> tuple:
+        """(provider, model, prompt fingerprint, normalized message, generation settings)"""
+        fingerprint = hashlib.sha1((system_prompt or '').encode('utf-8')).hexdigest()
+        return (provider, client.model_name, fingerprint, ' '.join(message.split()).casefold(), max_tokens,
+                sampling['temperature'], tuple(sampling['stop'] or ()), max_sentences)
+    
+    @staticmethod
+    def _share_usage(usage: CallUsage, leader: CallUsage, mode: str):
+        """Token counts of the shared call; the cost was already booked by its caller"""
+        usage.prompt_tokens = leader.prompt_tokens
+        usage.completion_tokens = leader.completion_tokens
+        usage.source = leader.source
+        usage.coalesced = True
+        LLM_COALESCED.labels(usage.provider, mode).inc()
+    
+    async def chat(self, message: str, system_prompt: str = None, provider: str = None,
+                   max_tokens: int = 500, usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                   stop: Optional[List[str]] = None, max_sentences: Optional[int] = None) -> str:
+        """
+        Send message using specified provider
+        
+        Args:
+            max_tokens: Output token limit passed to the provider
+            usage: Filled with token counts and cost, and added to the usage ledger
+            temperature, stop: Sampling settings passed to the provider
+            max_sentences: Cut the answer after this many sentences (intent early stop)
+        """
         client = self.get_client(provider)
         if not client:
             return f"❌ Provider '{provider}' not available"
         
-        return await client.chat(message, system_prompt)
+        provider = (provider or self.primary_provider).lower()
+        prompt_tokens = _record_prompt(provider, message, system_prompt)
+        usage = self._begin_usage(usage, provider, client, prompt_tokens, max_tokens)
+        sampling = {'temperature': temperature, 'stop': stop}
+        upstream = lambda: self._chat_upstream(client, provider, message, system_prompt, max_tokens, usage,
+                                               sampling, max_sentences)
+        if not self.coalesce:
+            return (await upstream())[0]
+        
+        key = self._flight_key(provider, client, message, system_prompt, max_tokens, sampling, max_sentences)
+        (response, leader), shared = await self._flights.do(key, upstream)
+        if shared:
+            self._share_usage(usage, leader, 'chat')
+        return response
+    
+    async def _chat_upstream(self, client: LLMClient, provider: str, message: str, system_prompt: Optional[str],
+                             max_tokens: int, usage: CallUsage, sampling: Dict, max_sentences: Optional[int]):
+        """One provider call; returns (response, usage) so coalesced callers can copy the counts"""
+        with start_span('llm.chat', kind='CLIENT', attributes={
+            'llm.provider': provider, 'llm.model': client.model_name,
+            'llm.prompt_chars': len(message) + len(system_prompt or ''),
+        }) as span:
+            started = time.perf_counter()
+            response = await client.chat(message, system_prompt, max_tokens=max_tokens, usage=usage, **sampling)
+            LLM_DURATION.labels(provider, 'chat').observe(time.perf_counter() - started)
+            if isinstance(response, str) and response.startswith('❌'):
+                LLM_ERRORS.labels(provider, 'chat').inc()
+                span.set_attribute('error', response[:200])
+            else:
+                self._finish_usage(usage, response or '')
+                if max_sentences and response:
+                    response = SentenceLimit.truncate(response, max_sentences)
+                span.set_attribute('llm.prompt_tokens', usage.prompt_tokens)
+                span.set_attribute('llm.completion_tokens', usage.completion_tokens)
+        return response, usage
     
-    async def stream_chat(self, message: str, system_prompt: str = None, provider: str = None) -> AsyncGenerator:
-        """Stream response from specified provider"""
+    async def stream_chat(self, message: str, system_prompt: str = None, provider: str = None,
+                          max_tokens: int = 500, usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                          stop: Optional[List[str]] = None, max_sentences: Optional[int] = None) -> AsyncGenerator:
+        """
+        Stream response from specified provider (usage is complete once the stream ends)
+        
+        Identical concurrent streams share one upstream stream; a caller joining
+        late first receives the chunks already produced. With max_sentences the
+        upstream stream is closed as soon as that many sentences were produced.
+        """
         client = self.get_client(provider)
         if not client:
             yield f"❌ Provider '{provider}' not available"
             return
         
-        async for chunk in client.stream_chat(message, system_prompt):
-            yield chunk
+        provider = (provider or self.primary_provider).lower()
+        prompt_tokens = _record_prompt(provider, message, system_prompt)
+        usage = self._begin_usage(usage, provider, client, prompt_tokens, max_tokens)
+        sampling = {'temperature': temperature, 'stop': stop}
+        upstream = lambda: self._stream_upstream(client, provider, message, system_prompt, max_tokens, usage,
+                                                 sampling, max_sentences)
+        if not self.coalesce:
+            async for chunk in upstream():
+                yield chunk
+            return
+        
+        key = self._flight_key(provider, client, message, system_prompt, max_tokens, sampling, max_sentences)
+        stream, leader = self._fanout.subscribe(key, upstream, owner=usage)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+        if leader is not usage:
+            self._share_usage(usage, leader, 'stream')
+    
+    async def _stream_upstream(self, client: LLMClient, provider: str, message: str,
+                               system_prompt: Optional[str], max_tokens: int, usage: CallUsage,
+                               sampling: Dict, max_sentences: Optional[int]) -> AsyncGenerator:
+        """One provider stream with its span, metrics and usage accounting"""
+        # Not made current: each step of the stream may run in a different task context
+        span = start_span('llm.stream', kind='CLIENT', attributes={
+            'llm.provider': provider, 'llm.model': client.model_name,
+            'llm.prompt_chars': len(message) + len(system_prompt or ''),
+        })
+        started = time.perf_counter()
+        first_at, chunks, failed = None, 0, False
+        pieces = []
+        limit = SentenceLimit(max_sentences) if max_sentences else None
+        source = client.stream_chat(message, system_prompt, max_tokens=max_tokens, usage=usage, **sampling)
+        try:
+            async for chunk in source:
+                if first_at is None:
+                    first_at = time.perf_counter()
+                    LLM_TTFT.labels(provider).observe(first_at - started)
+                    span.add_event('first_chunk')
+                    span.set_attribute('llm.ttft_ms', round((first_at - started) * 1000, 1))
+                    failed = chunk.startswith('❌')
+                done = False
+                if limit and not failed:
+                    chunk, done = limit.feed(chunk)
+                if chunk:
+                    chunks += 1
+                    pieces.append(chunk)
+                    yield chunk
+                if done:
+                    # Enough sentences for this intent: stop paying for the rest
+                    LLM_EARLY_STOPS.labels(provider).inc()
+                    span.set_attribute('llm.early_stop', True)
+                    break
+        finally:
+            await source.aclose()
+            span.set_attribute('llm.chunks', chunks)
+            span.end()
+        
+        finished = time.perf_counter()
+        LLM_DURATION.labels(provider, 'stream').observe(finished - started)
+        if failed:
+            LLM_ERRORS.labels(provider, 'stream').inc()
+            return
+        self._finish_usage(usage, ''.join(pieces))
+        if chunks > 1 and finished > first_at:
+            LLM_TOKENS_PER_SEC.labels(provider).observe((chunks - 1) / (finished - first_at))
     
     def list_providers(self) -> List[str]:
         """List available providers"""
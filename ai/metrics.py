@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+In-process Metrics with Prometheus Text Exposition
+Counters, gauges and histograms cheap enough for request hot paths
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; covers cache hits (ms) up to slow LLM completions (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def exponential_buckets(start: float, factor: float, count: int) -> Tuple[float, ...]:
+    """`count` upper bounds: start, start*factor, start*factor^2, ..."""
+    return tuple(start * factor ** i for i in range(count))
+
+
+class _ThreadShards:
+    """Per-thread value arrays
+
+    Each thread only ever writes its own array, so updates need no lock and
+    never contend; readers sum the arrays. Arrays of threads that have exited
+    (werkzeug spawns one per request) are folded into `_retired` whenever a new
+    thread registers, so the list stays as long as the number of live threads.
+    """
+
+    __slots__ = ('_width', '_local', '_arrays', '_retired', '_lock')
+
+    def __init__(self, width: int):
+        self._width = width
+        self._local = threading.local()
+        self._arrays: List[Tuple[threading.Thread, List[float]]] = []
+        self._retired = [0.0] * width
+        self._lock = threading.Lock()
+
+    def mine(self) -> List[float]:
+        try:
+            return self._local.array
+        except AttributeError:
+            array = [0.0] * self._width
+            with self._lock:
+                self._fold_retired()
+                self._arrays.append((threading.current_thread(), array))
+            self._local.array = array
+            return array
+
+    def _fold_retired(self):
+        """Add the arrays of exited threads to `_retired` and drop them (lock held)"""
+        live = []
+        for thread, array in self._arrays:
+            if thread.is_alive():
+                live.append((thread, array))
+            else:
+                for i, value in enumerate(array):
+                    self._retired[i] += value
+        self._arrays = live
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            self._fold_retired()
+            live = self._arrays
+            totals = list(self._retired)
+        for _, array in live:
+            for i, value in enumerate(array):
+                totals[i] += value
+        return totals
+
+
+class _CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _ThreadShards(1)
+
+    def inc(self, amount: float = 1.0):
+        self._shards.mine()[0] += amount
+
+    def value(self) -> float:
+        return self._shards.totals()[0]
+
+
+class _GaugeChild:
+    __slots__ = ('_shards', '_base', '_offset', '_fn')
+
+    def __init__(self):
+        self._shards = _ThreadShards(1)
+        self._base = 0.0
+        self._offset = 0.0
+        self._fn: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0):
+        self._shards.mine()[0] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._shards.mine()[0] -= amount
+
+    def set(self, value: float):
+        # inc/dec deltas after this point still apply on top of `value`
+        self._offset = self._shards.totals()[0]
+        self._base = value
+
+    def set_function(self, fn: Callable[[], float]):
+        """Sample the gauge from fn() at scrape time instead"""
+        self._fn = fn
+
+    def value(self) -> float:
+        if self._fn is not None:
+            return float(self._fn())
+        return self._base + self._shards.totals()[0] - self._offset
+
+
+class _HistogramChild:
+    __slots__ = ('_bounds', '_shards')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # one slot per bucket, +Inf, then the running sum
+        self._shards = _ThreadShards(len(bounds) + 2)
+
+    def observe(self, value: float):
+        array = self._shards.mine()
+        array[bisect_left(self._bounds, value)] += 1
+        array[-1] += value
+
+    @contextmanager
+    def time(self):
+        """Observe the wall time of the with-block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Tuple[List[float], float, float]:
+        """(cumulative bucket counts incl. +Inf, sum, count)"""
+        totals = self._shards.totals()
+        cumulative, running = [], 0.0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1], running
+
+
+class _Metric:
+    """A metric family; `labels()` returns the child for one label set"""
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines)
+
+    def children(self) -> List[Tuple[Dict[str, str], object]]:
+        """(labels, child) for every label set seen so far"""
+        return [(dict(zip(self.labelnames, values)), child) for values, child in list(self._children.items())]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for labels, child in self.children():
+            yield '', labels, child.value()
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, fn: Callable[[], float]):
+        self.labels().set_function(fn)
+
+    def _samples(self):
+        for labels, child in self.children():
+            yield '', labels, child.value()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _samples(self):
+        bounds = [_format_value(b) for b in self.buckets] + ['+Inf']
+        for labels, child in self.children():
+            cumulative, total, count = child.snapshot()
+            for bound, value in zip(bounds, cumulative):
+                yield '_bucket', {**labels, 'le': bound}, value
+            yield '_sum', labels, total
+            yield '_count', labels, count
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """Named metric families, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered as {metric.kind} {metric.labelnames}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Process-wide default registry
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+# Shared by every cache in the service: ratio = hit / (hit + miss)
+CACHE_LOOKUPS = counter('cache_lookups_total', "Cache lookups by cache and result (hit|miss)",
+                        ['cache', 'result'])
+
+
+def record_cache(cache: str, hit: bool):
+    """Count one lookup against a named cache"""
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Speculative Follow-up Prefetch
+Classifies chat messages into follow-up topics (price, dimensions, warranty,
+delivery, ...), predicts the next likely topics for the product being
+discussed from a transition model seeded with qa_sft_dataset.json and updated
+from live conversations, and warms the response cache for them in the
+background under strict concurrency and token budgets
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from batch_chat import TokenBucket
+from binary_store import load_document, resolve_path
+from intent import GenerationProfile
+from metrics import counter
+from response_cache import CachedAnswer, ResponseCache
+from text_match import AhoCorasick, normalize_text
+from token_accounting import CallUsage, estimate_tokens
+
+# Topics whose answers depend only on the product (safe to cache and prefetch)
+TOPIC_KEYWORDS: Dict[str, List[str]] = {
+    'pricing': ['harga', 'harganya', 'berapa rp', 'price', 'biaya', 'cost', 'diskon', 'promo', 'cicilan'],
+    'dimensions': ['ukuran', 'ukurannya', 'dimensi', 'panjang', 'lebar', 'tinggi', 'size', 'dimension', 'muat'],
+    'material': ['material', 'bahan', 'bahannya', 'terbuat dari', 'made of'],
+    'warranty': ['garansi', 'garansinya', 'warranty', 'jaminan', 'retur', 'return'],
+    'delivery': ['pengiriman', 'dikirim', 'kirim', 'ongkir', 'ongkos kirim', 'delivery', 'shipping'],
+    'maintenance': ['merawat', 'perawatan', 'membersihkan', 'dibersihkan', 'cleaning', 'maintenance'],
+    'customization': ['custom', 'kustom', 'dikustomisasi', 'personalisasi', 'warna lain', 'customize'],
+    'installation': ['instalasi', 'pemasangan', 'dipasang', 'rakit', 'merakit', 'assembly', 'install'],
+    'specification': ['spesifikasi', 'spec', 'kapasitas', 'beban', 'berat'],
+}
+
+# qa_sft_dataset.json category -> topic (others count as 'general')
+QA_CATEGORY_TOPICS = {
+    'pricing': 'pricing', 'specification': 'specification', 'maintenance': 'maintenance',
+    'customization': 'customization', 'installation': 'installation', 'material': 'material',
+}
+
+# The usual path of a product conversation, weighted above dataset/observed transitions at start
+DEFAULT_PATH = ['general', 'pricing', 'dimensions', 'warranty', 'delivery']
+PATH_PRIOR = 3.0
+
+QUESTION_TEMPLATES = {
+    'pricing': "Berapa harga {name}?",
+    'dimensions': "Berapa ukuran dan dimensi {name}?",
+    'material': "Material apa yang digunakan pada {name}?",
+    'warranty': "Apa garansi untuk {name}?",
+    'delivery': "Bagaimana pengiriman {name} dan berapa lama sampai?",
+    'maintenance': "Bagaimana cara merawat {name}?",
+    'customization': "Apakah {name} dapat dikustomisasi?",
+    'installation': "Bagaimana proses instalasi {name}?",
+    'specification': "Apa spesifikasi lengkap {name}?",
+}
+
+PREFETCH_JOBS = counter('prefetch_jobs_total', "Prefetch decisions by outcome", ['outcome'])
+
+
+class TopicClassifier:
+    """Message -> follow-up topic, or None when zero or several topics match"""
+
+    def __init__(self, keywords: Dict[str, List[str]] = TOPIC_KEYWORDS):
+        self._topics: List[str] = []
+        phrases = []
+        for topic, words in keywords.items():
+            for word in words:
+                phrases.append(word)
+                self._topics.append(topic)
+        self._matcher = AhoCorasick(phrases)
+
+    def classify(self, message: str) -> Optional[str]:
+        topics = {self._topics[index] for _, _, index in self._matcher.search(normalize_text(message))}
+        return topics.pop() if len(topics) == 1 else None
+
+
+class FollowUpPredictor:
+    """First-order transition counts between topics ('general' = anything else)"""
+
+    def __init__(self, qa_path: Optional[str] = 'data/qa_sft_dataset.json'):
+        self._counts: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        # (product id, topic) -> question from the dataset, preferred over templates
+        self.questions: Dict[Tuple[int, str], str] = {}
+
+        for prev, nxt in zip(DEFAULT_PATH, DEFAULT_PATH[1:]):
+            self._add(prev, nxt, PATH_PRIOR)
+        if qa_path and os.path.exists(resolve_path(qa_path)):
+            self._seed_from_dataset(qa_path)
+
+    def _add(self, prev: str, nxt: str, weight: float = 1.0):
+        row = self._counts.setdefault(prev, {})
+        row[nxt] = row.get(nxt, 0.0) + weight
+
+    def _seed_from_dataset(self, qa_path: str):
+        """Per product, the dataset's questions in id order form one conversation path"""
+        pairs = sorted(load_document(qa_path).get('qa_pairs', []), key=lambda p: p.get('id', 0))
+        paths: Dict[int, List[str]] = {}
+        for pair in pairs:
+            topic = QA_CATEGORY_TOPICS.get(pair.get('category'), 'general')
+            for product_id in pair.get('product_ids', []):
+                paths.setdefault(product_id, ['general']).append(topic)
+                if topic != 'general':
+                    self.questions.setdefault((product_id, topic), pair['question'])
+        for path in paths.values():
+            for prev, nxt in zip(path, path[1:]):
+                if prev != nxt:
+                    self._add(prev, nxt)
+
+    def observe(self, prev: Optional[str], nxt: Optional[str]):
+        prev, nxt = prev or 'general', nxt or 'general'
+        if prev != nxt:
+            with self._lock:
+                self._add(prev, nxt)
+
+    def predict(self, current: Optional[str], exclude=(), k: int = 2) -> List[str]:
+        """Most likely next topics (never 'general', the current topic or `exclude`)"""
+        current = current or 'general'
+        with self._lock:
+            row = dict(self._counts.get(current, {}))
+        ranked = sorted(row.items(), key=lambda item: -item[1])
+        skip = set(exclude) | {current, 'general'}
+        return [topic for topic, _ in ranked if topic not in skip][:k]
+
+    def question(self, product: Dict, topic: str) -> str:
+        return self.questions.get((product['id'], topic)) or QUESTION_TEMPLATES[topic].format(name=product['name'])
+
+
+@dataclass
+class PrefetchSettings:
+    enabled: bool = True
+    top_k: int = 2                      # follow-ups warmed after each answer
+    max_concurrent: int = 2             # prefetch LLM calls in flight
+    max_busy: int = 4                   # skip while this many user chats are in flight
+    tokens_per_minute: int = 6000       # estimated prompt + output tokens spent on prefetch
+    max_tokens: int = 300               # output limit when the question's intent sets none
+
+    @classmethod
+    def from_env(cls) -> 'PrefetchSettings':
+        """PREFETCH_* environment variables"""
+        defaults = cls()
+        return cls(
+            enabled=os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true',
+            top_k=int(os.getenv('PREFETCH_TOP_K', defaults.top_k)),
+            max_concurrent=int(os.getenv('PREFETCH_MAX_CONCURRENT', defaults.max_concurrent)),
+            max_busy=int(os.getenv('PREFETCH_MAX_BUSY', defaults.max_busy)),
+            tokens_per_minute=int(os.getenv('PREFETCH_TOKENS_PER_MINUTE', defaults.tokens_per_minute)),
+            max_tokens=int(os.getenv('PREFETCH_MAX_TOKENS', defaults.max_tokens)),
+        )
+
+
+def context_fingerprint(customer_context: Optional[Dict]) -> str:
+    """Stable short hash of the customer context (answers differ per budget/style)"""
+    if not customer_context:
+        return ''
+    raw = json.dumps(customer_context, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+
+
+def question_fingerprint(question: str) -> str:
+    """Normalized question: casing, accents, spacing and end punctuation do not matter"""
+    return normalize_text(question).rstrip(' ?!.')
+
+
+def cache_key(provider: str, product_id: int, topic: str, customer_context: Optional[Dict],
+              question: str) -> Tuple:
+    """An answer is only reused for the question it was generated for, never for the whole topic"""
+    return (provider, product_id, topic, context_fingerprint(customer_context), question_fingerprint(question))
+
+
+class Prefetcher:
+    """Warms the response cache for predicted follow-ups on a background event loop"""
+
+    def __init__(self, llm_manager, cache: ResponseCache, loop: asyncio.AbstractEventLoop,
+                 predictor: FollowUpPredictor, build_prompt: Callable[[Dict, Optional[Dict], str, str], str],
+                 busy: Callable[[], int] = lambda: 0, settings: Optional[PrefetchSettings] = None,
+                 extract: Optional[Callable[[str, str], Dict]] = None,
+                 profile: Optional[Callable[[str], GenerationProfile]] = None):
+        """
+        Args:
+            loop: Event loop that owns the LLM clients (the bridge's background loop)
+            build_prompt: (product, customer_context, question, provider) -> system prompt
+            busy: Number of user chat requests currently in flight
+            extract: (answer, question) -> {'related_products', 'confidence'}
+            profile: question -> the generation profile a chat with that question gets,
+                so a served prefetch has the same answer format and limits
+        """
+        self.llm_manager = llm_manager
+        self.cache = cache
+        self.loop = loop
+        self.predictor = predictor
+        self.build_prompt = build_prompt
+        self.busy = busy
+        self.settings = settings or PrefetchSettings.from_env()
+        self.extract = extract
+        self.profile = profile
+        self._budget = TokenBucket(self.settings.tokens_per_minute, burst=self.settings.tokens_per_minute)
+        self._in_flight: Dict[Tuple, None] = {}
+        self._lock = threading.Lock()
+        self.tokens_spent = 0
+
+    def _outcome(self, outcome: str):
+        PREFETCH_JOBS.labels(outcome).inc()
+
+    def schedule(self, product: Dict, topic: Optional[str], provider: str,
+                 customer_context: Optional[Dict] = None, asked=()) -> List[str]:
+        """Queue prefetches for the topics likely to follow `topic`; returns the topics queued"""
+        if not self.settings.enabled:
+            return []
+        queued = []
+        for next_topic in self.predictor.predict(topic, exclude=asked, k=self.settings.top_k):
+            question = self.predictor.question(product, next_topic)
+            key = cache_key(provider, product['id'], next_topic, customer_context, question)
+            if self.cache.contains(key):
+                self._outcome('cached')
+                continue
+            if self.busy() >= self.settings.max_busy:
+                self._outcome('skipped_busy')
+                break
+            with self._lock:
+                if key in self._in_flight:
+                    continue
+                if len(self._in_flight) >= self.settings.max_concurrent:
+                    self._outcome('skipped_concurrency')
+                    break
+
+            profile = self.profile(question) if self.profile else GenerationProfile(None)
+            system_prompt = self.build_prompt(product, customer_context, question, provider)
+            if profile.instruction:
+                system_prompt = f"{system_prompt}\n\n{profile.instruction}"
+            max_tokens = profile.max_tokens or self.settings.max_tokens
+            cost = estimate_tokens(system_prompt) + estimate_tokens(question) + max_tokens
+            if not self._budget.try_acquire(cost):
+                self._outcome('skipped_budget')
+                break
+
+            with self._lock:
+                self._in_flight[key] = None
+            self._outcome('started')
+            asyncio.run_coroutine_threadsafe(self._run(key, question, system_prompt, provider, profile, max_tokens), self.loop)
+            queued.append(next_topic)
+        return queued
+
+    async def _run(self, key: Tuple, question: str, system_prompt: str, provider: str,
+                   profile: GenerationProfile, max_tokens: int):
+        try:
+            usage = CallUsage('prefetch')
+            answer = await self.llm_manager.chat(question, system_prompt, provider, max_tokens=max_tokens,
+                                                 usage=usage, **profile.llm_kwargs())
+            if not answer or answer.startswith('❌'):
+                self._outcome('failed')
+                return
+            self.tokens_spent += usage.prompt_tokens + usage.completion_tokens
+            mentions = self.extract(answer, question) if self.extract else {}
+            self.cache.put(key, CachedAnswer(answer, provider, mentions.get('related_products', []),
+                                             mentions.get('confidence', 0.0), prefetched=True))
+            self._outcome('completed')
+        except Exception:
+            self._outcome('failed')
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {
+            **self.cache.stats(),
+            'enabled': self.settings.enabled,
+            'in_flight': len(self._in_flight),
+            'tokens_spent': self.tokens_spent,
+        }
+
+
+@dataclass
+class FollowUp:
+    """What a chat message continues: product, topic and the cache slot for the answer"""
+    conversation_id: Optional[str]
+    product: Optional[Dict]
+    topic: Optional[str]
+    previous_topic: Optional[str]
+    asked: frozenset
+    key: Optional[Tuple] = None
+
+
+class ConversationTopics:
+    """conversation id -> (product id, last topic, topics asked), LRU-bounded"""
+
+    def __init__(self, max_conversations: int = 10000):
+        self.max_conversations = max_conversations
+        self._state: 'OrderedDict[str, Tuple[Optional[int], Optional[str], frozenset]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: Optional[str]) -> Tuple[Optional[int], Optional[str], frozenset]:
+        if not conversation_id:
+            return None, None, frozenset()
+        with self._lock:
+            return self._state.get(conversation_id, (None, None, frozenset()))
+
+    def update(self, conversation_id: Optional[str], product_id: Optional[int], topic: Optional[str]):
+        if not conversation_id:
+            return
+        with self._lock:
+            old_product, _, asked = self._state.pop(conversation_id, (None, None, frozenset()))
+            if product_id != old_product:
+                asked = frozenset()
+            self._state[conversation_id] = (product_id, topic, asked | {topic} if topic else asked)
+            while len(self._state) > self.max_conversations:
+                self._state.popitem(last=False)
@@ -1,11 +1,121 @@
+import argparse
 import csv
+import gzip
+import io
 import json
 import os
 import random
+import re
+import time
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+SPLIT_NAMES = ('train', 'val', 'test')
+
+# "A. teks", "b) teks" ... at the start of the string or after whitespace
+OPTION_MARKER = re.compile(r'(?:^|(?<=\s))([A-Ea-e])[.)]\s*')
+OPTION_LETTERS = 'ABCDE'
 
 def format_options(options_str):
     return options_str.replace('\n', ' ')
 
+def parse_options(options_str):
+    """Split an IndoMMLU `jawaban` string into {'A': text, ..., 'E': text}
+
+    Markers must appear in order (A, B, C, ...), so letters inside option text
+    such as "vitamin C." are not mistaken for new options.
+    """
+    markers = []
+    for match in OPTION_MARKER.finditer(options_str):
+        letter = match.group(1).upper()
+        if len(markers) < len(OPTION_LETTERS) and letter == OPTION_LETTERS[len(markers)]:
+            markers.append((letter, match.start(), match.end()))
+
+    options = {}
+    for i, (letter, _, text_start) in enumerate(markers):
+        text_end = markers[i + 1][1] if i + 1 < len(markers) else len(options_str)
+        options[letter] = ' '.join(options_str[text_start:text_end].split())
+    return options
+
+def format_indommlu_row(row):
+    """Convert one IndoMMLU CSV row to an SFT entry (None if the row is incomplete)"""
+    question = row.get('soal', '').strip()
+    options = row.get('jawaban', '').strip()
+    answer_key = row.get('kunci', '').strip()
+    subject = row.get('subject', 'General')
+    level = row.get('level', 'General')
+
+    if not question or not options or not answer_key:
+        return None
+
+    # Instruction for the model
+    instruction = f"Jawablah pertanyaan berikut mengenai {subject} ({level})."
+
+    # Normalize options to one "X. teks" per line when they can be parsed
+    parsed = parse_options(options)
+    if parsed:
+        options = '\n'.join(f"{letter}. {text}" for letter, text in parsed.items())
+
+    # Create the full input with options
+    full_input = f"{question}\n\nPilihan Jawaban:\n{options}"
+
+    # Map the key to the full answer text when the option exists
+    answer_key = answer_key.upper()
+    if answer_key in parsed:
+        output_text = f"Jawaban yang benar adalah {answer_key}. {parsed[answer_key]}"
+    else:
+        output_text = f"Jawaban yang benar adalah {answer_key}."
+
+    # Create SFT entry (Alpaca/Instruction format)
+    return {
+        "instruction": instruction,
+        "input": full_input,
+        "output": output_text,
+        "source": "IndoMMLU",
+        "subject": subject,
+        "level": level
+    }
+
+def format_qa_pair(pair):
+    """Convert one qa_sft_dataset.json pair to an SFT entry"""
+    question = (pair.get('question') or '').strip()
+    answer = (pair.get('answer') or '').strip()
+
+    if not question or not answer:
+        return None
+
+    return {
+        "instruction": "Jawablah pertanyaan pelanggan tentang produk furniture Xionco.",
+        "input": question,
+        "output": answer,
+        "source": "XioncoQA",
+        "subject": pair.get('category', 'General'),
+        "level": "General",
+        "product_ids": pair.get('product_ids', [])
+    }
+
+# Schema name -> row formatter
+FORMATTERS = {
+    'indommlu': format_indommlu_row,
+    'qa': format_qa_pair,
+}
+
+# Schema name -> keys every record of that schema has
+SCHEMA_KEYS = {
+    'indommlu': ('soal', 'jawaban', 'kunci'),
+    'qa': ('question', 'answer'),
+}
+
+CSV_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst')
+
 def process_indommlu(input_file, output_file):
     print(f"🔄 Processing {input_file}...")
     
@@ -16,36 +126,9 @@ def process_indommlu(input_file, output_file):
             reader = csv.DictReader(f)
             
             for row in reader:
-                question = row.get('soal', '').strip()
-                options = row.get('jawaban', '').strip()
-                answer_key = row.get('kunci', '').strip()
-                subject = row.get('subject', 'General')
-                level = row.get('level', 'General')
-                
-                if not question or not options or not answer_key:
-                    continue
-                
-                # Instruction for the model
-                instruction = f"Jawablah pertanyaan berikut mengenai {subject} ({level})."
-                
-                # Create the full input with options
-                full_input = f"{question}\n\nPilihan Jawaban:\n{options}"
-                
-                # Determine the full answer text based on the key
-                # This is a heuristic; simpler is just to provide the key.
-                # For better SFT, we might want "Jawaban yang benar adalah {KEY}."
-                output_text = f"Jawaban yang benar adalah {answer_key}."
-                
-                # Create SFT entry (Alpaca/Instruction format)
-                entry = {
-                    "instruction": instruction,
-                    "input": full_input,
-                    "output": output_text,
-                    "source": "IndoMMLU",
-                    "subject": subject
-                }
-                
-                sft_data.append(entry)
+                entry = format_indommlu_row(row)
+                if entry:
+                    sft_data.append(entry)
                 
         # Save to JSON
         with open(output_file, 'w', encoding='utf-8') as f:
@@ -61,11 +144,470 @@ def process_indommlu(input_file, output_file):
     except Exception as e:
         print(f"❌ Error processing file: {e}")
 
+
+class JsonlShardWriter:
+    """Appendable JSON Lines writer with optional compression and sharding
+
+    Shards roll over after `shard_rows` entries or `shard_bytes` uncompressed bytes.
+    commit() makes everything written so far durable and returns a state dict;
+    passing that state back to open() truncates the current shard to the committed
+    offset and continues appending, so an interrupted run resumes without duplicates.
+    """
+
+    def __init__(self, output_path, compression=None, shard_rows=None, shard_bytes=None):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstandard not installed: pip install zstandard")
+
+        self.output_path = output_path
+        self.compression = compression
+        self.shard_rows = shard_rows
+        self.shard_bytes = shard_bytes
+        self.shard = 0
+        self.rows_in_shard = 0
+        self.bytes_in_shard = 0
+        self.rows_written = 0
+        self._file = None
+
+    @property
+    def sharded(self):
+        return bool(self.shard_rows or self.shard_bytes)
+
+    def shard_path(self, index):
+        """Path of shard `index` (the output path itself when not sharding)"""
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        base = self.output_path[:-len(suffix)] if suffix and self.output_path.endswith(suffix) else self.output_path
+        if self.sharded:
+            stem, ext = os.path.splitext(base)
+            base = f"{stem}-{index:05d}{ext or '.jsonl'}"
+        return base + suffix
+
+    def shard_paths(self):
+        """Paths of all shards written so far"""
+        return [self.shard_path(i) for i in range(self.shard + 1)]
+
+    def _open_file(self, mode):
+        path = self.shard_path(self.shard)
+        if self.compression == 'gzip':
+            # Appending adds a new gzip member; readers decode concatenated members
+            return gzip.open(path, mode + 'b')
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor().stream_writer(open(path, mode + 'b'))
+        return open(path, mode + 'b')
+
+    def open(self, state=None):
+        """Start a fresh output, or continue from a state returned by commit()"""
+        if state:
+            self.shard = state['shard']
+            self.rows_in_shard = state['rows_in_shard']
+            self.bytes_in_shard = state['bytes_in_shard']
+            self.rows_written = state['rows_written']
+            # Drop anything written after the last commit
+            with open(self.shard_path(self.shard), 'r+b') as f:
+                f.truncate(state['offset'])
+            self._file = self._open_file('a')
+        else:
+            self._file = self._open_file('w')
+        return self
+
+    def write(self, entry):
+        """Append one entry, rolling over to the next shard when full"""
+        self.write_line((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+
+    def write_line(self, line):
+        """Append one already-serialized JSON line (bytes, newline-terminated)"""
+        full = (self.shard_rows and self.rows_in_shard >= self.shard_rows) or \
+            (self.shard_bytes and self.rows_in_shard and self.bytes_in_shard + len(line) > self.shard_bytes)
+        if full:
+            self._file.close()
+            self.shard += 1
+            self.rows_in_shard = 0
+            self.bytes_in_shard = 0
+            self._file = self._open_file('w')
+
+        self._file.write(line)
+        self.rows_in_shard += 1
+        self.bytes_in_shard += len(line)
+        self.rows_written += 1
+
+    def commit(self):
+        """Flush to disk and return the resume state"""
+        if self.compression:
+            # Close the compressed member/frame so the file is decodable up to here
+            self._file.close()
+            self._file = self._open_file('a')
+        else:
+            self._file.flush()
+
+        return {
+            'shard': self.shard,
+            'rows_in_shard': self.rows_in_shard,
+            'bytes_in_shard': self.bytes_in_shard,
+            'rows_written': self.rows_written,
+            'offset': os.path.getsize(self.shard_path(self.shard)),
+        }
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def _save_checkpoint(path, state):
+    """Atomically replace the checkpoint file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def stream_indommlu(input_file, output_path, compression=None, shard_rows=None,
+                    shard_bytes=None, resume=True, checkpoint_every=10000):
+    """Convert IndoMMLU CSV to JSON Lines row by row in constant memory
+
+    Progress is checkpointed to `<output_path>.checkpoint.json` every
+    `checkpoint_every` input rows; with resume=True a later run continues from it.
+    """
+    print(f"🔄 Streaming {input_file}...")
+
+    checkpoint_path = output_path + '.checkpoint.json'
+    config = {
+        'input_file': os.path.abspath(input_file),
+        'compression': compression,
+        'shard_rows': shard_rows,
+        'shard_bytes': shard_bytes,
+    }
+
+    state = None
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state['config'] != config:
+            print(f"❌ Checkpoint {checkpoint_path} was written with different settings; "
+                  f"delete it or rerun with the original options")
+            return None
+        print(f"⏩ Resuming after {state['rows_read']} rows ({state['writer']['rows_written']} written)")
+
+    try:
+        writer = JsonlShardWriter(output_path, compression, shard_rows, shard_bytes)
+        writer.open(state['writer'] if state else None)
+        rows_read = state['rows_read'] if state else 0
+
+        with open(input_file, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+
+            for row in islice(reader, rows_read, None):
+                rows_read += 1
+                entry = format_indommlu_row(row)
+                if entry:
+                    writer.write(entry)
+
+                if rows_read % checkpoint_every == 0:
+                    _save_checkpoint(checkpoint_path, {
+                        'config': config,
+                        'rows_read': rows_read,
+                        'writer': writer.commit(),
+                    })
+
+        writer.close()
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        print(f"✅ Successfully converted {writer.rows_written} items from {rows_read} rows.")
+        for path in writer.shard_paths():
+            print(f"💾 Saved to {path}")
+        return writer.shard_paths()
+
+    except Exception as e:
+        print(f"❌ Error processing file: {e}")
+        return None
+
+def open_jsonl(path, newline=None):
+    """Open a plain, gzip or zstd JSON Lines (or CSV) file for text reading"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline=newline)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("zstandard not installed: pip install zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(raw, encoding='utf-8', newline=newline)
+    return open(path, 'r', encoding='utf-8', newline=newline)
+
+def detect_schema(record):
+    """Schema of a CSV header or decoded JSON record, from its keys
+
+    Raises ValueError when no schema matches rather than formatting every row to nothing.
+    """
+    keys = set(record)
+    for schema, required in SCHEMA_KEYS.items():
+        if keys.issuperset(required):
+            return schema
+    raise ValueError(f"cannot tell the schema from the fields {sorted(keys)}; "
+                     f"pass --schema ({' or '.join(FORMATTERS)})")
+
+def _first_record(rows):
+    """First record of a chunk from iter_chunks (JSONL lines are decoded)"""
+    for row in rows:
+        if isinstance(row, str):
+            if not row.strip():
+                continue
+            row = json.loads(row)
+        return row
+    return None
+
+def iter_chunks(path, chunk_size):
+    """Yield lists of raw rows from a CSV, JSONL(.gz/.zst) or JSON file
+
+    JSONL rows are yielded as undecoded lines, so JSON decoding happens in the worker
+    processes. CSV is split into fields here, in the parent (a quoted field may span
+    lines, so raw line blocks cannot be cut safely); the header is yielded first on
+    its own and workers only map fields to columns and format the rows.
+    """
+    lower = path.lower()
+    if lower.endswith(CSV_SUFFIXES):
+        with open_jsonl(path, newline='') as f:
+            reader = csv.reader(f)
+            yield next(reader, [])
+            while True:
+                chunk = list(islice(reader, chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+    elif lower.endswith(('.jsonl', '.jsonl.gz', '.jsonl.zst')):
+        with open_jsonl(path) as f:
+            while True:
+                chunk = list(islice(f, chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        rows = data.get('qa_pairs', []) if isinstance(data, dict) else data
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+def _format_chunk(schema, header, rows, preparers=()):
+    """Worker: decode rows, format them and serialize one JSON line per entry
+
+    Returns (line, extras) pairs where extras holds each stage preparer's
+    result (e.g. dedup signatures) for the stage's accept() in the parent.
+    """
+    formatter = FORMATTERS[schema]
+    results = []
+    for row in rows:
+        if header is not None:
+            row = dict(zip(header, row))
+        elif isinstance(row, str):
+            if not row.strip():
+                continue
+            row = json.loads(row)
+
+        entry = formatter(row)
+        if entry is None:
+            continue
+
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        results.append((line, tuple(preparer.prepare(entry) for preparer in preparers)))
+    return results
+
+def run_pipeline(input_files, output_path, workers=None, chunk_size=2000, compression=None,
+                 shard_rows=None, shard_bytes=None, stages=(), schema=None):
+    """Format CSV/JSONL/JSON inputs into SFT JSON Lines across a process pool
+
+    Inputs are read in chunks and formatted by `workers` processes; results are
+    consumed in submission order, so the output is identical for any worker count.
+    At most 2 x workers chunks are in flight, which bounds memory.
+
+    Each input's schema ('indommlu' or 'qa') is detected from its CSV header or
+    first record unless `schema` is given.
+
+    Stages (e.g. sft_dedup.DedupStage) provide preparer(), a small picklable object
+    whose prepare(entry) runs in the workers, and accept(line, prepared) -> bool,
+    which runs in input order in the parent and keeps the stage's state there.
+    """
+    workers = workers or os.cpu_count() or 1
+    preparers = tuple(stage.preparer() for stage in stages)
+    writer = JsonlShardWriter(output_path, compression, shard_rows, shard_bytes).open()
+    stats = {'rows_in': 0, 'rows_out': 0, 'chunks': 0}
+    started = time.perf_counter()
+
+    def drain(future):
+        for line, extras in future.result():
+            if all(stage.accept(line, extra) for stage, extra in zip(stages, extras)):
+                writer.write_line(line)
+                stats['rows_out'] += 1
+        stats['chunks'] += 1
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for path in input_files:
+                chunks = iter_chunks(path, chunk_size)
+                header = next(chunks, None) if path.lower().endswith(CSV_SUFFIXES) else None
+                first = next(chunks, [])
+                record = header if header is not None else _first_record(first)
+                if record is None:
+                    print(f"⚠️  {path} has no records; skipped")
+                    continue
+                path_schema = schema or detect_schema(record)
+                print(f"🔄 Processing {path} ({path_schema}) with {workers} workers...")
+
+                for rows in chain([first], chunks):
+                    stats['rows_in'] += len(rows)
+                    pending.append(pool.submit(_format_chunk, path_schema, header, rows, preparers))
+                    if len(pending) >= 2 * workers:
+                        drain(pending.popleft())
+            while pending:
+                drain(pending.popleft())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_sec'] = round(stats['rows_in'] / elapsed, 1) if elapsed else 0.0
+    stats['outputs'] = writer.shard_paths()
+
+    print(f"✅ {stats['rows_out']} entries from {stats['rows_in']} rows "
+          f"in {elapsed:.2f}s ({stats['rows_per_sec']:,.0f} rows/s)")
+    for path in stats['outputs']:
+        print(f"💾 Saved to {path}")
+    return stats
+
+def stratified_split(input_files, output_dir, ratios=(0.8, 0.1, 0.1), seed=42,
+                     keys=('subject', 'level'), compression=None):
+    """Reproducible train/val/test split of SFT JSON Lines, stratified by `keys`
+
+    Pass 1 records each row's stratum (only row numbers are kept in memory);
+    every stratum is shuffled with random.Random(seed) and cut by `ratios`.
+    Pass 2 streams the rows into train/val/test files. Same inputs and seed
+    always give the same split.
+    """
+    if len(ratios) != len(SPLIT_NAMES) or abs(sum(ratios) - 1.0) > 1e-6:
+        raise ValueError("ratios must be three fractions summing to 1")
+
+    # Pass 1: stratum -> row numbers
+    strata = {}
+    total = 0
+    for path in input_files:
+        with open_jsonl(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                stratum = tuple(str(entry.get(key, 'General')) for key in keys)
+                strata.setdefault(stratum, array('L')).append(total)
+                total += 1
+
+    # Assign rows per stratum; strata are visited in sorted order for reproducibility
+    rng = random.Random(seed)
+    assignment = bytearray(total)
+    for stratum in sorted(strata):
+        rows = list(strata[stratum])
+        rng.shuffle(rows)
+        n_val = round(len(rows) * ratios[1])
+        n_test = round(len(rows) * ratios[2])
+        for row in rows[:n_val]:
+            assignment[row] = 1
+        for row in rows[n_val:n_val + n_test]:
+            assignment[row] = 2
+
+    # Pass 2: stream rows to their split
+    os.makedirs(output_dir, exist_ok=True)
+    writers = [
+        JsonlShardWriter(os.path.join(output_dir, f"{name}.jsonl"), compression).open()
+        for name in SPLIT_NAMES
+    ]
+    row = 0
+    try:
+        for path in input_files:
+            with open_jsonl(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    writers[assignment[row]].write_line(line.rstrip('\n').encode('utf-8') + b'\n')
+                    row += 1
+    finally:
+        for writer in writers:
+            writer.close()
+
+    counts = {name: writer.rows_written for name, writer in zip(SPLIT_NAMES, writers)}
+    manifest = {
+        'seed': seed,
+        'ratios': dict(zip(SPLIT_NAMES, ratios)),
+        'stratify_by': list(keys),
+        'strata': len(strata),
+        'counts': counts,
+        'files': {name: writer.shard_path(0) for name, writer in zip(SPLIT_NAMES, writers)},
+    }
+    with open(os.path.join(output_dir, 'split_manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ Split {total} rows across {len(strata)} strata: "
+          + ", ".join(f"{name}={count}" for name, count in counts.items()))
+    return manifest
+
 if __name__ == "__main__":
-    INPUT_CSV = "data/IndoMMLU/data/indoMMLU.csv"
-    OUTPUT_JSON = "data/indo_sft_train.json"
+    parser = argparse.ArgumentParser(description="Convert IndoMMLU CSV to SFT training data")
+    parser.add_argument('--input', nargs='+', default=["data/IndoMMLU/data/indoMMLU.csv"],
+                        help="Input file(s); --pipeline also accepts JSONL and qa_sft_dataset.json")
+    parser.add_argument('--output', help="Output path (default: data/indo_sft_train.json, or .jsonl with --stream/--pipeline)")
+    parser.add_argument('--stream', action='store_true', help="Write JSON Lines incrementally in constant memory")
+    parser.add_argument('--pipeline', action='store_true', help="Format all inputs in parallel across a process pool")
+    parser.add_argument('--workers', type=int, help="Pipeline worker processes (default: all cores)")
+    parser.add_argument('--schema', choices=sorted(FORMATTERS),
+                        help="Input schema for --pipeline (default: detected from each file's first record)")
+    parser.add_argument('--chunk-size', type=int, default=2000, help="Rows per pipeline work item")
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], help="Compress streamed output")
+    parser.add_argument('--shard-rows', type=int, help="Start a new shard after this many entries")
+    parser.add_argument('--shard-bytes', type=int, help="Start a new shard after this many uncompressed bytes")
+    parser.add_argument('--checkpoint-every', type=int, default=10000, help="Input rows between resume checkpoints")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore an existing checkpoint and start over")
+    parser.add_argument('--dedup', action='store_true', help="Drop exact and near-duplicate entries (pipeline only)")
+    parser.add_argument('--dedup-threshold', type=float, default=0.8, help="Jaccard similarity treated as duplicate")
+    parser.add_argument('--dedup-report', help="Write duplicate clusters and removal counts to this JSON file")
+    parser.add_argument('--split-dir', help="Write stratified train/val/test JSONL here (pipeline output, or JSONL --input)")
+    parser.add_argument('--split-ratios', type=float, nargs=3, default=[0.8, 0.1, 0.1], metavar=('TRAIN', 'VAL', 'TEST'))
+    parser.add_argument('--seed', type=int, default=42, help="Split shuffle seed")
+    args = parser.parse_args()
     
-    if os.path.exists(INPUT_CSV):
-        process_indommlu(INPUT_CSV, OUTPUT_JSON)
+    missing = [path for path in args.input if not os.path.exists(path)]
+    if missing:
+        print(f"❌ Input file not found: {', '.join(missing)}")
+    elif args.pipeline:
+        stages = []
+        if args.dedup:
+            from sft_dedup import DedupStage
+            stages.append(DedupStage(threshold=args.dedup_threshold))
+
+        try:
+            stats = run_pipeline(args.input, args.output or "data/indo_sft_train.jsonl", args.workers,
+                                 args.chunk_size, args.compression, args.shard_rows, args.shard_bytes, stages,
+                                 args.schema)
+        except ValueError as e:
+            print(f"❌ {e}")
+            raise SystemExit(1)
+
+        if args.dedup:
+            report = stages[0].report()
+            print(f"🧹 Removed {report['removed']} duplicates "
+                  f"({report['exact_duplicates']} exact, {report['near_duplicates']} near, "
+                  f"{report['clusters']} clusters)")
+            if args.dedup_report:
+                with open(args.dedup_report, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2, ensure_ascii=False)
+                print(f"💾 Dedup report saved to {args.dedup_report}")
+
+        if args.split_dir:
+            stratified_split(stats['outputs'], args.split_dir, args.split_ratios, args.seed,
+                             compression=args.compression)
+    elif args.split_dir:
+        stratified_split(args.input, args.split_dir, args.split_ratios, args.seed, compression=args.compression)
+    elif len(args.input) > 1:
+        print("❌ Multiple inputs require --pipeline")
+    elif args.stream:
+        output = args.output or "data/indo_sft_train.jsonl"
+        stream_indommlu(args.input[0], output, args.compression, args.shard_rows, args.shard_bytes,
+                        resume=not args.no_resume, checkpoint_every=args.checkpoint_every)
     else:
-        print(f"❌ Input file not found: {INPUT_CSV}")
+        process_indommlu(args.input[0], args.output or "data/indo_sft_train.json")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-product Prompt Fragments
+Precomputed compact prompt text per product (price, specs, features and
+related QA pairs) for product-page chats, rebuilt per product only when its
+catalog entry or its QA pairs change
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from binary_store import load_document, resolve_path
+from metrics import counter, record_cache
+
+MAX_QA_PAIRS = 2
+MAX_ANSWER_WORDS = 15
+
+FRAGMENT_REBUILDS = counter('product_fragment_rebuilds_total', "Product prompt fragments (re)built")
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def _short_answer(answer: str) -> str:
+    """First sentence, capped at MAX_ANSWER_WORDS words"""
+    first = _SENTENCE_END.split(answer.strip(), 1)[0]
+    words = first.split()
+    return ' '.join(words[:MAX_ANSWER_WORDS]) + ('…' if len(words) > MAX_ANSWER_WORDS else '')
+
+
+def format_fragment(product: Dict, qa_pairs: List[Dict]) -> str:
+    """Compact prompt text for one product"""
+    price = f"{product['price']:,}".replace(',', '.')
+    lines = [f"PRODUK: {product['name']} (ID {product['id']}, {product['category']}) - Rp {price}"]
+    if product.get('description'):
+        lines.append(product['description'])
+    if product.get('specifications'):
+        lines.append("Spesifikasi: " + "; ".join(f"{k}: {v}" for k, v in product['specifications'].items()))
+    if product.get('features'):
+        lines.append("Fitur: " + ", ".join(product['features']))
+    if qa_pairs:
+        lines.append("FAQ:")
+        lines.extend(f"- {pair['question']} -> {_short_answer(pair['answer'])}" for pair in qa_pairs)
+    return "\n".join(lines)
+
+
+class ProductFragments:
+    """product id -> fragment, kept in step with the catalog and QA dataset"""
+
+    def __init__(self, qa_path: Optional[str] = 'data/qa_sft_dataset.json'):
+        self.qa_path = qa_path
+        self._products: Optional[List[Dict]] = None
+        self._qa_stamp: Optional[Tuple[str, int, int]] = None
+        self._qa_by_product: Dict[int, List[Dict]] = {}
+        # product id -> (content hash, fragment)
+        self._fragments: Dict[int, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _load_qa(self) -> bool:
+        """Re-read the QA dataset if it changed; True when it did"""
+        if not self.qa_path or not os.path.exists(resolve_path(self.qa_path)):
+            changed = bool(self._qa_by_product)
+            self._qa_by_product = {}
+            return changed
+        actual = resolve_path(self.qa_path)
+        stat = os.stat(actual)
+        stamp = (actual, stat.st_mtime_ns, stat.st_size)
+        if stamp == self._qa_stamp:
+            return False
+        pairs = load_document(actual).get('qa_pairs', [])
+        by_product: Dict[int, List[Dict]] = {}
+        # Single-product pairs first: they say the most about that product
+        for pair in sorted(pairs, key=lambda p: (len(p.get('product_ids', [])), p.get('id', 0))):
+            for product_id in pair.get('product_ids', []):
+                by_product.setdefault(product_id, []).append(pair)
+        self._qa_by_product = by_product
+        self._qa_stamp = stamp
+        return True
+
+    def refresh(self, products: List[Dict]) -> int:
+        """
+        Sync with the current catalog list (as returned by load_catalog)
+
+        Only products whose entry or QA pairs changed are re-rendered; removed
+        products are dropped. Returns the number of fragments rebuilt.
+        """
+        with self._lock:
+            qa_changed = self._load_qa()
+            if products is self._products and not qa_changed:
+                return 0
+
+            rebuilt = 0
+            fragments = {}
+            for product in products:
+                qa_pairs = self._qa_by_product.get(product['id'], [])[:MAX_QA_PAIRS]
+                raw = json.dumps([product, qa_pairs], sort_keys=True, ensure_ascii=False)
+                digest = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+                current = self._fragments.get(product['id'])
+                if current and current[0] == digest:
+                    fragments[product['id']] = current
+                    continue
+                fragments[product['id']] = (digest, format_fragment(product, qa_pairs))
+                rebuilt += 1
+            self._fragments = fragments
+            self._products = products
+            FRAGMENT_REBUILDS.inc(rebuilt)
+            return rebuilt
+
+    def get(self, products: List[Dict], product_id) -> Optional[str]:
+        """Fragment for product_id (None if it is not in the catalog)"""
+        self.refresh(products)
+        try:
+            entry = self._fragments.get(int(product_id))
+        except (TypeError, ValueError):
+            entry = None
+        record_cache('product_fragment', entry is not None)
+        return entry[1] if entry else None
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Related-Product Extraction
+Finds catalog products mentioned in LLM output with an Aho-Corasick matcher
+over product names and keywords (incrementally while a response streams) and
+scores how well they agree with what the customer asked about
+"""
+
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from text_match import AhoCorasick, normalize_text
+
+NAME_WEIGHT = 2.0        # full product name
+MIN_PRODUCT_SCORE = 1.0  # a name, or keywords adding up to one unambiguous keyword
+MAX_RELATED = 5
+
+
+class ProductMatcher:
+    """Catalog phrase index: names, keywords and categories -> weighted product ids
+
+    A keyword shared by n products adds 1/n to each of them, so "sofa" points
+    at the one sofa while "modern" barely moves any single product.
+    """
+
+    def __init__(self, products: List[Dict]):
+        self.products = {p['id']: p for p in products}
+        phrase_targets: Dict[str, Dict[int, float]] = defaultdict(dict)
+
+        owners: Dict[str, set] = defaultdict(set)
+        for product in products:
+            for term in list(product.get('keywords', [])) + [product.get('category', '')]:
+                term = normalize_text(term)
+                if term:
+                    owners[term].add(product['id'])
+        for term, ids in owners.items():
+            for product_id in ids:
+                phrase_targets[term][product_id] = 1.0 / len(ids)
+
+        for product in products:
+            name = normalize_text(product['name'])
+            if name:
+                phrase_targets[name][product['id']] = NAME_WEIGHT
+
+        self._phrases = list(phrase_targets)
+        self._targets: List[List[Tuple[int, float]]] = [list(phrase_targets[p].items()) for p in self._phrases]
+        self._matcher = AhoCorasick(self._phrases)
+
+    def _accumulate(self, matches, scores: Dict[int, float], seen: set, first: Optional[Dict[int, int]] = None):
+        for start, _, index in matches:
+            if index in seen:
+                continue  # each phrase counts once per text
+            seen.add(index)
+            for product_id, weight in self._targets[index]:
+                scores[product_id] = scores.get(product_id, 0.0) + weight
+                if first is not None:
+                    first[product_id] = min(first.get(product_id, start), start)
+
+    def score_text(self, text: str) -> Dict[int, float]:
+        """product id -> mention score for one complete text"""
+        scores: Dict[int, float] = {}
+        self._accumulate(self._matcher.search(normalize_text(text)), scores, set())
+        return scores
+
+    def tracker(self, query: Optional[str] = None) -> 'MentionTracker':
+        """Incremental extractor for a streamed response to `query`"""
+        return MentionTracker(self, query)
+
+    def extract(self, response: str, query: Optional[str] = None) -> Dict:
+        """related_products and confidence for a complete response"""
+        tracker = self.tracker(query)
+        tracker.feed(response)
+        return tracker.result()
+
+
+class MentionTracker:
+    """Accumulates product mentions chunk by chunk"""
+
+    def __init__(self, matcher: ProductMatcher, query: Optional[str] = None):
+        self._matcher = matcher
+        self._scanner = matcher._matcher.scanner()
+        self._scores: Dict[int, float] = {}
+        self._seen: set = set()
+        self._first: Dict[int, int] = {}   # product id -> position of its first mention
+        self._query_scores = matcher.score_text(query) if query else {}
+
+    def feed(self, chunk: str):
+        self._matcher._accumulate(self._scanner.feed(chunk), self._scores, self._seen, self._first)
+
+    def related_products(self) -> List[int]:
+        """Products mentioned strongly enough, in order of first mention"""
+        related = [product_id for product_id, score in self._scores.items() if score >= MIN_PRODUCT_SCORE]
+        return sorted(related, key=self._first.__getitem__)[:MAX_RELATED]
+
+    def confidence(self, related: List[int]) -> float:
+        """
+        Retrieval agreement in [0, 1]
+
+        40% comes from how strongly the products were mentioned (a full name
+        scores highest), 60% from whether a keyword lookup of the customer's
+        question ranks the same products highest. A general question with no
+        product mentions on either side gets a neutral 0.5.
+        """
+        if not related:
+            return 0.5 if not self._query_scores else 0.2
+        strength = min(max(self._scores[pid] for pid in related) / NAME_WEIGHT, 1.0)
+        if not self._query_scores:
+            return round(0.4 * strength + 0.3, 3)
+        best_query = max(self._query_scores.values())
+        agreement = max(self._query_scores.get(pid, 0.0) for pid in related) / best_query
+        return round(0.4 * strength + 0.6 * agreement, 3)
+
+    def result(self) -> Dict:
+        """Final related_products and confidence (flushes matches held at the end)"""
+        self._matcher._accumulate(self._scanner.finish(), self._scores, self._seen, self._first)
+        related = self.related_products()
+        return {'related_products': related, 'confidence': self.confidence(related)}
+
+
+_matcher: Optional[Tuple[List[Dict], ProductMatcher]] = None
+_matcher_lock = threading.Lock()
+
+
+def get_product_matcher(products: List[Dict]) -> ProductMatcher:
+    """Matcher for this catalog list, rebuilt when load_catalog returns a new list"""
+    global _matcher
+    cached = _matcher
+    if cached is None or cached[0] is not products:
+        with _matcher_lock:
+            if _matcher is None or _matcher[0] is not products:
+                _matcher = (products, ProductMatcher(products))
+            cached = _matcher
+    return cached[1]
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+On-demand Sampling Profiler
+Samples every thread's Python stack from a background thread and emits
+collapsed stacks (flamegraph.pl / speedscope compatible), with optional
+tracemalloc allocation diffs
+"""
+
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# (stdlib file, function) leaf frames that block in C, meaning "parked, not burning CPU";
+# skipped unless include_idle. Matched by file too, so our own get()/_worker() stay visible.
+# Queue.get and the asyncio loop park in threading.wait / selectors.select below them
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('ssl.py', 'read'),
+    ('concurrent/futures/thread.py', '_worker'),  # blocked in SimpleQueue.get (C)
+}
+_IDLE_NAMES = {name for _, name in IDLE_FRAMES}
+
+_active = threading.Lock()
+
+
+@dataclass
+class ProfileResult:
+    """Outcome of one profiling window"""
+    duration: float
+    interval: float
+    samples: int
+    stacks: Counter = field(default_factory=Counter)
+    allocations: List[Dict] = field(default_factory=list)
+
+    def collapsed(self) -> str:
+        """One 'frame;frame;frame count' line per distinct stack, hottest first"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def to_dict(self) -> Dict:
+        return {
+            'duration': round(self.duration, 3),
+            'interval': self.interval,
+            'samples': self.samples,
+            'collapsed': self.collapsed(),
+            'allocations': self.allocations,
+        }
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(code) -> bool:
+    if code.co_name not in _IDLE_NAMES:
+        return False
+    filename = code.co_filename.replace(os.sep, '/')
+    return any(name == code.co_name and filename.endswith('/' + path) for path, name in IDLE_FRAMES)
+
+
+def _sample(stacks: Counter, own_ident: int, include_idle: bool, thread_names: Dict[int, str]) -> int:
+    taken = 0
+    for ident, frame in sys._current_frames().items():
+        if ident == own_ident:
+            continue
+        if not include_idle and _is_idle(frame.f_code):
+            continue
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        labels.append(thread_names.get(ident, f'thread-{ident}'))
+        stacks[';'.join(reversed(labels))] += 1
+        taken += 1
+    return taken
+
+
+def _allocation_diff(before, after, top: int) -> List[Dict]:
+    stats = after.compare_to(before, 'lineno')
+    return [
+        {
+            'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            'size_diff_kb': round(stat.size_diff / 1024, 1),
+            'size_kb': round(stat.size / 1024, 1),
+            'count_diff': stat.count_diff,
+        }
+        for stat in stats[:top]
+    ]
+
+
+def profile(seconds: float = 10.0, interval: float = 0.01, include_idle: bool = False,
+            memory: bool = False, top_allocations: int = 25) -> ProfileResult:
+    """
+    Sample all threads for `seconds` (blocking the caller)
+
+    Args:
+        seconds: Profiling window
+        interval: Seconds between samples (overhead grows as this shrinks)
+        include_idle: Keep stacks parked in stdlib blocking calls (IDLE_FRAMES)
+        memory: Also diff tracemalloc snapshots taken at start and end
+        top_allocations: Number of allocation sites to report
+
+    Raises:
+        RuntimeError: if another profile is already running
+    """
+    if not _active.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+
+    started_tracing = False
+    try:
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        before = tracemalloc.take_snapshot() if memory else None
+
+        stacks: Counter = Counter()
+        samples = 0
+        own_ident = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        next_refresh = 0.0
+        thread_names: Dict[int, str] = {}
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            if now >= next_refresh:
+                thread_names = {t.ident: t.name for t in threading.enumerate()}
+                next_refresh = now + 1.0
+            samples += _sample(stacks, own_ident, include_idle, thread_names)
+            time.sleep(interval)
+
+        result = ProfileResult(time.perf_counter() - started, interval, samples, stacks)
+        if memory:
+            result.allocations = _allocation_diff(before, tracemalloc.take_snapshot(), top_allocations)
+        return result
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _active.release()
+
+
+def install_signal_handler(signum: Optional[int] = None, seconds: float = 30.0,
+                           output_dir: Optional[str] = None, memory: bool = False) -> bool:
+    """
+    Profile for `seconds` whenever the process receives `signum` (default SIGUSR1)
+
+    Output goes to <output_dir>/profile-<pid>-<timestamp>.collapsed (plus .alloc.txt
+    with memory=True). Must be called from the main thread; returns False where
+    signals are unavailable.
+    """
+    signum = signum if signum is not None else getattr(signal, 'SIGUSR1', None)
+    if signum is None:
+        return False
+    output_dir = output_dir or tempfile.gettempdir()
+
+    def run():
+        try:
+            result = profile(seconds, memory=memory)
+        except RuntimeError as e:
+            print(f"⚠️  Profiler: {e}")
+            return
+        base = os.path.join(output_dir, f"profile-{os.getpid()}-{int(time.time())}")
+        with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+            f.write(result.collapsed())
+        if memory:
+            with open(base + '.alloc.txt', 'w', encoding='utf-8') as f:
+                for row in result.allocations:
+                    f.write(f"{row['size_diff_kb']:>10} KiB {row['count_diff']:>8} {row['location']}\n")
+        print(f"✅ Profile ({result.samples} samples) written to {base}.collapsed")
+
+    def handler(_signum, _frame):
+        # Never profile inside the signal handler itself
+        threading.Thread(target=run, name='signal-profiler', daemon=True).start()
+
+    try:
+        signal.signal(signum, handler)
+    except ValueError:
+        # Not the main thread (e.g. imported by a worker thread)
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert or inspect collapsed stack files")
+    parser.add_argument('collapsed', help="A .collapsed file written by the profiler")
+    parser.add_argument('--top', type=int, default=20, help="Show the N hottest leaf frames")
+    args = parser.parse_args()
+
+    leaves: Counter = Counter()
+    total = 0
+    with open(args.collapsed, 'r', encoding='utf-8') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            leaves[stack.rsplit(';', 1)[-1]] += int(count)
+            total += int(count)
+    for frame, count in leaves.most_common(args.top):
+        print(f"{count / total:7.1%}  {frame}")
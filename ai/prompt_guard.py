@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Local Prompt-Injection Pre-filter
+Scores chat messages against Indonesian/English injection and off-topic
+phrases before any LLM call; blocked messages get the canned refusal from
+SystemPromptBuilder.build_safety_prompt without touching a provider
+"""
+
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from metrics import counter, histogram, exponential_buckets
+from text_match import AhoCorasick, normalize_text
+
+REFUSAL_MESSAGE = "Maaf, saya hanya dapat membantu terkait produk furniture. Ada yang bisa saya bantu?"
+
+# category -> (weight, phrases); weights are log-odds added by the first match in a category.
+# Phrases that also occur in ordinary shop questions get a weight below the threshold on
+# their own (BIAS + 1.5 ~= 0.38) and only block together with another category
+INJECTION_PATTERNS: Dict[str, tuple] = {
+    'instruction_override': (5.0, [
+        'ignore your instructions', 'ignore previous instructions', 'ignore all previous',
+        'ignore the above', 'disregard your instructions', 'disregard previous', 'forget your instructions',
+        'new instructions:', 'override your', 'bypass your',
+        'abaikan instruksi', 'abaikan semua instruksi', 'abaikan perintah sebelumnya', 'abaikan aturan',
+        'lupakan instruksi', 'lupakan semua instruksi', 'instruksi baru:', 'jangan ikuti aturan',
+    ]),
+    # Also said by customers ("lupakan semua masalah, cari kasur yang nyaman")
+    'instruction_hint': (1.5, [
+        'forget everything', 'lupakan semua',
+    ]),
+    'role_override': (4.5, [
+        'you are now a', 'you are now an', 'you are now in', 'pretend you are', 'pretend to be',
+        'act as if you', 'roleplay as', 'developer mode', 'jailbreak', 'do anything now',
+        'kamu sekarang adalah seorang', 'anda sekarang adalah seorang', 'berpura-pura menjadi',
+        'berpura pura menjadi', 'bertindaklah sebagai', 'mode developer',
+    ]),
+    # Also said by customers ("you are now my favorite store"): only block together with other signals
+    'role_hint': (1.5, [
+        'you are now', 'from now on you', 'kamu sekarang adalah', 'anda sekarang adalah',
+        'mulai sekarang kamu', 'mulai sekarang anda',
+    ]),
+    'prompt_exfiltration': (5.0, [
+        'system prompt', 'show me your prompt', 'reveal your prompt', 'print your instructions',
+        'repeat the text above', 'your initial instructions', 'hidden instructions',
+        'prompt sistem', 'tampilkan prompt', 'tunjukkan prompt', 'instruksi awal', 'instruksi tersembunyi',
+    ]),
+    'code_execution': (4.0, [
+        'execute this command', 'run this command', 'run this code', 'execute the following',
+        'rm -rf', 'os.system', 'subprocess', 'eval(', 'exec(', '<script', '__import__', '/etc/passwd',
+        'jalankan perintah', 'jalankan kode', 'eksekusi perintah', 'eksekusi kode',
+    ]),
+    # SQL shape: quotes, comment markers or keyword pairs that never occur in shop questions
+    'sql_injection': (4.5, [
+        "' or 1=1", '" or 1=1', 'or 1=1 --', "' or '1'='1", "'; --", "';--", "' --", 'union select',
+        'union all select', 'select * from', 'drop table', 'drop database', 'truncate table',
+        "'; delete from", "'; insert into", "'; update", 'xp_cmdshell', 'information_schema',
+    ]),
+    # Bare SQL words ("Can I delete from my cart?", "promo; -- atau diskon?")
+    'sql_keywords': (1.5, [
+        'delete from', 'insert into', '; --',
+    ]),
+    'data_access': (3.0, [
+        'api key', 'access token', 'credentials', 'customer data', 'user database', 'admin password',
+        'environment variables', 'kredensial', 'data pelanggan', 'database pengguna', 'password admin',
+        'kunci api', 'token akses',
+    ]),
+    'off_topic': (3.0, [
+        'write a poem', 'write an essay', 'write code', 'write a program', 'solve this equation',
+        'homework', 'translate this', 'tell me a joke', 'recipe for', 'who will win the election',
+        'buatkan puisi', 'tulis puisi', 'buatkan esai', 'buatkan kode', 'tuliskan kode', 'buat program',
+        'kerjakan pr', 'tugas sekolah', 'terjemahkan', 'resep masakan', 'ceritakan lelucon', 'pemilu',
+    ]),
+}
+
+# Words that mark a message as being about the shop; they pull the score down
+TOPIC_TERMS = [
+    'furniture', 'furnitur', 'mebel', 'sofa', 'kursi', 'chair', 'meja', 'table', 'lemari', 'wardrobe',
+    'kasur', 'ranjang', 'bed', 'rak', 'shelf', 'kabinet', 'cabinet', 'harga', 'price', 'budget', 'diskon',
+    'pengiriman', 'delivery', 'garansi', 'warranty', 'ruang tamu', 'kamar', 'dapur', 'material', 'kayu',
+    'wood', 'xionco', 'produk', 'product', 'ukuran', 'dimensi', 'warna', 'pesan', 'order', 'custom',
+]
+
+BIAS = -2.0                 # log-odds of a message with no signals (p ~= 0.12)
+EXTRA_MATCH_WEIGHT = 0.5    # each additional distinct phrase, capped below
+MAX_EXTRA_MATCHES = 4
+TOPIC_WEIGHT = -1.5         # at least one furniture/shop term
+SYMBOL_WEIGHT = 1.0         # code-like messages: mostly symbols rather than words
+
+GUARD_DECISIONS = counter('prompt_guard_decisions_total', "Prompt pre-filter outcomes (allowed|blocked)",
+                          ['decision'])
+GUARD_BLOCKED = counter('prompt_guard_blocked_total', "Blocked messages by matched category", ['category'])
+GUARD_SECONDS = histogram('prompt_guard_check_seconds', "Prompt pre-filter latency",
+                          buckets=exponential_buckets(1e-6, 4, 9))
+
+
+@dataclass
+class GuardVerdict:
+    blocked: bool
+    score: float                    # probability the message is an attack or off-topic
+    categories: List[str] = field(default_factory=list)
+    matches: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {'blocked': self.blocked, 'score': round(self.score, 3), 'categories': self.categories}
+
+
+class PromptGuard:
+    """Phrase matching plus a small logistic score over the matches"""
+
+    def __init__(self, threshold: float = 0.7, patterns: Optional[Dict[str, tuple]] = None,
+                 topic_terms: Optional[Iterable[str]] = None):
+        """
+        Args:
+            threshold: Block when the score reaches this probability
+            patterns: category -> (weight, phrases), default INJECTION_PATTERNS
+            topic_terms: On-topic words, default TOPIC_TERMS
+        """
+        self.threshold = threshold
+        patterns = patterns or INJECTION_PATTERNS
+        self._categories: List[str] = []
+        self._weights: List[float] = []
+        phrases = []
+        for category, (weight, category_phrases) in patterns.items():
+            for phrase in category_phrases:
+                phrases.append(phrase)
+                self._categories.append(category)
+                self._weights.append(weight)
+        self._matcher = AhoCorasick(phrases)
+        self._topic = AhoCorasick(topic_terms or TOPIC_TERMS)
+
+    @classmethod
+    def from_env(cls) -> 'PromptGuard':
+        """PROMPT_GUARD_THRESHOLD (0-1, default 0.7)"""
+        return cls(threshold=float(os.getenv('PROMPT_GUARD_THRESHOLD', 0.7)))
+
+    def score(self, message: str) -> GuardVerdict:
+        text = normalize_text(message)
+        best: Dict[str, float] = {}
+        matched: Dict[int, None] = {}
+        for _, _, index in self._matcher.search(text):
+            category = self._categories[index]
+            best[category] = max(best.get(category, 0.0), self._weights[index])
+            matched[index] = None
+
+        logit = BIAS + sum(best.values())
+        logit += EXTRA_MATCH_WEIGHT * min(max(len(matched) - len(best), 0), MAX_EXTRA_MATCHES)
+        if next(self._topic.search(text), None) is not None:
+            logit += TOPIC_WEIGHT
+        letters = sum(ch.isalpha() for ch in text)
+        if len(text) >= 20 and letters < len(text) / 2:
+            logit += SYMBOL_WEIGHT
+
+        probability = 1 / (1 + math.exp(-logit))
+        categories = sorted(best)
+        return GuardVerdict(bool(categories) and probability >= self.threshold, probability, categories,
+                            [self._matcher.phrases[i] for i in matched])
+
+    def check(self, message: str) -> GuardVerdict:
+        """score() plus metrics"""
+        started = time.perf_counter()
+        verdict = self.score(message)
+        GUARD_SECONDS.observe(time.perf_counter() - started)
+        GUARD_DECISIONS.labels('blocked' if verdict.blocked else 'allowed').inc()
+        for category in verdict.categories if verdict.blocked else ():
+            GUARD_BLOCKED.labels(category).inc()
+        return verdict
+
+
+if __name__ == '__main__':
+    import sys
+
+    guard = PromptGuard.from_env()
+    for line in (sys.argv[1:] or sys.stdin):
+        verdict = guard.score(line.strip())
+        print(f"{'⛔' if verdict.blocked else '✅'} {verdict.score:.2f} {','.join(verdict.categories) or '-'}  "
+              f"{line.strip()[:80]}")
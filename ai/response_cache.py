@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Chat Response Cache
+TTL + LRU cache of finished LLM answers, remembering which entries were
+warmed by the prefetcher so its hit rate can be measured
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional
+
+from metrics import counter, gauge, record_cache
+
+PREFETCH_USED = counter('prefetch_used_total', "Prefetched answers served to a user at least once")
+PREFETCH_WASTED = counter('prefetch_wasted_total', "Prefetched answers evicted or expired without being used")
+
+
+@dataclass
+class CachedAnswer:
+    text: str
+    provider: str
+    related_products: List[int] = field(default_factory=list)
+    confidence: float = 0.0
+    prefetched: bool = False
+    created: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+class ResponseCache:
+    """Thread-safe LRU with a per-entry time to live"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, CachedAnswer]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.prefetched_stored = 0
+        self.prefetched_used = 0
+        gauge('response_cache_entries', "Answers currently held in the response cache").set_function(
+            lambda: len(self._entries)
+        )
+
+    def _drop(self, entry: CachedAnswer):
+        if entry.prefetched and not entry.hits:
+            PREFETCH_WASTED.inc()
+
+    def get(self, key: Hashable) -> Optional[CachedAnswer]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                self._drop(self._entries.pop(key))
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.prefetched and not entry.hits:
+                    self.prefetched_used += 1
+                    PREFETCH_USED.inc()
+                entry.hits += 1
+        record_cache('response', entry is not None)
+        return entry
+
+    def contains(self, key: Hashable) -> bool:
+        """Fresh entry present (does not count as a lookup)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and time.monotonic() - entry.created <= self.ttl
+
+    def put(self, key: Hashable, entry: CachedAnswer):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._drop(previous)
+            self._entries[key] = entry
+            if entry.prefetched:
+                self.prefetched_stored += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(self._entries.popitem(last=False)[1])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'prefetched_stored': self.prefetched_stored,
+                'prefetched_used': self.prefetched_used,
+                'prefetch_hit_rate': round(self.prefetched_used / self.prefetched_stored, 3)
+                if self.prefetched_stored else 0.0,
+            }
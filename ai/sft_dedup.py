@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection for SFT Datasets
+Exact hashing plus MinHash/LSH over instruction + input, in a single streaming pass
+"""
+
+import argparse
+import hashlib
+import json
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return ' '.join(NON_WORD.sub(' ', text.lower()).split())
+
+
+def entry_text(entry: Dict) -> str:
+    """Text that identifies an SFT entry for dedup purposes"""
+    return f"{entry.get('instruction', '')}\n{entry.get('input', '')}"
+
+
+class MinHasher:
+    """Computes exact keys, MinHash signatures and LSH band keys
+
+    Everything here is deterministic across processes (no built-in hash()), so it
+    can run in pipeline workers; the object itself is small enough to pickle.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        if not 1 <= shingle_size <= 8:
+            raise ValueError("shingle_size must be between 1 and 8 bytes")
+
+        rng = np.random.RandomState(seed)
+        # (a * x + b) mod p with a, b < 2^31 and 32-bit x never overflows uint64
+        self.a = rng.randint(1, 1 << 31, num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, num_perm).astype(np.uint64)
+        self.band_mult = rng.randint(1, 1 << 62, num_perm // bands).astype(np.uint64) | np.uint64(1)
+        self.band_salt = rng.randint(0, 1 << 62, bands).astype(np.uint64)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+
+    def shingles(self, text: str) -> np.ndarray:
+        """32-bit hashes of the distinct UTF-8 byte k-grams"""
+        data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+        k = min(self.shingle_size, len(data)) or 1
+        if not len(data):
+            data = np.zeros(1, dtype=np.uint64)
+
+        # Pack each k-gram into one integer, then mix it down to 32 bits
+        n = len(data) - k + 1
+        grams = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            grams = (grams << np.uint64(8)) | data[j:j + n]
+        return np.unique((grams * GOLDEN_GAMMA) >> np.uint64(32))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (num_perm,) uint32"""
+        hashes = self.shingles(text)
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME
+        return (permuted.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        """One 64-bit LSH bucket key per band"""
+        rows = signature.reshape(self.bands, -1).astype(np.uint64)
+        return ((rows * self.band_mult).sum(axis=1) ^ self.band_salt).tolist()
+
+    def prepare(self, entry: Dict) -> Tuple[int, bytes, List[int]]:
+        """Exact key, signature bytes and band keys for one entry"""
+        text = normalize_text(entry_text(entry))
+        exact_key = int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+        signature = self.signature(text)
+        return exact_key, signature.tobytes(), self.band_keys(signature)
+
+
+class DedupStage:
+    """Streaming exact + near-duplicate filter
+
+    Near duplicates are found with LSH banding: a row is a candidate when any band
+    of its signature matches a kept row, and is dropped when the estimated Jaccard
+    similarity to that row reaches `threshold`. Rows are never compared pairwise.
+
+    Memory grows with kept rows only: one exact key, one LSH key per band and a
+    16-bit copy of the signature (roughly 1 KB per kept row with 16 bands).
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1, max_examples: int = 20):
+        self.hasher = MinHasher(num_perm, bands, shingle_size, seed)
+        self.threshold = threshold
+        self.max_examples = max_examples
+
+        self._exact: Dict[int, int] = {}     # exact key -> kept row id
+        self._buckets: Dict[int, int] = {}   # (band, band hash) key -> kept row id
+        self._signatures = bytearray()       # uint16 signatures of kept rows, back to back
+
+        self.rows_seen = 0
+        self.kept = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.cluster_sizes: Counter = Counter()
+        self.examples = []
+
+    def preparer(self) -> MinHasher:
+        """Worker-side half of the stage"""
+        return self.hasher
+
+    def _similarity(self, signature: np.ndarray, row_id: int) -> float:
+        size = self.hasher.num_perm * 2
+        kept = np.frombuffer(self._signatures, dtype=np.uint16, count=self.hasher.num_perm, offset=row_id * size)
+        return float(np.mean(kept == signature))
+
+    def _record(self, kind: str, row_id: int, line: bytes):
+        self.cluster_sizes[row_id] += 1
+        if len(self.examples) < self.max_examples:
+            preview = json.loads(line).get('input', '')[:120]
+            self.examples.append({'type': kind, 'kept_row': row_id, 'input': preview})
+
+    def accept(self, line: bytes, prepared: Tuple[int, bytes, List[int]]) -> bool:
+        """True to keep the row; runs in input order in the parent process"""
+        exact_key, signature_bytes, band_keys = prepared
+        self.rows_seen += 1
+
+        row_id = self._exact.get(exact_key)
+        if row_id is not None:
+            self.exact_duplicates += 1
+            self._record('exact', row_id, line)
+            return False
+
+        signature16 = np.frombuffer(signature_bytes, dtype=np.uint32).astype(np.uint16)
+
+        candidates = {self._buckets[key] for key in band_keys if key in self._buckets}
+        for row_id in sorted(candidates):
+            if self._similarity(signature16, row_id) >= self.threshold:
+                self.near_duplicates += 1
+                self._record('near', row_id, line)
+                return False
+
+        row_id = self.kept
+        self.kept += 1
+        self._exact[exact_key] = row_id
+        for key in band_keys:
+            self._buckets.setdefault(key, row_id)
+        self._signatures += signature16.tobytes()
+        return True
+
+    def report(self, top: int = 20) -> Dict:
+        """Removal counts and the largest duplicate clusters (by kept output row)"""
+        return {
+            'rows_seen': self.rows_seen,
+            'kept': self.kept,
+            'removed': self.exact_duplicates + self.near_duplicates,
+            'exact_duplicates': self.exact_duplicates,
+            'near_duplicates': self.near_duplicates,
+            'clusters': len(self.cluster_sizes),
+            'largest_clusters': [
+                {'kept_row': row_id, 'size': count + 1}
+                for row_id, count in self.cluster_sizes.most_common(top)
+            ],
+            'examples': self.examples,
+            'settings': {
+                'threshold': self.threshold,
+                'num_perm': self.hasher.num_perm,
+                'bands': self.hasher.bands,
+                'shingle_size': self.hasher.shingle_size,
+            },
+        }
+
+
+def dedup_jsonl(input_path: str, output_path: str, report_path: Optional[str] = None, **settings) -> Dict:
+    """Deduplicate an SFT JSON Lines file in one streaming pass"""
+    stage = DedupStage(**settings)
+    hasher = stage.preparer()
+
+    with open(input_path, 'rb') as src, open(output_path, 'wb') as dst:
+        for line in src:
+            if not line.strip():
+                continue
+            if not line.endswith(b'\n'):
+                line += b'\n'
+            if stage.accept(line, hasher.prepare(json.loads(line))):
+                dst.write(line)
+
+    report = stage.report()
+    print(f"✅ Kept {report['kept']} of {report['rows_seen']} rows "
+          f"({report['exact_duplicates']} exact, {report['near_duplicates']} near duplicates)")
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Report saved to {report_path}")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Remove exact and near-duplicate SFT entries")
+    parser.add_argument('input', help="SFT JSON Lines file")
+    parser.add_argument('output', help="Deduplicated JSON Lines file")
+    parser.add_argument('--report', help="Write cluster/removal report JSON here")
+    parser.add_argument('--threshold', type=float, default=0.8, help="Jaccard similarity treated as duplicate")
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--bands', type=int, default=16)
+    args = parser.parse_args()
+
+    dedup_jsonl(args.input, args.output, args.report,
+                threshold=args.threshold, num_perm=args.num_perm, bands=args.bands)
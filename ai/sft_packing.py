@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Packed Token Export for SFT Training
+Pre-tokenizes SFT JSON Lines into fixed-length sequences stored as memory-mappable shards
+"""
+
+import argparse
+import importlib
+import json
+import os
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from process_indommlu import open_jsonl
+
+INDEX_VERSION = 1
+
+
+class ByteTokenizer:
+    """Dependency-free UTF-8 byte tokenizer (ids 0-255 are bytes)"""
+
+    name = 'byte'
+    bos_id = 256
+    eos_id = 257
+    pad_id = 258
+    vocab_size = 259
+
+    def encode(self, text: str) -> List[int]:
+        return list(text.encode('utf-8'))
+
+
+class HFTokenizer:
+    """Adapter for Hugging Face tokenizers (requires transformers)"""
+
+    def __init__(self, name_or_path: str):
+        try:
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise ImportError("transformers not installed: pip install transformers")
+
+        self._tokenizer = AutoTokenizer.from_pretrained(name_or_path)
+        self.name = f"hf:{name_or_path}"
+        # Documents are separated by EOS; encoder-style tokenizers often only define SEP or PAD
+        self.eos_id = next((token_id for token_id in (self._tokenizer.eos_token_id, self._tokenizer.sep_token_id,
+                                                      self._tokenizer.pad_token_id) if token_id is not None), None)
+        if self.eos_id is None:
+            raise ValueError(f"Tokenizer {name_or_path} has no EOS, SEP or PAD token to separate documents with")
+        self.pad_id = self._tokenizer.pad_token_id if self._tokenizer.pad_token_id is not None else self.eos_id
+        self.vocab_size = len(self._tokenizer)
+
+    def encode(self, text: str) -> List[int]:
+        return self._tokenizer.encode(text, add_special_tokens=False)
+
+
+def load_tokenizer(spec: str = 'byte'):
+    """
+    Resolve a tokenizer spec
+
+    Args:
+        spec: 'byte', 'hf:<model name or path>', or 'package.module:factory' for a
+              custom object with encode(text), eos_id, pad_id and vocab_size
+    """
+    if spec == 'byte':
+        return ByteTokenizer()
+    if spec.startswith('hf:'):
+        return HFTokenizer(spec[3:])
+    if ':' in spec:
+        module_name, attr = spec.split(':', 1)
+        return getattr(importlib.import_module(module_name), attr)()
+    raise ValueError(f"Unknown tokenizer spec: {spec}")
+
+
+def format_example(entry: Dict) -> str:
+    """Alpaca prompt + response text for one SFT entry"""
+    text = f"### Instruction:\n{entry.get('instruction', '')}\n\n"
+    if entry.get('input'):
+        text += f"### Input:\n{entry['input']}\n\n"
+    return text + f"### Response:\n{entry.get('output', '')}"
+
+
+class PackedShardWriter:
+    """Concatenates token streams (EOS-separated) into fixed-length rows on disk
+
+    Rows are appended to raw little-endian `.bin` shards of `sequences_per_shard`
+    rows each; index.json records dtype, seq_len and the shard list.
+    """
+
+    def __init__(self, output_dir: str, seq_len: int, tokenizer, sequences_per_shard: int = 65536):
+        self.output_dir = output_dir
+        self.seq_len = seq_len
+        self.tokenizer = tokenizer
+        self.sequences_per_shard = sequences_per_shard
+        self.dtype = np.dtype('<u2') if tokenizer.vocab_size <= 1 << 16 else np.dtype('<u4')
+
+        self.shards = []
+        self.total_tokens = 0
+        self.examples = 0
+        self._buffer = np.empty(0, dtype=self.dtype)
+        self._file = None
+        self._rows_in_shard = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _write_rows(self, rows: np.ndarray):
+        while len(rows):
+            if self._file is None or self._rows_in_shard >= self.sequences_per_shard:
+                self._close_shard()
+                path = f"tokens-{len(self.shards):05d}.bin"
+                self.shards.append({'path': path, 'sequences': 0})
+                self._file = open(os.path.join(self.output_dir, path), 'wb')
+                self._rows_in_shard = 0
+
+            take = min(len(rows), self.sequences_per_shard - self._rows_in_shard)
+            self._file.write(rows[:take].tobytes())
+            self._rows_in_shard += take
+            self.shards[-1]['sequences'] += take
+            rows = rows[take:]
+
+    def _close_shard(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def add(self, tokens: Iterable[int]):
+        """Append one example's tokens followed by EOS"""
+        ids = np.fromiter(tokens, dtype=self.dtype)
+        ids = np.append(ids, np.array([self.tokenizer.eos_id], dtype=self.dtype))
+        self._buffer = np.concatenate([self._buffer, ids])
+        self.total_tokens += len(ids)
+        self.examples += 1
+
+        full = len(self._buffer) // self.seq_len
+        if full:
+            self._write_rows(self._buffer[:full * self.seq_len].reshape(full, self.seq_len))
+            self._buffer = self._buffer[full * self.seq_len:].copy()
+
+    def close(self, drop_last: bool = False) -> Dict:
+        """Flush the last partial row (padded unless drop_last) and write index.json"""
+        if len(self._buffer) and not drop_last:
+            row = np.full(self.seq_len, self.tokenizer.pad_id, dtype=self.dtype)
+            row[:len(self._buffer)] = self._buffer
+            self._write_rows(row[np.newaxis])
+        self._buffer = self._buffer[:0]
+        self._close_shard()
+
+        index = {
+            'version': INDEX_VERSION,
+            'seq_len': self.seq_len,
+            'dtype': self.dtype.str,
+            'tokenizer': getattr(self.tokenizer, 'name', type(self.tokenizer).__name__),
+            'eos_id': self.tokenizer.eos_id,
+            'pad_id': self.tokenizer.pad_id,
+            'examples': self.examples,
+            'total_tokens': self.total_tokens,
+            'total_sequences': sum(shard['sequences'] for shard in self.shards),
+            'shards': self.shards,
+        }
+        with open(os.path.join(self.output_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+        return index
+
+
+def pack_jsonl(input_files: List[str], output_dir: str, tokenizer=None, seq_len: int = 1024,
+               sequences_per_shard: int = 65536, drop_last: bool = False) -> Dict:
+    """Tokenize SFT JSON Lines and write packed shards + index.json to output_dir"""
+    tokenizer = tokenizer or ByteTokenizer()
+    writer = PackedShardWriter(output_dir, seq_len, tokenizer, sequences_per_shard)
+
+    for path in input_files:
+        with open_jsonl(path) as f:
+            for line in f:
+                if line.strip():
+                    writer.add(tokenizer.encode(format_example(json.loads(line))))
+
+    index = writer.close(drop_last)
+    print(f"✅ Packed {index['examples']} examples into {index['total_sequences']} x {seq_len} tokens "
+          f"({len(index['shards'])} shard(s)) at {output_dir}")
+    return index
+
+
+class PackedDataset:
+    """Zero-copy reader for shards written by PackedShardWriter"""
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, 'index.json'), 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        if self.index.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported packed index version: {self.index.get('version')}")
+
+        self.seq_len = self.index['seq_len']
+        dtype = np.dtype(self.index['dtype'])
+        self._shards = [
+            np.memmap(os.path.join(directory, shard['path']), dtype=dtype, mode='r',
+                      shape=(shard['sequences'], self.seq_len))
+            for shard in self.index['shards'] if shard['sequences']
+        ]
+        self._offsets = np.cumsum([0] + [len(shard) for shard in self._shards])
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        """Row i as a read-only view into the memory-mapped shard"""
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        shard = int(np.searchsorted(self._offsets, i, side='right')) - 1
+        return self._shards[shard][i - self._offsets[shard]]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pack SFT JSON Lines into fixed-length token shards")
+    parser.add_argument('input', nargs='+', help="SFT JSON Lines file(s), e.g. a split from process_indommlu.py --split-dir")
+    parser.add_argument('--output', required=True, help="Output directory for .bin shards and index.json")
+    parser.add_argument('--tokenizer', default='byte', help="'byte', 'hf:<model>' or 'module:factory'")
+    parser.add_argument('--seq-len', type=int, default=1024)
+    parser.add_argument('--sequences-per-shard', type=int, default=65536)
+    parser.add_argument('--drop-last', action='store_true', help="Drop the final partial sequence instead of padding")
+    args = parser.parse_args()
+
+    pack_jsonl(args.input, args.output, load_tokenizer(args.tokenizer), args.seq_len,
+               args.sequences_per_shard, args.drop_last)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Single-flight Request Coalescing
+Concurrent callers with the same key share one in-flight coroutine, or one
+upstream stream that is fanned out to every subscriber (late subscribers first
+get a replay of the chunks already produced)
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class SingleFlight:
+    """Deduplicates concurrent coroutine calls by key"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of factory() for key, and whether it came from an earlier caller's call"""
+        # Tasks belong to one event loop, so callers on different loops never share
+        key = (asyncio.get_running_loop(), key)
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded: a caller that goes away does not cancel the call the others wait on
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every caller was cancelled
+
+
+class _Broadcast:
+    """One upstream iterator, buffered so any number of subscribers can replay it"""
+
+    def __init__(self, source: AsyncIterator[str], owner: Any):
+        self.owner = owner
+        self.chunks: List[str] = []
+        self.done = False
+        self.abandoned = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """Replay of every chunk so far, then live chunks (caller has counted itself in `subscribers`)"""
+        index = 0
+        try:
+            while True:
+                if index < len(self.chunks):
+                    index += 1
+                    yield self.chunks[index - 1]
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done:
+                # Nobody is listening any more: stop the upstream call
+                self.abandoned = True
+                self.task.cancel()
+
+
+class StreamFanout:
+    """Deduplicates concurrent streams by key"""
+
+    def __init__(self):
+        self._streams: Dict[Hashable, _Broadcast] = {}
+
+    def in_flight(self) -> int:
+        return len(self._streams)
+
+    def subscribe(self, key: Hashable, factory: Callable[[], AsyncIterator[str]],
+                  owner: Any = None) -> Tuple[AsyncGenerator[str, None], Any]:
+        """
+        Stream for key, starting factory() if no live stream exists
+
+        Returns the subscriber stream and the `owner` passed by the caller that
+        started the upstream (the caller's own owner when it started it).
+        Must be called with the event loop running.
+        """
+        key = (asyncio.get_running_loop(), key)
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.abandoned:
+            broadcast = _Broadcast(factory(), owner)
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda _: self._forget(key, broadcast))
+        # Counted now, not when iteration starts, so the upstream is not cancelled in between
+        broadcast.subscribers += 1
+        return broadcast.subscribe(), broadcast.owner
+
+    def _forget(self, key: Hashable, broadcast: _Broadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
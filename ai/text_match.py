@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Multi-pattern Text Matching
+Aho-Corasick automaton: finds every occurrence of any of N phrases in one pass
+over the text, independent of how many phrases there are
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+_ZERO_WIDTH = dict.fromkeys(map(ord, '​‌‍⁠﻿'))
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """Casefold, strip accents and zero-width characters, collapse whitespace
+
+    Keeps look-alike tricks ("ｉｇｎｏｒｅ", "ignóre", "ig​nore") from slipping past
+    exact phrase matching.
+    """
+    text = unicodedata.normalize('NFKD', text.translate(_ZERO_WIDTH))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _SPACES.sub(' ', text.casefold()).strip()
+
+
+class AhoCorasick:
+    """Compiled matcher for a fixed set of phrases
+
+    Phrases are normalized with normalize_text; search() expects normalized text.
+    With whole_words=True a match must not start or end inside a word, so
+    "rm -rf" matches but "union" does not match inside "reunion".
+    """
+
+    def __init__(self, phrases: Iterable[str], whole_words: bool = True):
+        self.whole_words = whole_words
+        self.phrases: List[str] = []
+        # State 0 is the root; each state has goto edges, a failure link and outputs
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for phrase in phrases:
+            phrase = normalize_text(phrase)
+            if phrase:
+                self._insert(phrase, len(self.phrases))
+                self.phrases.append(phrase)
+        self._build_failure_links()
+
+    def _insert(self, phrase: str, index: int):
+        state = 0
+        for ch in phrase:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(index)
+
+    def _build_failure_links(self):
+        # Breadth-first: a state's failure link is the longest proper suffix that is also a prefix
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _bounded(self, text: str, start: int, end: int) -> bool:
+        phrase_start, phrase_end = text[start], text[end - 1]
+        if phrase_start.isalnum() and start > 0 and text[start - 1].isalnum():
+            return False
+        if phrase_end.isalnum() and end < len(text) and text[end].isalnum():
+            return False
+        return True
+
+    def scanner(self) -> 'Scanner':
+        """Incremental matcher for text that arrives in chunks"""
+        return Scanner(self)
+
+    def search(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """(start, end, phrase index) for every match, in order of end position"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in out[state]:
+                start = i + 1 - len(self.phrases[index])
+                if not self.whole_words or self._bounded(text, start, i + 1):
+                    yield start, i + 1, index
+
+    def matches(self, text: str) -> List[str]:
+        """Distinct phrases found in text (normalized first)"""
+        seen = {index for _, _, index in self.search(normalize_text(text))}
+        return [self.phrases[i] for i in sorted(seen)]
+
+
+class Scanner:
+    """Feeds chunks through an AhoCorasick automaton, keeping state across chunks
+
+    Chunks are normalized like normalize_text (whitespace runs spanning chunk
+    boundaries collapse too). A match ending exactly at a chunk boundary is held
+    back until the next character shows whether the word continues.
+    """
+
+    def __init__(self, matcher: AhoCorasick):
+        self._matcher = matcher
+        self._state = 0
+        self._pos = 0
+        self._tail = ''         # last characters seen, for left word-boundary checks
+        self._keep = max((len(p) for p in matcher.phrases), default=0) + 1
+        self._pending: List[Tuple[int, int, int]] = []
+
+    def _left_ok(self, start: int) -> bool:
+        offset = start - (self._pos - len(self._tail))
+        first = self._tail[offset]
+        return not (first.isalnum() and offset > 0 and self._tail[offset - 1].isalnum())
+
+    def feed(self, chunk: str) -> List[Tuple[int, int, int]]:
+        """(start, end, phrase index) of matches confirmed so far"""
+        matcher = self._matcher
+        goto, fail, out, phrases = matcher._goto, matcher._fail, matcher._out, matcher.phrases
+        text = unicodedata.normalize('NFKD', chunk.translate(_ZERO_WIDTH))
+        found = []
+        for ch in text:
+            if unicodedata.combining(ch):
+                continue
+            ch = ' ' if ch.isspace() else ch.casefold()
+            if ch == ' ' and (not self._tail or self._tail[-1] == ' '):
+                continue
+            for c in ch:  # casefold may expand one character (ß -> ss)
+                if self._pending:
+                    # Matches that ended on the previous character
+                    if not c.isalnum():
+                        found.extend(self._pending)
+                    else:
+                        found.extend(m for m in self._pending if not phrases[m[2]][-1].isalnum())
+                    self._pending = []
+                self._tail = (self._tail + c)[-self._keep:]
+                self._pos += 1
+                while self._state and c not in goto[self._state]:
+                    self._state = fail[self._state]
+                self._state = goto[self._state].get(c, 0)
+                for index in out[self._state]:
+                    start = self._pos - len(phrases[index])
+                    if matcher.whole_words and not self._left_ok(start):
+                        continue
+                    if matcher.whole_words:
+                        self._pending.append((start, self._pos, index))
+                    else:
+                        found.append((start, self._pos, index))
+        return found
+
+    def finish(self) -> List[Tuple[int, int, int]]:
+        """Matches held back at the end of the text"""
+        found, self._pending = self._pending, []
+        return found
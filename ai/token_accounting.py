@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Token Accounting and Prompt Budgets
+Local token estimates, provider-reported usage, per-endpoint input/output
+budgets (trimming the catalog when a prompt is too large) and cost tracking
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from metrics import counter
+
+# Numbers split into 3-digit pieces, letters into ~4-character pieces and every
+# symbol is its own token: close to cl100k-style BPE on Indonesian/English text
+_PIECE_RE = re.compile(r'\d+|[^\W\d_]+|\S')
+
+# endpoint -> (max input tokens, max output tokens); TOKEN_BUDGET_<ENDPOINT>=in:out overrides
+DEFAULT_BUDGETS = {
+    'chat': (6000, 500),
+    'recommendations': (3000, 700),
+    'comparison': (3000, 700),
+}
+
+# USD per 1M (input, output) tokens; LLM_PRICING='{"model": [in, out]}' overrides
+DEFAULT_PRICING = {
+    'deepseek-chat': (0.27, 1.10),
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gemini-pro': (0.50, 1.50),
+}
+
+TOKENS = counter('llm_tokens_total', "LLM tokens by endpoint, provider and kind (prompt|completion)",
+                 ['endpoint', 'provider', 'kind'])
+COST = counter('llm_cost_usd_total', "Estimated LLM spend in USD", ['endpoint', 'provider'])
+TRIMMED = counter('prompt_trimmed_total', "Prompts trimmed to fit the input budget", ['endpoint'])
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Fast local token estimate (no tokenizer download)"""
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif piece[0].isalpha():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+@dataclass(frozen=True)
+class TokenBudget:
+    """Per-endpoint limits (shared between requests, hence frozen)"""
+    max_input_tokens: int
+    max_output_tokens: int
+
+    @classmethod
+    def for_endpoint(cls, endpoint: str) -> 'TokenBudget':
+        budgets = BUDGETS or load_budgets()
+        return budgets.get(endpoint, budgets['chat'])
+
+
+# endpoint -> TokenBudget with the overrides applied; filled by load_budgets()
+BUDGETS: Dict[str, TokenBudget] = {}
+
+
+def load_budgets() -> Dict[str, TokenBudget]:
+    """
+    Parse the TOKEN_BUDGET_<ENDPOINT> overrides once, at startup (after .env is
+    loaded), so a malformed value stops the server instead of failing requests
+    """
+    budgets = {}
+    for endpoint, (max_input, max_output) in DEFAULT_BUDGETS.items():
+        name = f'TOKEN_BUDGET_{endpoint.upper()}'
+        override = os.getenv(name)
+        if override:
+            try:
+                max_input, max_output = (int(v) for v in override.split(':'))
+            except ValueError:
+                raise ValueError(f"{name}={override!r}: expected <max input tokens>:<max output tokens>") from None
+            if max_input <= 0 or max_output <= 0:
+                raise ValueError(f"{name}={override!r}: token limits must be positive")
+        budgets[endpoint] = TokenBudget(max_input, max_output)
+    BUDGETS.clear()
+    BUDGETS.update(budgets)
+    return BUDGETS
+
+
+def _load_pricing() -> Dict[str, Tuple[float, float]]:
+    pricing = dict(DEFAULT_PRICING)
+    if os.getenv('LLM_PRICING'):
+        pricing.update({k: tuple(v) for k, v in json.loads(os.getenv('LLM_PRICING')).items()})
+    return pricing
+
+
+PRICING = _load_pricing()
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = PRICING.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+@dataclass
+class CallUsage:
+    """Token usage of one request; clients fill in provider-reported counts"""
+    endpoint: str
+    provider: str = ''
+    model: str = ''
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    estimated_prompt_tokens: int = 0
+    source: str = 'estimate'         # 'provider' once the API reported usage
+    max_output_tokens: int = 0
+    trimmed_products: int = 0
+    cost_usd: float = 0.0
+    coalesced: bool = False          # answered by an identical call already in flight
+
+    def report(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        """Usage as returned by the provider API"""
+        if prompt_tokens is None and completion_tokens is None:
+            return
+        self.prompt_tokens = int(prompt_tokens or 0)
+        self.completion_tokens = int(completion_tokens or 0)
+        self.source = 'provider'
+
+    def to_dict(self) -> Dict:
+        return {
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.prompt_tokens + self.completion_tokens,
+            'source': self.source,
+            'max_output_tokens': self.max_output_tokens,
+            'trimmed_products': self.trimmed_products,
+            'cost_usd': round(self.cost_usd, 6),
+            'coalesced': self.coalesced,
+        }
+
+
+@dataclass
+class _Totals:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    estimated_requests: int = 0
+    trimmed_requests: int = 0
+    cost_usd: float = 0.0
+
+
+class UsageLedger:
+    """Aggregates CallUsage per endpoint and provider"""
+
+    def __init__(self):
+        self._totals: Dict[Tuple[str, str], _Totals] = {}
+        # provider -> reported / estimated prompt tokens (EMA), used to calibrate budgets
+        self._ratios: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def calibrate(self, provider: str, estimate: int) -> int:
+        """Estimate scaled by what the provider has reported so far"""
+        return int(estimate * self._ratios.get(provider, 1.0))
+
+    def record(self, usage: CallUsage):
+        usage.cost_usd = cost_usd(usage.model, usage.prompt_tokens, usage.completion_tokens)
+        with self._lock:
+            totals = self._totals.setdefault((usage.endpoint, usage.provider), _Totals())
+            totals.requests += 1
+            totals.prompt_tokens += usage.prompt_tokens
+            totals.completion_tokens += usage.completion_tokens
+            totals.cost_usd += usage.cost_usd
+            totals.estimated_requests += usage.source != 'provider'
+            totals.trimmed_requests += usage.trimmed_products > 0
+            if usage.source == 'provider' and usage.prompt_tokens and usage.estimated_prompt_tokens:
+                ratio = usage.prompt_tokens / usage.estimated_prompt_tokens
+                previous = self._ratios.get(usage.provider)
+                self._ratios[usage.provider] = ratio if previous is None else 0.9 * previous + 0.1 * ratio
+
+        TOKENS.labels(usage.endpoint, usage.provider, 'prompt').inc(usage.prompt_tokens)
+        TOKENS.labels(usage.endpoint, usage.provider, 'completion').inc(usage.completion_tokens)
+        COST.labels(usage.endpoint, usage.provider).inc(usage.cost_usd)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            rows = [
+                {'endpoint': endpoint, 'provider': provider, **vars(totals),
+                 'cost_usd': round(totals.cost_usd, 6)}
+                for (endpoint, provider), totals in sorted(self._totals.items())
+            ]
+            ratios = {p: round(r, 3) for p, r in self._ratios.items()}
+        return {
+            'by_endpoint': rows,
+            'total_cost_usd': round(sum(r['cost_usd'] for r in rows), 6),
+            'total_tokens': sum(r['prompt_tokens'] + r['completion_tokens'] for r in rows),
+            'estimate_calibration': ratios,
+        }
+
+
+LEDGER = UsageLedger()
+
+
+def _relevance(product: Dict, terms: set) -> int:
+    words = set(re.findall(r'\w+', ' '.join([
+        product.get('name', ''), product.get('category', ''), ' '.join(product.get('keywords', []))
+    ]).lower()))
+    return len(words & terms)
+
+
+def fit_catalog_prompt(builder, customer_context: Optional[Dict], message: str, budget: TokenBudget,
+                       provider: str = '', ledger: UsageLedger = LEDGER) -> Tuple[str, int]:
+    """
+    Contextual system prompt that fits budget.max_input_tokens together with message
+
+    When the full prompt is too large, products are ranked by word overlap with the
+    message (catalog order breaks ties) and only as many as fit are kept.
+
+    Returns:
+        (system prompt, number of products dropped)
+    """
+    limit = budget.max_input_tokens
+    prompt = builder.build_contextual_prompt(customer_context)
+    if ledger.calibrate(provider, estimate_tokens(prompt) + estimate_tokens(message)) <= limit:
+        return prompt, 0
+
+    products: List[Dict] = builder.products
+    fixed = estimate_tokens(builder.build_contextual_prompt(customer_context, products=[]))
+    remaining = limit - ledger.calibrate(provider, fixed + estimate_tokens(message))
+
+    terms = set(re.findall(r'\w+', message.lower()))
+    ranked = sorted(range(len(products)), key=lambda i: (-_relevance(products[i], terms), i))
+    keep = []
+    for i in ranked:
+        cost = ledger.calibrate(provider, estimate_tokens(builder.format_product(products[i])))
+        if cost > remaining:
+            break
+        keep.append(i)
+        remaining -= cost
+
+    subset = [products[i] for i in sorted(keep)]
+    return builder.build_contextual_prompt(customer_context, products=subset), len(products) - len(subset)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Lightweight Request Tracing
+W3C traceparent propagation, contextvar-scoped spans, head sampling and
+batched export of Zipkin v2 JSON spans to a local file or a collector
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+REQUEST_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """What is propagated between processes"""
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+_current: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+class Span:
+    """A timed operation; attributes and events are only kept when sampled"""
+
+    __slots__ = ('tracer', 'name', 'context', 'parent_id', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'events', '_token')
+
+    def __init__(self, tracer: 'Tracer', name: str, context: SpanContext,
+                 parent_id: Optional[str] = None, kind: Optional[str] = None,
+                 attributes: Optional[Dict] = None, start_ns: Optional[int] = None):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes) if attributes and context.sampled else {}
+        self.events: List = []
+        self._token = None
+
+    @property
+    def sampled(self) -> bool:
+        return self.context.sampled
+
+    def set_attribute(self, key: str, value):
+        if self.context.sampled:
+            self.attributes[key] = value
+
+    def add_event(self, name: str):
+        """Mark a point in time inside the span (e.g. first streamed chunk)"""
+        if self.context.sampled:
+            self.events.append((time.time_ns(), name))
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            if self.context.sampled:
+                self.tracer.export(self)
+
+    def activate(self):
+        """Make this the current span (returns a token for deactivate)"""
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Token from another context (e.g. a stream finished on another thread)
+            _current.set(None)
+
+    def __enter__(self) -> 'Span':
+        self._token = self.activate()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.set_attribute('error', repr(exc))
+        self.deactivate(self._token)
+        self.end()
+
+    def to_zipkin(self, service_name: str) -> Dict:
+        span = {
+            'traceId': self.context.trace_id,
+            'id': self.context.span_id,
+            'name': self.name,
+            'timestamp': self.start_ns // 1000,
+            'duration': max((self.end_ns - self.start_ns) // 1000, 1),
+            'localEndpoint': {'serviceName': service_name},
+            'tags': {k: str(v) for k, v in self.attributes.items()},
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.kind:
+            span['kind'] = self.kind
+        if self.events:
+            span['annotations'] = [{'timestamp': ts // 1000, 'value': name} for ts, name in self.events]
+        return span
+
+
+class SpanExporter:
+    """Buffers finished spans and ships them from a background thread
+
+    `target` is a file path (JSON Lines, one span per line) or an http(s) URL
+    accepting Zipkin v2 JSON arrays (e.g. http://collector:9411/api/v2/spans).
+    When the buffer is full new spans are dropped rather than slowing requests.
+    """
+
+    def __init__(self, target: str, service_name: str, max_queue: int = 10000,
+                 batch_size: int = 512, flush_interval: float = 1.0):
+        self.target = target
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.exported = 0
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, first=None) -> List[Span]:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                span = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if span is None:
+                self._queue.put(None)
+                break
+            batch.append(span)
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if first is None:
+                batch = self._drain()
+                if batch:
+                    self._write(batch)
+                return
+            self._write(self._drain(first))
+
+    def _write(self, batch: List[Span]):
+        spans = [span.to_zipkin(self.service_name) for span in batch]
+        try:
+            if self.target.startswith(('http://', 'https://')):
+                req = urllib.request.Request(self.target, data=json.dumps(spans).encode('utf-8'),
+                                             headers={'Content-Type': 'application/json'})
+                urllib.request.urlopen(req, timeout=5).close()
+            else:
+                with open(self.target, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(span) + '\n' for span in spans)
+            self.exported += len(spans)
+        except Exception as e:
+            self.dropped += len(spans)
+            logger.warning(f"⚠️  Span export to {self.target} failed: {e}")
+
+    def close(self, timeout: float = 5.0):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+
+class Tracer:
+    """Creates spans and decides sampling for new traces"""
+
+    def __init__(self, service_name: str = 'xionco-ai-bridge', sample_rate: float = 0.1,
+                 exporter: Optional[SpanExporter] = None):
+        """
+        Args:
+            service_name: Reported as the span's localEndpoint
+            sample_rate: Fraction of new traces recorded (incoming sampled flags are honoured)
+            exporter: Where sampled spans go; without one nothing is recorded
+        """
+        self.service_name = service_name
+        self.sample_rate = sample_rate if exporter else 0.0
+        self.exporter = exporter
+
+    @classmethod
+    def from_env(cls, service_name: str = 'xionco-ai-bridge') -> 'Tracer':
+        """TRACE_EXPORT (file path or collector URL) and TRACE_SAMPLE_RATE (0-1, default 0.1)"""
+        target = os.getenv('TRACE_EXPORT', '').strip()
+        rate = min(max(float(os.getenv('TRACE_SAMPLE_RATE', 0.1)), 0.0), 1.0)
+        return cls(service_name, rate, SpanExporter(target, service_name) if target else None)
+
+    def extract(self, headers: Mapping[str, str]) -> Optional[SpanContext]:
+        """Parent context from a traceparent header, else a 32-hex X-Request-ID"""
+        match = TRACEPARENT_RE.match(headers.get('traceparent', '').strip().lower())
+        if match:
+            trace_id, span_id, flags = match.groups()
+            return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1) and self.exporter is not None)
+        request_id = headers.get('X-Request-ID', '').strip().lower().replace('-', '')
+        if REQUEST_ID_RE.match(request_id):
+            return SpanContext(request_id, '', random.random() < self.sample_rate)
+        return None
+
+    def start_span(self, name: str, parent: Optional[SpanContext] = None, kind: Optional[str] = None,
+                   attributes: Optional[Dict] = None, start_ns: Optional[int] = None) -> Span:
+        """
+        New span under `parent` (default: the current span); use as a context manager
+        to make it current for the block
+        """
+        if parent is None:
+            current = _current.get()
+            parent = current.context if current else None
+
+        if parent is None:
+            context = SpanContext(_new_id(128), _new_id(64), random.random() < self.sample_rate)
+            parent_id = None
+        else:
+            context = SpanContext(parent.trace_id, _new_id(64), parent.sampled)
+            parent_id = parent.span_id or None
+        return Span(self, name, context, parent_id, kind, attributes, start_ns)
+
+    def record_span(self, name: str, start_ns: int, end_ns: int, parent: Optional[SpanContext],
+                    attributes: Optional[Dict] = None):
+        """Record an already finished interval (e.g. queue wait measured elsewhere)"""
+        if parent is not None and parent.sampled:
+            self.start_span(name, parent, attributes=attributes, start_ns=start_ns).end(end_ns)
+
+    def export(self, span: Span):
+        if self.exporter:
+            self.exporter.submit(span)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_context() -> Optional[SpanContext]:
+    span = _current.get()
+    return span.context if span else None
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer, configured from the environment on first use"""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer.from_env()
+    return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def _reset_after_fork():
+    # A forked child inherits the tracer but not its exporter thread; it builds its own on first use
+    global _tracer, _tracer_lock
+    _tracer = None
+    _tracer_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def start_span(name: str, **kwargs) -> Span:
+    return get_tracer().start_span(name, **kwargs)
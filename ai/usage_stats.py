@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Streaming Usage Statistics
+Bounded-memory aggregates for the bridge: request counts and rates, active
+conversations, latency quantiles (log-bucket sketch), provider mix and top
+categories/products (Space-Saving heavy hitters)
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class QuantileSketch:
+    """HDR/DDSketch-style log-bucket histogram
+
+    Values land in buckets whose width grows geometrically, so every quantile is
+    within `relative_accuracy` of the true value; memory is one counter per
+    occupied bucket (a few hundred for latencies between 0.1 ms and an hour).
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = {}
+        self._zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        if value <= 0:
+            self._zeros += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self._zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in relative terms
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return self.max
+
+    def summary(self, quantiles: Iterable[float] = (0.5, 0.9, 0.95, 0.99)) -> Dict:
+        result = {'count': self.count, 'mean': self.total / self.count if self.count else 0.0, 'max': self.max}
+        for q in quantiles:
+            result[f"p{q * 100:g}"] = self.quantile(q)
+        return result
+
+
+class SpaceSaving:
+    """Top-k heavy hitters in `capacity` counters (Metwally et al.)
+
+    A new key arriving when all counters are taken replaces the smallest one
+    and inherits its count as error, so reported counts overestimate by at most
+    `error`, and any key with true frequency > total/capacity is kept.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.total = 0
+        self._counts: Dict[Hashable, List[int]] = {}    # key -> [count, error]
+
+    def add(self, key: Hashable, count: int = 1):
+        self.total += count
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += count
+        elif len(self._counts) < self.capacity:
+            self._counts[key] = [count, 0]
+        else:
+            victim = min(self._counts, key=lambda k: self._counts[k][0])
+            floor = self._counts.pop(victim)[0]
+            self._counts[key] = [floor + count, floor]
+
+    def top(self, k: int = 10) -> List[Tuple[Hashable, int, int]]:
+        """(key, count, max overestimate), largest first"""
+        ranked = sorted(self._counts.items(), key=lambda item: -item[1][0])
+        return [(key, count, error) for key, (count, error) in ranked[:k]]
+
+
+class ActiveSet:
+    """Keys seen within `ttl` seconds, capped at `max_size` (least recent evicted)"""
+
+    def __init__(self, ttl: float = 1800.0, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._last_seen: 'OrderedDict[Hashable, float]' = OrderedDict()
+
+    def touch(self, key: Hashable, now: Optional[float] = None):
+        now = now or time.monotonic()
+        self._last_seen[key] = now
+        self._last_seen.move_to_end(key)
+        if len(self._last_seen) > self.max_size:
+            self._last_seen.popitem(last=False)
+
+    def __len__(self) -> int:
+        # Entries are ordered by last access, so expired ones sit at the front
+        cutoff = time.monotonic() - self.ttl
+        while self._last_seen and next(iter(self._last_seen.values())) < cutoff:
+            self._last_seen.popitem(last=False)
+        return len(self._last_seen)
+
+
+class RateWindow:
+    """Events per second over the last `seconds` seconds (one slot per second)"""
+
+    def __init__(self, seconds: int = 60):
+        self.seconds = seconds
+        self._slots = [0] * seconds
+        self._stamps = [0] * seconds
+
+    def add(self, now: Optional[float] = None):
+        second = int(now or time.time())
+        slot = second % self.seconds
+        if self._stamps[slot] != second:
+            self._stamps[slot] = second
+            self._slots[slot] = 0
+        self._slots[slot] += 1
+
+    def per_minute(self) -> float:
+        now = int(time.time())
+        recent = sum(count for count, stamp in zip(self._slots, self._stamps) if now - stamp < self.seconds)
+        return recent * 60.0 / self.seconds
+
+
+class UsageStats:
+    """All bridge aggregates behind one lock (each update is a few dict operations)"""
+
+    def __init__(self, top_capacity: int = 100, conversation_ttl: float = 1800.0):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._requests: Dict[Tuple[str, int], int] = {}    # (route, status class) -> count
+        self._latency: Dict[str, QuantileSketch] = {}      # route -> sketch (ms)
+        self._providers: Dict[str, int] = {}
+        self._rate = RateWindow()
+        self._conversations = ActiveSet(conversation_ttl)
+        self._categories = SpaceSaving(top_capacity)
+        self._products = SpaceSaving(top_capacity)
+        self.chats = 0
+
+    def record_request(self, route: str, status: int, seconds: float, provider: Optional[str] = None):
+        with self._lock:
+            key = (route, status // 100)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            sketch = self._latency.get(route)
+            if sketch is None:
+                sketch = self._latency[route] = QuantileSketch()
+            sketch.add(seconds * 1000)
+            if provider:
+                self._providers[provider] = self._providers.get(provider, 0) + 1
+            if route == '/api/v1/chat':
+                self.chats += 1
+            self._rate.add()
+
+    def record_conversation(self, conversation_id: Optional[str]):
+        if conversation_id:
+            with self._lock:
+                self._conversations.touch(conversation_id)
+
+    def record_interest(self, categories: Iterable[str] = (), product_ids: Iterable[int] = ()):
+        """Categories and products a request asked about or was answered with"""
+        with self._lock:
+            for category in categories:
+                if category:
+                    self._categories.add(category.lower())
+            for product_id in product_ids:
+                self._products.add(int(product_id))
+
+    def snapshot(self, top: int = 10) -> Dict:
+        with self._lock:
+            requests: Dict[str, Dict[str, int]] = {}
+            for (route, status_class), count in sorted(self._requests.items()):
+                requests.setdefault(route, {})[f"{status_class}xx"] = count
+            latency = {route: {k: round(v, 2) if isinstance(v, float) else v for k, v in sketch.summary().items()}
+                       for route, sketch in sorted(self._latency.items())}
+            provider_total = sum(self._providers.values())
+            providers = {p: {'requests': n, 'share': round(n / provider_total, 3)}
+                         for p, n in sorted(self._providers.items(), key=lambda item: -item[1])}
+            chat_latency = self._latency.get('/api/v1/chat')
+            return {
+                # Summary fields kept from the original Go stub
+                'total_chats': self.chats,
+                'active_users': len(self._conversations),
+                'avg_response_time': f"{chat_latency.summary()['mean'] / 1000:.2f}s" if chat_latency else "0.0s",
+                'uptime_hours': round((time.time() - self.started) / 3600, 2),
+                'requests_per_minute': self._rate.per_minute(),
+                'requests': requests,
+                'latency_ms': latency,
+                'providers': providers,
+                'top_categories': [{'category': key, 'count': count, 'error': error}
+                                   for key, count, error in self._categories.top(top)],
+                'top_products': [{'product_id': key, 'count': count, 'error': error}
+                                 for key, count, error in self._products.top(top)],
+                'timestamp': int(time.time()),
+            }
+
+
+STATS = UsageStats()
@@ -5,20 +5,39 @@ Connects Golang Fiber frontend to Python AI services
 Handles: LLM API calls, image analysis, product recommendations
 """
 
-from flask import Flask, request, jsonify, stream_with_context, Response
+from flask import Flask, request, jsonify, stream_with_context, Response, g
 from flask_cors import CORS
 import json
 import os
-import asyncio
+import hmac
 import logging
+import tempfile
+import time
 from datetime import datetime
 from typing import Dict, List, Optional
 import sys
 sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai'))
 
 from llm_client import LLMManager
 from system_prompt import SystemPromptBuilder, PromptTemplateLibrary
 from image_detector import FurnitureImageDetector
+from batch_inference import MicroBatchScheduler, BatchSettings
+from image_jobs import ImageJobQueue, JobSettings, QueueFull, PRIORITIES
+from catalog import load_catalog, filter_products
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, counter, gauge, histogram
+from tracing import Span, get_tracer, start_span, current_span
+import profiler
+from token_accounting import CallUsage, TokenBudget, LEDGER, TRIMMED, fit_catalog_prompt, load_budgets
+from http_transport import get_background_loop, transport_stats
+from prompt_guard import PromptGuard, REFUSAL_MESSAGE
+from product_matcher import get_product_matcher, NAME_WEIGHT
+from product_fragments import ProductFragments
+from intent import IntentClassifier, GenerationProfile, generation_profile, load_profiles
+from usage_stats import STATS
+from response_cache import ResponseCache, CachedAnswer
+from prefetch import (Prefetcher, FollowUpPredictor, TopicClassifier, ConversationTopics, FollowUp,
+                      cache_key)
 
 # Configure logging
 logging.basicConfig(
@@ -34,18 +53,201 @@ CORS(app, resources={r"/api/*": {"origins": "*"}})
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv()
+# Malformed TOKEN_BUDGET_* / INTENT_PROFILE_* values fail here, at startup, not on every request
+load_budgets()
+load_profiles()
 
-# Initialize services
-try:
-    llm_manager = LLMManager(primary_provider=os.getenv('PRIMARY_LLM', 'deepseek'))
-    prompt_builder = SystemPromptBuilder('data/products_catalog.json')
-    image_detector = FurnitureImageDetector() if os.getenv('ENABLE_IMAGE_DETECTION', 'false').lower() == 'true' else None
-    logger.info("✅ All services initialized")
-except Exception as e:
-    logger.error(f"❌ Initialization error: {e}")
-    llm_manager = None
-    prompt_builder = None
-    image_detector = None
+# Request metrics (exposed on /metrics)
+HTTP_REQUESTS = counter('http_requests_total', "HTTP requests by route, method and status",
+                        ['route', 'method', 'status'])
+HTTP_LATENCY = histogram('http_request_duration_seconds',
+                         "Time until the response is returned (streams: until headers)",
+                         ['route', 'provider'])
+HTTP_IN_FLIGHT = gauge('http_requests_in_flight', "Requests currently being served (streams until closed)",
+                       ['route'])
+# Answers to product follow-ups (price, dimensions, warranty, ...) are cached and
+# the likely next ones prefetched in the background
+response_cache = ResponseCache(max_entries=int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000)),
+                               ttl=float(os.getenv('RESPONSE_CACHE_TTL', 600)))
+topic_classifier = TopicClassifier()
+# Output limit, temperature, answer format and early stop per chat intent
+intent_classifier = IntentClassifier()
+conversation_topics = ConversationTopics()
+# Compact per-product system prompts for chats opened from a product page
+product_fragments = ProductFragments('data/qa_sft_dataset.json')
+
+# Initialize services (init_services() below)
+llm_loop = None
+llm_manager = None
+prompt_builder = None
+image_detector = None
+image_batcher = None
+image_jobs = None
+prompt_guard = None
+prefetcher = None
+
+
+def init_services():
+    """
+    Start the LLM event loop and build the LLM, image and prefetch services
+
+    Not run in worker processes multiprocessing spawns for image jobs: they import
+    this file again as __mp_main__ but only run image_jobs functions.
+    """
+    global llm_loop, llm_manager, prompt_builder, image_detector, image_batcher, image_jobs, prompt_guard
+    global prefetcher
+    # All LLM coroutines run on one persistent loop so pooled provider connections are reused
+    llm_loop = get_background_loop()
+    
+    try:
+        llm_manager = LLMManager(primary_provider=os.getenv('PRIMARY_LLM', 'deepseek'))
+        prompt_builder = SystemPromptBuilder('data/products_catalog.json')
+        image_detector = (FurnitureImageDetector()
+                          if os.getenv('ENABLE_IMAGE_DETECTION', 'false').lower() == 'true' else None)
+        # Coalesce concurrent uploads into batched forward passes
+        image_batcher = MicroBatchScheduler(
+            image_detector.analyze_images, BatchSettings.from_env(), name='image-batcher'
+        ) if image_detector else None
+        # Async uploads (?async=true) are analyzed by separate worker processes
+        job_settings = JobSettings.from_env()
+        image_jobs = ImageJobQueue(job_settings) if image_detector and job_settings.workers else None
+        # Local injection/off-topic filter: blocked messages never reach a provider
+        prompt_guard = (PromptGuard.from_env()
+                        if os.getenv('PROMPT_GUARD_ENABLED', 'true').lower() == 'true' else None)
+        logger.info("✅ All services initialized")
+    except Exception as e:
+        logger.error(f"❌ Initialization error: {e}")
+        llm_manager = None
+        prompt_builder = None
+        image_detector = None
+        image_batcher = None
+        image_jobs = None
+        prompt_guard = None
+    
+    prefetcher = Prefetcher(
+        llm_manager, response_cache, llm_loop.loop, FollowUpPredictor('data/qa_sft_dataset.json'),
+        build_prompt=lambda product, ctx, question, provider: (
+            product_prompt(product['id'], ctx)
+            or fit_catalog_prompt(prompt_builder, ctx, question, TokenBudget.for_endpoint('chat'), provider)[0]),
+        # The asking request itself is still in flight
+        busy=lambda: int(HTTP_IN_FLIGHT.labels('/api/v1/chat').value()) - 1,
+        extract=lambda answer, question: related_products_for(answer, question),
+        # The answer format and limits the chat would use when this question is asked
+        profile=lambda question: generation_profile(intent_classifier.classify(question, count=False)),
+    ) if llm_manager else None
+    if image_batcher:
+        gauge('image_batch_queue_depth', "Images waiting for the batch worker").set_function(
+            lambda: image_batcher.get_stats()['queued']
+        )
+
+
+if __name__ != '__mp_main__':
+    init_services()
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    HTTP_IN_FLIGHT.labels(g.metrics_route).inc()
+
+
+@app.before_request
+def start_request_span():
+    # Continue the caller's trace (traceparent / X-Request-ID from the Go API) or start one
+    tracer = get_tracer()
+    g.trace_span = tracer.start_span(
+        f"{request.method} {g.metrics_route}", parent=tracer.extract(request.headers), kind='SERVER',
+        attributes={'http.method': request.method, 'http.route': g.metrics_route}
+    )
+    g.trace_token = g.trace_span.activate()
+
+
+@app.after_request
+def record_request_metrics(response):
+    route = g.get('metrics_route', 'unmatched')
+    if 'metrics_start' in g:
+        HTTP_LATENCY.labels(route, g.get('provider', '')).observe(time.perf_counter() - g.metrics_start)
+        # Runs once the body is sent, i.e. after the last chunk for streams
+        response.call_on_close(HTTP_IN_FLIGHT.labels(route).dec)
+        started, status, provider = g.metrics_start, response.status_code, g.get('provider')
+        response.call_on_close(
+            lambda: STATS.record_request(route, status, time.perf_counter() - started, provider)
+        )
+    HTTP_REQUESTS.labels(route, request.method, response.status_code).inc()
+    
+    span = g.get('trace_span')
+    if span:
+        span.set_attribute('http.status_code', response.status_code)
+        if g.get('provider'):
+            span.set_attribute('llm.provider', g.provider)
+        response.headers['traceparent'] = span.context.traceparent
+        response.headers['X-Request-ID'] = span.context.trace_id
+        # Ends after the last chunk for streams
+        response.call_on_close(span.end)
+    return response
+
+
+@app.teardown_request
+def release_request_span(exc):
+    if 'trace_token' in g:
+        Span.deactivate(g.pop('trace_token'))
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def install_profiler_signal():
+    """
+    `kill -USR1 <pid>` writes a collapsed-stack profile without redeploying
+
+    Called by the processes that serve requests (__main__ below, pre-fork workers),
+    not on import: image job workers import this file too and must not profile.
+    """
+    profiler.install_signal_handler(
+        seconds=float(os.getenv('PROFILE_SECONDS', 30)),
+        output_dir=os.getenv('PROFILE_OUTPUT_DIR') or None,
+        memory=os.getenv('PROFILE_MEMORY', 'false').lower() == 'true'
+    )
+
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """
+    Sample all worker threads and return collapsed stacks (flamegraph input)
+    
+    Disabled unless ADMIN_TOKEN is set; requires header X-Admin-Token.
+    
+    Query params:
+    - seconds: profiling window (default: 10, max: 120)
+    - interval_ms: sampling interval (default: 10)
+    - idle: include threads parked in wait/select (default: false)
+    - memory: also diff tracemalloc snapshots; response becomes JSON (default: false)
+    """
+    admin_token = os.getenv('ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'error': 'Endpoint not found'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode('utf-8'),
+                               admin_token.encode('utf-8')):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    seconds = min(max(request.args.get('seconds', 10.0, type=float), 0.1), 120.0)
+    interval = max(request.args.get('interval_ms', 10.0, type=float), 1.0) / 1000
+    include_idle = request.args.get('idle', 'false').lower() == 'true'
+    memory = request.args.get('memory', 'false').lower() == 'true'
+    
+    try:
+        result = profiler.profile(seconds, interval, include_idle, memory)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    logger.info(f"🔥 Profile taken: {result.samples} samples over {result.duration:.1f}s")
+    if memory:
+        return jsonify(result.to_dict()), 200
+    return Response(result.collapsed(), mimetype='text/plain')
 
 
 @app.route('/health', methods=['GET'])
@@ -86,30 +288,77 @@ def chat():
         provider = data.get('provider')
         stream = data.get('stream', False)
         customer_context = data.get('customer_context', {})
+        g.provider = provider or llm_manager.primary_provider
+        conversation_id = data.get('conversation_id') or data.get('user_id')
+        STATS.record_conversation(conversation_id)
+        # "12" from a form field and 12 name the same product everywhere below
+        product_id = parse_product_id(data.get('product_id'))
+        if product_id is not None:
+            record_product_interest([product_id])
         
-        # Build system prompt with context
-        system_prompt = prompt_builder.build_contextual_prompt(customer_context)
+        verdict = prompt_guard.check(user_message) if prompt_guard else None
+        if verdict and verdict.blocked:
+            logger.warning(f"⛔ Blocked chat message ({', '.join(verdict.categories)}, score {verdict.score:.2f})")
+            current_span().set_attribute('prompt_guard.blocked', ','.join(verdict.categories))
+            return blocked_response(verdict, stream)
+        
+        followup = resolve_followup(user_message, product_id, conversation_id,
+                                    g.provider.lower(), customer_context)
+        cached = response_cache.get(followup.key) if followup.key else None
+        if cached:
+            current_span().set_attribute('response_cache.prefetched', cached.prefetched)
+            finish_followup(followup, cached.text, cached.related_products, customer_context)
+            return cached_response(cached, stream)
+        
+        # Build system prompt with context, trimmed to the endpoint's input budget
+        budget = TokenBudget.for_endpoint('chat')
+        usage = CallUsage('chat')
+        intent = intent_classifier.classify(user_message)
+        profile = generation_profile(intent)
+        max_tokens = profile.max_tokens or budget.max_output_tokens
+        current_span().set_attribute('chat.intent', intent)
+        with start_span('prompt.build') as span:
+            # A product-page chat only needs that product's fragment, not the whole catalog
+            system_prompt = product_prompt(product_id, customer_context)
+            span.set_attribute('prompt.mode', 'product' if system_prompt else 'catalog')
+            if system_prompt is None:
+                system_prompt, usage.trimmed_products = fit_catalog_prompt(
+                    prompt_builder, customer_context, user_message, budget, g.provider.lower()
+                )
+            if profile.instruction:
+                system_prompt = f"{system_prompt}\n\n{profile.instruction}"
+            span.set_attribute('prompt.chars', len(system_prompt))
+            span.set_attribute('prompt.trimmed_products', usage.trimmed_products)
+        if usage.trimmed_products:
+            TRIMMED.labels('chat').inc()
         
         # Get response from LLM
         if stream:
             # Streaming response
+            # The request context stays available to the follow-up bookkeeping after the last chunk
             return Response(
-                stream_response(user_message, system_prompt, provider),
+                stream_with_context(stream_response(user_message, system_prompt, provider, current_span(),
+                                                    max_tokens, usage, followup, customer_context, profile)),
                 mimetype='application/json'
             )
         else:
             # Regular response
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
-            response_text = loop.run_until_complete(
-                llm_manager.chat(user_message, system_prompt, provider)
+            response_text = llm_loop.run(
+                llm_manager.chat(user_message, system_prompt, provider,
+                                 max_tokens=max_tokens, usage=usage, **profile.llm_kwargs())
             )
+            mentions = related_products_for(response_text, user_message)
+            record_product_interest(mentions['related_products'])
+            finish_followup(followup, response_text, mentions['related_products'], customer_context, mentions)
             
             return jsonify({
                 'id': f"msg_{int(datetime.now().timestamp() * 1000)}",
                 'message': response_text,
                 'provider': provider or llm_manager.primary_provider,
+                'related_products': mentions['related_products'],
+                'confidence': mentions['confidence'],
+                'intent': intent,
+                'usage': usage.to_dict(),
                 'timestamp': datetime.now().isoformat(),
                 'status': 'success'
             }), 200
@@ -119,16 +368,153 @@ def chat():
         return jsonify({'error': str(e)}), 500
 
 
-def stream_response(message: str, system_prompt: str, provider: Optional[str] = None):
-    """Stream response chunks from LLM"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+def related_products_for(response_text: str, query: str) -> Dict:
+    """Catalog products named in an LLM answer and how well they fit the question"""
+    if not response_text or response_text.startswith('❌'):
+        return {'related_products': [], 'confidence': 0.0}
+    matcher = get_product_matcher(load_catalog('data/products_catalog.json'))
+    return matcher.extract(response_text, query)
+
+
+def parse_product_id(value) -> Optional[int]:
+    """Request product_id as an int (None when missing or not a whole number)"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def product_prompt(product_id: Optional[int], customer_context: Optional[Dict]) -> Optional[str]:
+    """System prompt built from one product's fragment (None for unknown or missing ids)"""
+    if product_id is None:
+        return None
+    fragment = product_fragments.get(load_catalog('data/products_catalog.json'), product_id)
+    return prompt_builder.build_product_prompt(fragment, customer_context) if fragment else None
+
+
+def record_product_interest(product_ids: List[int]):
+    """Count products (and their categories) toward the top-N usage statistics"""
+    by_id = {p['id']: p for p in load_catalog('data/products_catalog.json')}
+    known = [pid for pid in product_ids if pid in by_id]
+    STATS.record_interest([by_id[pid]['category'] for pid in known], known)
+
+
+def resolve_followup(message: str, product_id: Optional[int], conversation_id: Optional[str],
+                     provider: str, customer_context: Optional[Dict]) -> FollowUp:
+    """Product (explicit, named in the message, or from the conversation) and follow-up topic"""
+    products = load_catalog('data/products_catalog.json')
+    by_id = {p['id']: p for p in products}
+    last_product, previous_topic, asked = conversation_topics.get(conversation_id)
+    
+    if product_id not in by_id:
+        named = [pid for pid, score in get_product_matcher(products).score_text(message).items()
+                 if score >= NAME_WEIGHT]
+        product_id = named[0] if len(named) == 1 else (None if named else last_product)
+    product = by_id.get(product_id)
+    topic = topic_classifier.classify(message)
+    
+    # Keyed by the normalized question too: a cached answer is never served for a different question
+    key = cache_key(provider, product['id'], topic, customer_context, message) if product and topic else None
+    return FollowUp(conversation_id, product, topic, previous_topic, asked, key)
+
+
+def finish_followup(followup: FollowUp, answer: str, related_products: List[int],
+                    customer_context: Optional[Dict], mentions: Optional[Dict] = None):
+    """Cache the answer, advance the conversation's topic state and prefetch what comes next"""
+    if not answer or answer.startswith('❌'):
+        return
+    if mentions is not None and followup.key:
+        response_cache.put(followup.key, CachedAnswer(answer, followup.key[0], mentions['related_products'],
+                                                      mentions['confidence']))
+    
+    product = followup.product
+    if product is None and related_products:
+        product = next((p for p in load_catalog('data/products_catalog.json')
+                        if p['id'] == related_products[0]), None)
+    if followup.conversation_id:
+        if prefetcher:
+            prefetcher.predictor.observe(followup.previous_topic, followup.topic)
+        conversation_topics.update(followup.conversation_id, product['id'] if product else None, followup.topic)
+    if product and prefetcher:
+        queued = prefetcher.schedule(product, followup.topic, g.provider.lower(), customer_context,
+                                     asked=followup.asked | {followup.topic})
+        if queued:
+            current_span().set_attribute('prefetch.topics', ','.join(queued))
+
+
+def cached_response(entry: CachedAnswer, stream: bool):
+    """Answer served from the response cache (no LLM call)"""
+    usage = CallUsage('chat', provider=entry.provider, source='cache')
+    if stream:
+        lines = [
+            {'chunk': entry.text, 'token_count': 1, 'is_final': False},
+            {'chunk': '', 'token_count': 1, 'is_final': True, 'related_products': entry.related_products,
+             'confidence': entry.confidence, 'cached': True, 'prefetched': entry.prefetched,
+             'usage': usage.to_dict()},
+        ]
+        return Response(''.join(json.dumps(line) + '\n' for line in lines), mimetype='application/json')
+    return jsonify({
+        'id': f"msg_{int(datetime.now().timestamp() * 1000)}",
+        'message': entry.text,
+        'provider': entry.provider,
+        'related_products': entry.related_products,
+        'confidence': entry.confidence,
+        'cached': True,
+        'prefetched': entry.prefetched,
+        'usage': usage.to_dict(),
+        'timestamp': datetime.now().isoformat(),
+        'status': 'success'
+    }), 200
+
+
+def blocked_response(verdict, stream: bool):
+    """Canned refusal for a message the prompt guard rejected (no LLM call, no usage)"""
+    g.provider = 'prompt_guard'
+    if stream:
+        return Response(json.dumps({
+            'chunk': REFUSAL_MESSAGE,
+            'token_count': 0,
+            'is_final': True,
+            'guard': verdict.to_dict()
+        }) + '\n', mimetype='application/json')
+    return jsonify({
+        'id': f"msg_{int(datetime.now().timestamp() * 1000)}",
+        'message': REFUSAL_MESSAGE,
+        'provider': None,
+        'guard': verdict.to_dict(),
+        'timestamp': datetime.now().isoformat(),
+        'status': 'blocked'
+    }), 200
+
+
+def stream_response(message: str, system_prompt: str, provider: Optional[str] = None,
+                    parent_span: Optional[Span] = None, max_tokens: int = 500,
+                    usage: Optional[CallUsage] = None, followup: Optional[FollowUp] = None,
+                    customer_context: Optional[Dict] = None, profile: Optional[GenerationProfile] = None):
+    """Stream response chunks from LLM; the final line carries token usage and related products"""
+    # The body is iterated after the view returned; re-enter the request's span
+    trace_token = parent_span.activate() if parent_span else None
+    
+    # Product mentions are matched as chunks arrive, so the final line costs nothing extra
+    mentions = get_product_matcher(load_catalog('data/products_catalog.json')).tracker(message)
+    
+    answer = {'text': '', 'final': None}
     
     async def generate():
         buffer = ""
         token_count = 0
+        failed = False
+        pieces = []
         
-        async for chunk in llm_manager.stream_chat(message, system_prompt, provider):
+        generation = profile.llm_kwargs() if profile else {}
+        async for chunk in llm_manager.stream_chat(message, system_prompt, provider,
+                                                   max_tokens=max_tokens, usage=usage, **generation):
+            if token_count == 0:
+                failed = chunk.startswith('❌')
+            mentions.feed(chunk)
+            pieces.append(chunk)
             buffer += chunk
             token_count += 1
             
@@ -141,15 +527,30 @@ def stream_response(message: str, system_prompt: str, provider: Optional[str] =
                 }) + '\n'
                 buffer = ""
         
-        # Send final chunk
-        if buffer:
-            yield json.dumps({
-                'chunk': buffer,
-                'token_count': token_count,
-                'is_final': True
-            }) + '\n'
+        # Send final chunk (always, so clients get the usage)
+        final = {
+            'chunk': buffer,
+            'token_count': token_count,
+            'is_final': True
+        }
+        final.update({'related_products': [], 'confidence': 0.0} if failed or not token_count
+                     else mentions.result())
+        record_product_interest(final['related_products'])
+        answer['text'], answer['final'] = ''.join(pieces), final
+        if usage is not None:
+            final['usage'] = usage.to_dict()
+        yield json.dumps(final) + '\n'
     
-    return loop.run_until_complete(generate())
+    # Drive the async generator one item at a time so Flask can flush each line
+    try:
+        yield from llm_loop.iterate(generate())
+        if followup is not None and answer['final'] is not None:
+            # Back on the request thread: prompt building for prefetch stays off the event loop
+            finish_followup(followup, answer['text'], answer['final']['related_products'], customer_context,
+                            answer['final'])
+    finally:
+        if trace_token is not None:
+            Span.deactivate(trace_token)
 
 
 @app.route('/api/v1/recommendations', methods=['POST'])
@@ -170,21 +571,25 @@ def get_recommendations():
         
         # Build recommendation prompt
         template = PromptTemplateLibrary.recommendation_prompt(data)
+        g.provider = data.get('provider') or llm_manager.primary_provider
+        usage = CallUsage('recommendations')
+        profile = generation_profile('recommendation')
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        response = loop.run_until_complete(
+        response = llm_loop.run(
             llm_manager.chat(
                 "Berikan rekomendasi produk terbaik: " + json.dumps(data),
                 template,
-                data.get('provider')
+                data.get('provider'),
+                max_tokens=profile.max_tokens or TokenBudget.for_endpoint('recommendations').max_output_tokens,
+                usage=usage,
+                **profile.llm_kwargs()
             )
         )
         
         return jsonify({
             'recommendations': response,
             'preferences': data,
+            'usage': usage.to_dict(),
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -199,6 +604,8 @@ def analyze_image():
     Analyze furniture image for features and style
     
     Request: multipart/form-data with 'image' file
+    - async: "true" to queue a job and return 202 with its id (form field or query param)
+    - priority: high, normal or low (async only, default normal)
     """
     if not image_detector:
         return jsonify({'error': 'Image detection not enabled'}), 503
@@ -208,16 +615,38 @@ def analyze_image():
             return jsonify({'error': 'image file is required'}), 400
         
         file = request.files['image']
+        suffix = os.path.splitext(file.filename or '')[1]
         
-        # Save temporarily
-        temp_path = f"/tmp/{file.filename}"
-        file.save(temp_path)
+        if request.values.get('async', 'false').lower() == 'true':
+            if not image_jobs:
+                return jsonify({'error': 'Async image analysis not enabled'}), 503
+            priority = request.values.get('priority', 'normal')
+            if priority not in PRIORITIES:
+                return jsonify({'error': f"priority must be one of {', '.join(PRIORITIES)}"}), 400
+            try:
+                job, deduplicated = image_jobs.submit(file.read(), suffix, priority)
+            except QueueFull as e:
+                return jsonify({'error': str(e)}), 429
+            current_span().set_attribute('image.job_deduplicated', deduplicated)
+            return jsonify({
+                'job_id': job.id,
+                'status': job.status,
+                'deduplicated': deduplicated,
+                'poll_url': f"/api/v1/image-analysis/jobs/{job.id}"
+            }), 202
         
-        # Analyze
-        analysis = image_detector.analyze_image(temp_path)
+        # Save temporarily (unique name: concurrent uploads may share a filename)
+        fd, temp_path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
         
-        # Cleanup
-        os.remove(temp_path)
+        try:
+            file.save(temp_path)
+            # Analyze (batched together with other in-flight uploads)
+            with start_span('image.analyze'):
+                analysis = image_batcher.submit(temp_path).result()
+        finally:
+            # Cleanup
+            os.remove(temp_path)
         
         return jsonify({
             'analysis': analysis,
@@ -229,6 +658,24 @@ def analyze_image():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/v1/image-analysis/jobs/<job_id>', methods=['GET'])
+def image_analysis_job(job_id: str):
+    """
+    Status (and, once finished, the analysis) of an async image job
+    
+    Query params:
+    - wait: seconds to hold the request until the job finishes (long polling, max 30)
+    """
+    if not image_jobs:
+        return jsonify({'error': 'Async image analysis not enabled'}), 503
+    
+    wait = min(max(request.args.get('wait', 0, type=float), 0.0), 30.0)
+    job = image_jobs.wait(job_id, wait)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(job.to_dict()), 200
+
+
 @app.route('/api/v1/product-search', methods=['GET'])
 def product_search():
     """
@@ -245,27 +692,12 @@ def product_search():
         max_price = request.args.get('max_price', type=int)
         
         # Load product catalog
-        with open('data/products_catalog.json', 'r', encoding='utf-8') as f:
-            catalog = json.load(f)
-        
-        products = catalog.get('products', [])
+        products = load_catalog('data/products_catalog.json')
         
         # Filter products
-        filtered = []
-        for product in products:
-            matches = True
-            
-            if query and query.lower() not in product['name'].lower():
-                matches = False
-            
-            if category and product['category'].lower() != category.lower():
-                matches = False
-            
-            if max_price and product['price'] > max_price:
-                matches = False
-            
-            if matches:
-                filtered.append(product)
+        filtered = filter_products(products, query, category, max_price)
+        if category:
+            STATS.record_interest([category])
         
         return jsonify({
             'count': len(filtered),
@@ -299,23 +731,29 @@ def compare_products():
         if not product_ids:
             return jsonify({'error': 'product_ids is required'}), 400
         
+        record_product_interest(product_ids)
+        
         # Build comparison prompt
         template = PromptTemplateLibrary.comparison_prompt(product_ids)
+        g.provider = data.get('provider') or llm_manager.primary_provider
+        usage = CallUsage('comparison')
+        profile = generation_profile('comparison')
         
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        response = loop.run_until_complete(
+        response = llm_loop.run(
             llm_manager.chat(
                 f"Compare these products: {product_ids}",
                 template,
-                data.get('provider')
+                data.get('provider'),
+                max_tokens=profile.max_tokens or TokenBudget.for_endpoint('comparison').max_output_tokens,
+                usage=usage,
+                **profile.llm_kwargs()
             )
         )
         
         return jsonify({
             'comparison': response,
             'product_ids': product_ids,
+            'usage': usage.to_dict(),
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -333,10 +771,40 @@ def list_providers():
     return jsonify({
         'available_providers': llm_manager.list_providers(),
         'primary_provider': llm_manager.primary_provider,
+        'transport': transport_stats(),
+        'timestamp': datetime.now().isoformat()
+    }), 200
+
+
+@app.route('/api/v1/usage', methods=['GET'])
+def usage_summary():
+    """Aggregated token usage and estimated cost since startup"""
+    return jsonify({
+        **LEDGER.snapshot(),
+        'budgets': {
+            endpoint: vars(TokenBudget.for_endpoint(endpoint))
+            for endpoint in ('chat', 'recommendations', 'comparison')
+        },
         'timestamp': datetime.now().isoformat()
     }), 200
 
 
+@app.route('/api/v1/stats', methods=['GET'])
+def usage_stats():
+    """
+    Live request statistics (bounded memory, since startup)
+    
+    Query params:
+    - top: number of top categories/products (default 10)
+    """
+    snapshot = STATS.snapshot(top=request.args.get('top', 10, type=int))
+    if prefetcher:
+        snapshot['prefetch'] = prefetcher.stats()
+    if image_jobs:
+        snapshot['image_jobs'] = image_jobs.get_stats()
+    return jsonify(snapshot), 200
+
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
@@ -356,4 +824,5 @@ if __name__ == '__main__':
     logger.info(f"📡 Available LLM providers: {llm_manager.list_providers() if llm_manager else 'None'}")
     logger.info(f"🖼️ Image detection: {'Enabled' if image_detector else 'Disabled'}")
     
+    install_profiler_signal()
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -2,12 +2,18 @@ package main
 
 import (
 	"bytes"
+	crand "crypto/rand"
+	"encoding/hex"
 	"encoding/json"
 	"fmt"
 	"io"
 	"log"
+	mrand "math/rand"
 	"net/http"
+	"net/url"
 	"os"
+	"strconv"
+	"strings"
 	"time"
 
 	"github.com/gofiber/fiber/v2"
@@ -61,6 +67,8 @@ var (
 	app         *fiber.App
 	aiService   *AIService
 	rateLimiter map[string]*RateLimitEntry
+	// Fraction of new traces marked sampled in traceparent (TRACE_SAMPLE_RATE)
+	traceSampleRate = 0.1
 )
 
 // RateLimitEntry tracks rate limit state
@@ -86,6 +94,54 @@ func init() {
 	aiService = &AIService{
 		pythonServiceURL: pythonURL,
 	}
+
+	if rate, err := strconv.ParseFloat(os.Getenv("TRACE_SAMPLE_RATE"), 64); err == nil {
+		traceSampleRate = rate
+	}
+}
+
+// randomHex returns n random bytes hex-encoded
+func randomHex(n int) string {
+	b := make([]byte, n)
+	crand.Read(b)
+	return hex.EncodeToString(b)
+}
+
+// isLowerHex reports whether s is non-empty lowercase hexadecimal.
+func isLowerHex(s string) bool {
+	for _, r := range s {
+		if (r < '0' || r > '9') && (r < 'a' || r > 'f') {
+			return false
+		}
+	}
+	return s != ""
+}
+
+// isTraceID reports whether s is a valid W3C trace or span ID: lowercase hex of
+// the given length, not all zeros.
+func isTraceID(s string, length int) bool {
+	return len(s) == length && isLowerHex(s) && strings.Trim(s, "0") != ""
+}
+
+// traceParentFor continues the caller's W3C traceparent or starts a new trace.
+// A traceparent that is not valid version 00 (lowercase hex, non-zero IDs) is ignored.
+// Returns the traceparent to send downstream and the trace ID used as request ID.
+func traceParentFor(c *fiber.Ctx) (string, string) {
+	parts := strings.Split(strings.TrimSpace(c.Get("traceparent")), "-")
+	if len(parts) == 4 && parts[0] == "00" && isTraceID(parts[1], 32) && isTraceID(parts[2], 16) &&
+		len(parts[3]) == 2 && isLowerHex(parts[3]) {
+		return fmt.Sprintf("00-%s-%s-%s", parts[1], randomHex(8), parts[3]), parts[1]
+	}
+
+	traceID := strings.ReplaceAll(strings.ToLower(c.Get("X-Request-ID")), "-", "")
+	if !isTraceID(traceID, 32) {
+		traceID = randomHex(16)
+	}
+	flags := "00"
+	if mrand.Float64() < traceSampleRate {
+		flags = "01"
+	}
+	return fmt.Sprintf("00-%s-%s-%s", traceID, randomHex(8), flags), traceID
 }
 
 // RateLimit middleware implementation
@@ -151,7 +207,9 @@ func ChatHandler(c *fiber.Ctx) error {
 	}
 
 	// Call Flask AI bridge (Phase 7: HTTP Bridge)
-	flaskResponse, err := callFlaskChatService(req)
+	traceParent, requestID := traceParentFor(c)
+	c.Set("X-Request-ID", requestID)
+	flaskResponse, err := callFlaskChatService(req, traceParent)
 	if err != nil {
 		log.Printf("❌ Flask service error: %v", err)
 		return c.Status(fiber.StatusServiceUnavailable).JSON(fiber.Map{
@@ -164,7 +222,8 @@ func ChatHandler(c *fiber.Ctx) error {
 }
 
 // callFlaskChatService forwards request to Flask AI bridge (Phase 7)
-func callFlaskChatService(req ChatRequest) (ChatResponse, error) {
+// traceParent is propagated so the bridge's spans join the same trace
+func callFlaskChatService(req ChatRequest, traceParent string) (ChatResponse, error) {
 	flaskURL := os.Getenv("PYTHON_SERVICE_URL")
 	if flaskURL == "" {
 		flaskURL = "http://localhost:5000"
@@ -190,20 +249,25 @@ func callFlaskChatService(req ChatRequest) (ChatResponse, error) {
 	}
 
 	httpReq.Header.Set("Content-Type", "application/json")
+	httpReq.Header.Set("traceparent", traceParent)
+	httpReq.Header.Set("X-Request-ID", strings.Split(traceParent, "-")[1])
 
 	// Execute request with timeout
 	client := &http.Client{
 		Timeout: 60 * time.Second,
 	}
 
+	start := time.Now()
 	httpResp, err := client.Do(httpReq)
 	if err != nil {
+		log.Printf("⏱️ callFlaskChatService failed after %v (traceparent %s)", time.Since(start), traceParent)
 		return ChatResponse{}, fmt.Errorf("Flask service unreachable (%s): %v", flaskURL, err)
 	}
 	defer httpResp.Body.Close()
 
 	// Read response body
 	respBody, err := io.ReadAll(httpResp.Body)
+	log.Printf("⏱️ callFlaskChatService took %v (status %d, traceparent %s)", time.Since(start), httpResp.StatusCode, traceParent)
 	if err != nil {
 		return ChatResponse{}, fmt.Errorf("response read error: %v", err)
 	}
@@ -325,15 +389,50 @@ func ConversationHistoryHandler(c *fiber.Ctx) error {
 	})
 }
 
-// Statistics endpoint
+// Statistics endpoint - proxies the AI bridge's live usage statistics
 func StatsHandler(c *fiber.Ctx) error {
-	return c.Status(fiber.StatusOK).JSON(fiber.Map{
-		"total_chats": 1234,
-		"active_users": 45,
-		"avg_response_time": "1.2s",
-		"uptime_hours": 168,
-		"timestamp": time.Now().Unix(),
-	})
+	flaskURL := os.Getenv("PYTHON_SERVICE_URL")
+	if flaskURL == "" {
+		flaskURL = "http://localhost:5000"
+	}
+
+	statsURL := flaskURL + "/api/v1/stats"
+	if top := c.Query("top"); top != "" {
+		statsURL += "?" + url.Values{"top": {top}}.Encode()
+	}
+
+	httpReq, err := http.NewRequest("GET", statsURL, nil)
+	if err != nil {
+		return c.Status(fiber.StatusInternalServerError).JSON(fiber.Map{
+			"error": "Stats request creation error",
+		})
+	}
+	traceParent, requestID := traceParentFor(c)
+	httpReq.Header.Set("traceparent", traceParent)
+	c.Set("X-Request-ID", requestID)
+
+	client := &http.Client{
+		Timeout: 5 * time.Second,
+	}
+	httpResp, err := client.Do(httpReq)
+	if err != nil {
+		log.Printf("❌ Stats unavailable: %v", err)
+		return c.Status(fiber.StatusServiceUnavailable).JSON(fiber.Map{
+			"error":   "AI service temporarily unavailable",
+			"message": err.Error(),
+		})
+	}
+	defer httpResp.Body.Close()
+
+	body, err := io.ReadAll(httpResp.Body)
+	if err != nil {
+		return c.Status(fiber.StatusBadGateway).JSON(fiber.Map{
+			"error": "Stats response read error",
+		})
+	}
+
+	c.Set(fiber.HeaderContentType, fiber.MIMEApplicationJSON)
+	return c.Status(httpResp.StatusCode).Send(body)
 }
 
 // Security headers middleware
@@ -362,7 +461,7 @@ func main() {
 	app.Use(cors.New(cors.Config{
 		AllowOrigins: os.Getenv("ALLOWED_ORIGINS"),
 		AllowMethods: "GET,POST,PUT,DELETE",
-		AllowHeaders: "Content-Type,Authorization",
+		AllowHeaders: "Content-Type,Authorization,traceparent,X-Request-ID",
 	}))
 
 	// Rate limiter: 100 requests per 15 minutes per IP
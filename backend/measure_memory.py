@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Memory Footprint of the Pre-fork Server
+Starts backend/prefork.py with and without preloading, sends a little traffic
+to every worker, and reads each process's /proc/<pid>/smaps_rollup (Linux).
+
+    RSS  resident pages, shared ones counted in full by every process
+    PSS  shared pages split between the processes that map them (sums to the real total)
+    USS  pages private to the process: what one more worker costs
+
+Usage (same working directory as ai_bridge.py):
+    python backend/measure_memory.py --workers 4
+    python backend/measure_memory.py --workers 4 --binary-data --output memory.json
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Dict, List
+
+PREFORK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prefork.py')
+WARMUP_PATHS = ('/health', '/api/v1/providers', '/api/v1/product-search?q=sofa', '/metrics')
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    """RSS, PSS and USS of a process in kB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def child_pids(parent: int) -> List[int]:
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # Fields after the parenthesized command name: state, ppid, ...
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def wait_ready(port: int, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def warm_up(port: int, requests: int):
+    """Traffic spread over the workers so each has served real requests before measuring"""
+    for i in range(requests):
+        path = WARMUP_PATHS[i % len(WARMUP_PATHS)]
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}{path}', timeout=10) as response:
+                response.read()
+        except OSError:
+            pass
+
+
+def measure(workers: int, port: int, preload: bool, binary_data: bool, requests: int,
+            timeout: float) -> Dict:
+    cmd = [sys.executable, PREFORK, '--host', '127.0.0.1', '--port', str(port), '--workers', str(workers)]
+    if not preload:
+        cmd.append('--no-preload')
+    if binary_data:
+        cmd.append('--binary-data')
+    master = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port, timeout):
+            raise RuntimeError(f"server on port {port} did not become ready in {timeout}s")
+        # Every worker has imported the bridge once all of them are listed and answering
+        deadline = time.time() + timeout
+        while len(child_pids(master.pid)) < workers and time.time() < deadline:
+            time.sleep(0.2)
+        warm_up(port, requests)
+        time.sleep(0.5)
+        pids = child_pids(master.pid)
+        per_worker = [memory_kb(pid) for pid in pids]
+        parent = memory_kb(master.pid)
+    finally:
+        master.send_signal(signal.SIGTERM)
+        try:
+            master.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            master.kill()
+
+    def mean(key):
+        return round(sum(m[key] for m in per_worker) / max(1, len(per_worker)))
+
+    return {
+        'mode': 'preload' if preload else 'no-preload',
+        'workers': len(per_worker),
+        'master_kb': parent,
+        'worker_rss_kb': mean('rss'),
+        'worker_pss_kb': mean('pss'),
+        'worker_uss_kb': mean('uss'),
+        'total_pss_kb': parent['pss'] + sum(m['pss'] for m in per_worker),
+    }
+
+
+def _mb(kb: int) -> str:
+    return f"{kb / 1024:.1f} MB"
+
+
+if __name__ == '__main__':
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print("❌ /proc/<pid>/smaps_rollup not available (Linux 4.14+ required)")
+        raise SystemExit(1)
+
+    parser = argparse.ArgumentParser(description="Compare worker memory with and without pre-fork preloading")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--requests', type=int, default=50, help="Warm-up requests before measuring")
+    parser.add_argument('--binary-data', action='store_true', help="Preload mode also uses .xbs data twins")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Seconds to wait for workers to start")
+    parser.add_argument('--output', help="Write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for preload in (False, True):
+        result = measure(args.workers, args.port, preload, args.binary_data and preload,
+                         args.requests, args.timeout)
+        results.append(result)
+        print(f"📊 {result['mode']:>10}: {result['workers']} workers, per worker RSS "
+              f"{_mb(result['worker_rss_kb'])} / PSS {_mb(result['worker_pss_kb'])} / "
+              f"USS {_mb(result['worker_uss_kb'])}, total PSS {_mb(result['total_pss_kb'])}")
+
+    baseline, preloaded = results
+    if preloaded['worker_uss_kb']:
+        print(f"✅ Each additional worker costs {_mb(preloaded['worker_uss_kb'])} instead of "
+              f"{_mb(baseline['worker_uss_kb'])} "
+              f"({baseline['worker_uss_kb'] / preloaded['worker_uss_kb']:.1f}x less); total PSS "
+              f"{_mb(baseline['total_pss_kb'])} -> {_mb(preloaded['total_pss_kb'])}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.output}")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Server for the Flask AI Bridge
+The parent imports every module ai_bridge.py imports and loads the read-only
+data (parsed catalog, product matcher, ResNet weights) once, moves it out of
+the garbage collector's reach with gc.freeze(), then forks workers that share
+those pages copy-on-write and serve ai_bridge.app on one listening socket.
+
+Services that own threads or sockets (LLM event loop, batchers) are created
+by each worker when it imports ai_bridge after the fork. Async image jobs are
+disabled: their state would not be shared between the workers.
+
+Usage (same working directory as ai_bridge.py):
+    python backend/prefork.py --workers 4 --port 5000
+    python backend/prefork.py --workers 4 --binary-data   # also share data through mmapped .xbs twins
+"""
+
+import argparse
+import ast
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+AI_DIR = os.path.normpath(os.path.join(BACKEND_DIR, '..', 'ai'))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, AI_DIR)
+
+# Same relative paths ai_bridge.py opens
+CATALOG_PATH = 'data/products_catalog.json'
+QA_PATH = 'data/qa_sft_dataset.json'
+
+# Imported by third-party code only when a client is built, so invisible in our sources
+LAZY_DEPENDENCIES = ('httpcore',)
+
+# A worker dying sooner than this after its start is respawned only after a pause
+MIN_WORKER_LIFETIME = 1.0
+
+
+def bridge_imports() -> List[str]:
+    """
+    Modules imported anywhere in ai_bridge.py and, transitively, in the repo's
+    own modules it uses (including imports inside functions, like the provider
+    SDKs the LLM clients load lazily). Read from source, so the list never drifts.
+    """
+    names: List[str] = []
+    seen = set()
+    pending = [os.path.join(BACKEND_DIR, 'ai_bridge.py')]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules = [node.module]
+            else:
+                continue
+            for name in modules:
+                names.append(name)
+                for directory in (BACKEND_DIR, AI_DIR):
+                    local = os.path.join(directory, name.split('.')[0] + '.py')
+                    if os.path.exists(local):
+                        pending.append(local)
+    return list(dict.fromkeys(names))
+
+
+def preload(binary_data: bool = False) -> Dict[str, object]:
+    """Import the bridge's modules and load the shared read-only data; returns what was loaded"""
+    started = time.perf_counter()
+    loaded: Dict[str, object] = {}
+
+    if binary_data:
+        # mmapped column stores are shared through the page cache, even by workers
+        # that reload the data after a change
+        from binary_store import convert, resolve_path
+        for path in (CATALOG_PATH, QA_PATH):
+            if os.path.exists(path) and resolve_path(path) == path:
+                convert(path)
+                print(f"💾 Wrote binary twin of {path}")
+
+    modules, missing = 0, []
+    for name in bridge_imports() + list(LAZY_DEPENDENCIES):
+        try:
+            importlib.import_module(name)
+            modules += 1
+        except ImportError:
+            # Optional dependencies (torch, other provider SDKs) the workers will not use either
+            missing.append(name)
+    loaded['modules'] = modules
+    if missing:
+        print(f"⚠️  Not preloaded (not installed): {', '.join(missing)}")
+
+    from catalog import load_catalog
+    from product_matcher import get_product_matcher
+    # load_catalog and get_product_matcher cache per process, so the workers'
+    # SystemPromptBuilder and matcher lookups hit these objects. The tracer the
+    # catalog span creates here is dropped in each worker after the fork (see tracing)
+    products = load_catalog(CATALOG_PATH)
+    get_product_matcher(products)
+    loaded['products'] = len(products)
+
+    if os.getenv('ENABLE_IMAGE_DETECTION', 'false').lower() == 'true':
+        import image_detector
+        if image_detector.PYTORCH_AVAILABLE and not image_detector.torch.cuda.is_available():
+            image_detector.preload_model()
+            loaded['model'] = 'resnet50'
+        else:
+            # CUDA cannot be initialized before fork; each worker loads its own model
+            print("⚠️  ResNet weights not preloaded (PyTorch missing or CUDA device)")
+
+    loaded['seconds'] = round(time.perf_counter() - started, 2)
+    return loaded
+
+
+def listen(host: str, port: int, backlog: int = 128) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, host: str, port: int):
+    """Child process: build the per-process services and serve until terminated"""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl+C reaches the whole process group; the master decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    gc.enable()
+    from werkzeug.serving import make_server
+    import ai_bridge
+    ai_bridge.install_profiler_signal()
+    server = make_server(host, port, ai_bridge.app, threaded=True, fd=sock.fileno())
+    server.serve_forever()
+
+
+def serve(host: str, port: int, workers: int, preload_data: bool = True, binary_data: bool = False):
+    # Async image jobs live in one worker's memory, so a poll routed to another worker
+    # would 404, and every worker would start its own analysis pool. Uploads are analyzed
+    # synchronously instead (load_dotenv in the workers does not override this)
+    if os.getenv('IMAGE_JOB_WORKERS', '2') != '0':
+        print("⚠️  Async image jobs are disabled in pre-fork mode (IMAGE_JOB_WORKERS=0)")
+    os.environ['IMAGE_JOB_WORKERS'] = '0'
+    sock = listen(host, port)
+    if preload_data:
+        # No collections while the shared objects are being allocated, then park them
+        # in the permanent generation so the workers' collectors never write to their pages
+        gc.disable()
+        loaded = preload(binary_data)
+        gc.freeze()
+        print(f"📦 Preloaded {loaded} (frozen objects: {gc.get_freeze_count()})")
+
+    children: Dict[int, float] = {}  # pid -> start time
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, host, port)
+            finally:
+                os._exit(0)
+        children[pid] = time.time()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"🚀 Pre-fork AI Bridge on {host}:{port} with {workers} worker(s) "
+          f"({'preloaded' if preload_data else 'no preload'})")
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"⚠️  Worker {pid} exited ({os.waitstatus_to_exitcode(status)}); restarting")
+        if time.time() - started < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME)
+        if not stopping:
+            spawn()
+    sock.close()
+    print("✅ Pre-fork server stopped")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the AI bridge from pre-forked workers sharing read-only data")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('FLASK_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('BRIDGE_WORKERS', 2)))
+    parser.add_argument('--no-preload', action='store_true',
+                        help="Fork first and let every worker load everything itself (baseline)")
+    parser.add_argument('--binary-data', action='store_true',
+                        help="Write .xbs twins of the catalog and QA data so workers mmap them")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, max(1, args.workers), preload_data=not args.no_preload,
+          binary_data=args.binary_data)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Offline Load Benchmark for the Flask AI Bridge
+Drives backend/ai_bridge.py in-process against fake LLM providers and reports
+throughput, p50/p95/p99 latency and time-to-first-token as diffable JSON
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'backend'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'ai'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fakes import FakeProfile, FakeGeminiClient, FakeDeepSeekClient, FakeOpenAIServer
+
+CHAT_MESSAGE = "Saya mencari sofa yang nyaman untuk ruang tamu modern dengan budget Rp 5 juta."
+
+
+def llm_ok(resp, field: str) -> bool:
+    """200 and not one of the clients' in-band '❌ ...' error strings"""
+    if resp.status_code != 200:
+        return False
+    return not str((resp.get_json() or {}).get(field, '')).startswith('❌')
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        'p50': round(percentile(values, 50), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'mean': round(sum(values) / len(values), 2) if values else 0.0,
+        'max': round(values[-1], 2) if values else 0.0,
+    }
+
+
+def build_scenarios() -> Dict[str, Callable]:
+    """Scenario name -> fn(client) returning (ok, ttft_seconds or None)"""
+
+    def chat(provider: str, stream: bool):
+        def run(client):
+            payload = {'message': CHAT_MESSAGE, 'provider': provider, 'stream': stream}
+            if not stream:
+                resp = client.post('/api/v1/chat', json=payload)
+                return llm_ok(resp, 'message'), None
+
+            started = time.perf_counter()
+            resp = client.post('/api/v1/chat', json=payload, buffered=False)
+            ttft, text = None, ''
+            for line in resp.response:
+                if ttft is None and line.strip():
+                    ttft = time.perf_counter() - started
+                if line.strip():
+                    text += json.loads(line).get('chunk', '')
+            resp.close()
+            return resp.status_code == 200 and ttft is not None and '❌' not in text, ttft
+        return run
+
+    def product_search(client):
+        resp = client.get('/api/v1/product-search?q=sofa&max_price=6000000')
+        return resp.status_code == 200, None
+
+    def recommendations(client):
+        resp = client.post('/api/v1/recommendations', json={
+            'budget': 5000000, 'style': 'modern', 'room': 'living room',
+            'priorities': ['comfort', 'durability'], 'provider': 'deepseek',
+        })
+        return llm_ok(resp, 'recommendations'), None
+
+    def comparison(client):
+        resp = client.post('/api/v1/comparison', json={'product_ids': [1, 3, 5], 'provider': 'deepseek'})
+        return llm_ok(resp, 'comparison'), None
+
+    return {
+        'chat_deepseek': chat('deepseek', False),
+        'chat_deepseek_stream': chat('deepseek', True),
+        # Run with LLM_COALESCE on: concurrent identical messages share one upstream call
+        'chat_deepseek_coalesced': chat('deepseek', False),
+        'chat_gemini': chat('gemini', False),
+        'chat_openai_http': chat('openai', False),
+        'chat_openai_http_stream': chat('openai', True),
+        'product_search': product_search,
+        'recommendations': recommendations,
+        'comparison': comparison,
+    }
+
+
+def run_scenario(app, fn: Callable, requests: int, concurrency: int) -> Dict:
+    """Fire `requests` calls from `concurrency` threads and aggregate timings"""
+    latencies, ttfts, errors = [], [], []
+
+    def one(_):
+        client = app.test_client()
+        started = time.perf_counter()
+        try:
+            ok, ttft = fn(client)
+        except Exception as e:
+            return False, None, time.perf_counter() - started, repr(e)
+        return ok, ttft, time.perf_counter() - started, None
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for ok, ttft, elapsed, error in pool.map(one, range(requests)):
+            if ok:
+                latencies.append(elapsed * 1000)
+                if ttft is not None:
+                    ttfts.append(ttft * 1000)
+            else:
+                errors.append(error or 'error response')
+    wall = time.perf_counter() - wall_start
+
+    result = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'latency_ms': summarize(latencies),
+    }
+    if ttfts:
+        result['ttft_ms'] = summarize(ttfts)
+    if errors:
+        result['first_error'] = errors[0][:300]
+    return result
+
+
+def coalesced_calls() -> float:
+    from llm_client import LLM_COALESCED
+    return sum(child.value() for _, child in LLM_COALESCED.children())
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def compare(current: Dict, baseline: Dict):
+    """Print p50/p99/throughput deltas against a previous report"""
+    print(f"\n📊 vs baseline {baseline['meta'].get('commit')}:")
+    for name, result in current['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if not old:
+            continue
+        for label, new_value, old_value in [
+            ('p50', result['latency_ms']['p50'], old['latency_ms']['p50']),
+            ('p99', result['latency_ms']['p99'], old['latency_ms']['p99']),
+            ('rps', result['throughput_rps'], old['throughput_rps']),
+        ]:
+            delta = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(f"   {name:26s} {label:4s} {old_value:10.2f} -> {new_value:10.2f} ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI bridge against fake LLM providers")
+    parser.add_argument('--requests', type=int, default=100, help="Requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=200.0, help="Fake provider time to first token")
+    parser.add_argument('--tokens-per-sec', type=float, default=50.0, help="Fake provider token rate")
+    parser.add_argument('--response-tokens', type=int, default=60)
+    parser.add_argument('--scenarios', nargs='*', help="Subset of scenarios to run (default: all)")
+    parser.add_argument('--output', help="Write the JSON report here (default: stdout)")
+    parser.add_argument('--compare', help="Previous report to diff against")
+    args = parser.parse_args()
+
+    profile = FakeProfile(args.latency_ms, args.tokens_per_sec, args.response_tokens)
+
+    # The bridge reads its catalog relative to the working directory and must not
+    # pick up real API keys
+    os.chdir(REPO_ROOT)
+    for key in ('GEMINI_API_KEY', 'DEEPSEEK_API_KEY', 'OPENAI_API_KEY'):
+        os.environ[key] = ''
+    os.environ['ENABLE_IMAGE_DETECTION'] = 'false'
+    # Every scenario repeats one payload; with coalescing, concurrent requests would share
+    # upstream calls and reports from before and after LLM_COALESCE would not be comparable
+    os.environ['LLM_COALESCE'] = 'false'
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    with FakeOpenAIServer(profile) as server:
+        import ai_bridge
+        from llm_client import OpenAIClient
+        from http_transport import transport_stats
+
+        ai_bridge.llm_manager.clients = {
+            'deepseek': FakeDeepSeekClient(profile),
+            'gemini': FakeGeminiClient(profile),
+            'openai': OpenAIClient(api_key='fake-key', base_url=server.base_url),
+        }
+
+        scenarios = build_scenarios()
+        selected = args.scenarios or list(scenarios)
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+                'profile': vars(profile),
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+            },
+            'scenarios': {},
+        }
+        for name in selected:
+            print(f"⏱️  {name}...", file=sys.stderr)
+            ai_bridge.llm_manager.coalesce = name.endswith('_coalesced')
+            coalesced = coalesced_calls()
+            report['scenarios'][name] = run_scenario(ai_bridge.app, scenarios[name],
+                                                     args.requests, args.concurrency)
+            # Requests answered by another request's upstream call
+            report['scenarios'][name]['coalesced'] = int(coalesced_calls() - coalesced)
+        report['transport'] = transport_stats()
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"💾 Report saved to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
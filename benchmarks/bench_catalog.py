@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Catalog Micro-Benchmarks
+Times prompt building, product search and recommendation prompt assembly on
+synthetic catalogs (10 to 100k products) and flags regressions against a baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'ai'))
+
+from catalog import filter_products
+from system_prompt import SystemPromptBuilder, PromptTemplateLibrary
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'catalog.json')
+CUSTOMER_CONTEXT = {
+    'budget': 5000000,
+    'style': 'modern',
+    'room': 'ruang tamu',
+    'priorities': ['kenyamanan', 'ketahanan'],
+    'previous_interest': 'Sofa Modern Minimalis',
+}
+
+
+def synthetic_catalog(size: int, seed: int = 42) -> Dict:
+    """Catalog dict with `size` products in the products_catalog.json schema"""
+    with open(os.path.join(REPO_ROOT, 'data', 'products_catalog.json'), 'r', encoding='utf-8') as f:
+        templates = json.load(f)['products']
+
+    rng = random.Random(seed)
+    products = []
+    for i in range(size):
+        template = templates[i % len(templates)]
+        product = json.loads(json.dumps(template))
+        product['id'] = i + 1
+        product['name'] = f"{template['name']} Seri {i // len(templates) + 1}"
+        product['price'] = int(template['price'] * rng.uniform(0.6, 1.6)) // 1000 * 1000
+        products.append(product)
+    return {'products': products}
+
+
+def time_call(fn: Callable, min_time: float, min_repeats: int = 3) -> float:
+    """Median wall time of fn() in ms, repeating until min_time has elapsed"""
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_repeats or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def bench_size(size: int, min_time: float) -> Dict:
+    """All measurements for one catalog size"""
+    catalog = synthetic_catalog(size)
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump(catalog, f, ensure_ascii=False)
+        path = f.name
+
+    try:
+        tracemalloc.start()
+        builder = SystemPromptBuilder(path)
+        catalog_bytes = tracemalloc.get_traced_memory()[0]
+        prompt = builder.build_contextual_prompt(CUSTOMER_CONTEXT)
+        prompt_peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        products = builder.products
+        timings = {
+            'catalog_load_ms': time_call(lambda: SystemPromptBuilder(path), min_time),
+            'product_context_ms': time_call(builder._create_product_context, min_time),
+            'contextual_prompt_ms': time_call(lambda: builder.build_contextual_prompt(CUSTOMER_CONTEXT), min_time),
+            'search_query_ms': time_call(lambda: filter_products(products, query='sofa'), min_time),
+            'search_category_price_ms': time_call(
+                lambda: filter_products(products, category='Kursi', max_price=3000000), min_time),
+            'recommendation_prompt_ms': time_call(
+                lambda: (PromptTemplateLibrary.recommendation_prompt(CUSTOMER_CONTEXT),
+                         builder.build_contextual_prompt(CUSTOMER_CONTEXT)), min_time),
+        }
+    finally:
+        os.remove(path)
+
+    return {
+        **{k: round(v, 4) for k, v in timings.items()},
+        'prompt_chars': len(prompt),
+        'catalog_mem_mb': round(catalog_bytes / 2**20, 3),
+        'prompt_build_peak_mb': round(prompt_peak_bytes / 2**20, 3),
+    }
+
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Timing/memory metrics that grew more than `tolerance` over the baseline"""
+    regressions = []
+    for size, metrics in results['sizes'].items():
+        old = baseline.get('sizes', {}).get(size, {})
+        for name, value in metrics.items():
+            if name == 'prompt_chars' or name not in old or not old[name]:
+                continue
+            change = (value - old[name]) / old[name]
+            if change > tolerance:
+                regressions.append(f"{size:>6} products {name}: {old[name]} -> {value} (+{change:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog and prompt-building micro-benchmarks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--min-time', type=float, default=0.2, help="Seconds spent per measurement")
+    parser.add_argument('--output', help="Write results JSON here (default: stdout)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before flagging (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    results = {'sizes': {}}
+    for size in args.sizes:
+        print(f"⏱️  {size} products...", file=sys.stderr)
+        results['sizes'][str(size)] = bench_size(size, args.min_time)
+
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"💾 Baseline saved to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️  No baseline at {args.baseline}; run with --save-baseline to create one", file=sys.stderr)
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        regressions = find_regressions(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) over {args.tolerance:.0%}:", file=sys.stderr)
+        for line in regressions:
+            print(f"   {line}", file=sys.stderr)
+        return 1
+
+    print("✅ No regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Offline LLM Provider Fakes for Benchmarks
+OpenAI-compatible HTTP server plus in-process Gemini/DeepSeek clients
+with configurable latency and token rate
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import AsyncGenerator, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ai'))
+
+from llm_client import LLMClient
+from token_accounting import CallUsage, estimate_tokens
+
+FAKE_ANSWER = (
+    "Saya merekomendasikan Sofa Modern Minimalis dengan harga Rp 4.500.000. "
+    "Sofa ini menggunakan fabric dengan inner spring, berkapasitas 3-4 orang, "
+    "mudah dibersihkan dan tersedia dalam warna abu-abu maupun cokelat. "
+    "Dimensinya 200cm x 80cm x 85cm sehingga cocok untuk ruang tamu modern. "
+    "Apakah Anda ingin saya bandingkan dengan pilihan lain dalam budget Anda?"
+).split(' ')
+
+
+@dataclass
+class FakeProfile:
+    """Simulated provider behaviour"""
+    latency_ms: float = 200.0      # time to first token
+    tokens_per_sec: float = 50.0   # streaming rate after the first token
+    response_tokens: int = 60      # tokens per answer
+
+    def tokens(self, max_tokens: Optional[int] = None):
+        count = min(self.response_tokens, max_tokens or self.response_tokens)
+        return [FAKE_ANSWER[i % len(FAKE_ANSWER)] + ' ' for i in range(count)]
+
+    def total_seconds(self, max_tokens: Optional[int] = None) -> float:
+        return self.latency_ms / 1000 + max(len(self.tokens(max_tokens)) - 1, 0) / self.tokens_per_sec
+
+
+class FakeLLMClient(LLMClient):
+    """In-process provider fake: sleeps instead of calling an API"""
+
+    provider = 'fake'
+
+    def __init__(self, profile: FakeProfile = None, model_name: str = None):
+        super().__init__('fake-key', model_name or f'{self.provider}-fake')
+        self.profile = profile or FakeProfile()
+
+    async def chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                   usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                   stop: Optional[List[str]] = None) -> str:
+        await asyncio.sleep(self.profile.total_seconds(max_tokens))
+        return ''.join(self.profile.tokens(max_tokens)).strip()
+
+    async def stream_chat(self, message: str, system_prompt: str = None, max_tokens: int = 500,
+                          usage: Optional[CallUsage] = None, temperature: float = 0.7,
+                          stop: Optional[List[str]] = None) -> AsyncGenerator:
+        await asyncio.sleep(self.profile.latency_ms / 1000)
+        for i, token in enumerate(self.profile.tokens(max_tokens)):
+            if i:
+                await asyncio.sleep(1 / self.profile.tokens_per_sec)
+            yield token
+
+
+class FakeGeminiClient(FakeLLMClient):
+    provider = 'gemini'
+
+
+class FakeDeepSeekClient(FakeLLMClient):
+    provider = 'deepseek'
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """POST /v1/chat/completions (streaming and non-streaming)"""
+
+    protocol_version = 'HTTP/1.1'
+    profile = FakeProfile()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        model = body.get('model', 'fake-model')
+        tokens = self.profile.tokens(body.get('max_tokens'))
+        created = int(time.time())
+        prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in body.get('messages', []))
+        usage = {'prompt_tokens': prompt_tokens, 'completion_tokens': len(tokens),
+                 'total_tokens': prompt_tokens + len(tokens)}
+
+        time.sleep(self.profile.latency_ms / 1000)
+
+        if not body.get('stream'):
+            time.sleep(max(len(tokens) - 1, 0) / self.profile.tokens_per_sec)
+            payload = json.dumps({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens).strip()},
+                    'finish_reason': 'stop',
+                }],
+                'usage': usage,
+            }).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send_event(data: str):
+            event = f"data: {data}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(event):x}\r\n".encode('ascii') + event + b"\r\n")
+            self.wfile.flush()
+
+        for i, token in enumerate(tokens + [None]):
+            if i:
+                time.sleep(1 / self.profile.tokens_per_sec)
+            delta = {'content': token} if token is not None else {}
+            send_event(json.dumps({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': None if token else 'stop'}],
+            }))
+        if (body.get('stream_options') or {}).get('include_usage'):
+            send_event(json.dumps({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [],
+                'usage': usage,
+            }))
+        send_event('[DONE]')
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FakeOpenAIServer:
+    """Local OpenAI-compatible server running in a background thread"""
+
+    def __init__(self, profile: FakeProfile = None, host: str = '127.0.0.1', port: int = 0):
+        handler = type('Handler', (_FakeOpenAIHandler,), {'profile': profile or FakeProfile()})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake OpenAI-compatible server")
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=200.0)
+    parser.add_argument('--tokens-per-sec', type=float, default=50.0)
+    parser.add_argument('--response-tokens', type=int, default=60)
+    args = parser.parse_args()
+
+    profile = FakeProfile(args.latency_ms, args.tokens_per_sec, args.response_tokens)
+    with FakeOpenAIServer(profile, port=args.port) as server:
+        print(f"🧪 Fake OpenAI server on {server.base_url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,26 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'backend'))
+sys.path.insert(0, os.path.join(ROOT, 'ai'))
+
+
+def _load(name):
+    with open(os.path.join(ROOT, 'data', name), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def catalog():
+    """data/products_catalog.json as parsed JSON"""
+    return _load('products_catalog.json')
+
+
+@pytest.fixture
+def qa_dataset():
+    """data/qa_sft_dataset.json as parsed JSON"""
+    return _load('qa_sft_dataset.json')
@@ -0,0 +1,183 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from binary_store import (BinaryStore, RecordList, binary_twin, convert, load_document, resolve_path,
+                          write_store)
+from catalog import filter_products, load_catalog
+
+
+def write_json(path, document):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False)
+    return str(path)
+
+
+def analysis_rows():
+    """image_indexer shard records: analyzed, failed and partially filled rows"""
+    return [
+        {'product_id': 1, 'product_name': 'Sofa Modern Minimalis', 'image_path': 'images/sofa.jpg',
+         'analysis': {'status': 'analyzed',
+                      'style': {'modern': 0.7, 'classic': 0.1, 'rustic': 0.1, 'minimalist': 0.1},
+                      'material': {'wood': 0.2, 'fabric': 0.8}, 'confidence': 0.7,
+                      'dominant_colors': [[120, 110, 100], [30, 30, 30]], 'dominant_weights': [0.6, 0.4]}},
+        {'product_id': 2, 'product_name': 'Meja Makan Kayu', 'image_path': 'images/missing.jpg',
+         'analysis': {'error': 'Image not found: images/missing.jpg'}},
+        {'product_id': None, 'product_name': 'Kursi Kantor', 'image_path': 'images/chair.jpg',
+         'analysis': {'status': 'failed', 'style': {}, 'material': {}, 'confidence': 0.0,
+                      'dominant_colors': [], 'dominant_weights': []}},
+    ]
+
+
+def test_catalog_round_trip(tmp_path, catalog):
+    source = write_json(tmp_path / 'products_catalog.json', catalog)
+    target = convert(source)
+
+    document = BinaryStore(target).document()
+    assert isinstance(document['products'], RecordList)
+    assert document['products'].to_list() == catalog['products']
+    assert convert(target, str(tmp_path / 'back.json')) == str(tmp_path / 'back.json')
+    with open(tmp_path / 'back.json', 'r', encoding='utf-8') as f:
+        assert json.load(f) == catalog
+
+
+def test_qa_round_trip_keeps_metadata(tmp_path, qa_dataset):
+    target = str(tmp_path / 'qa.xbs')
+    write_store(target, qa_dataset)
+
+    store = BinaryStore(target)
+    document = store.document()
+    assert list(document) == list(qa_dataset)
+    assert document['metadata'] == qa_dataset['metadata']
+    assert list(document['qa_pairs']) == qa_dataset['qa_pairs']
+    assert store.column('id').tolist() == [pair['id'] for pair in qa_dataset['qa_pairs']]
+
+
+def test_analysis_rows_with_missing_and_null_fields(tmp_path):
+    rows = analysis_rows()
+    target = str(tmp_path / 'shard-00000.xbs')
+    write_store(target, rows)
+
+    store = BinaryStore(target)
+    records = store.records
+    # Random access (row decoder) and iteration (column decoder) give the same rows
+    assert [records[i] for i in range(len(rows))] == rows
+    assert BinaryStore(target).records.to_list() == rows
+    assert records[2]['product_id'] is None
+    assert 'style' not in records[1]['analysis']
+
+
+def test_sparse_columns_are_not_flat(tmp_path):
+    target = str(tmp_path / 'shard.xbs')
+    write_store(target, analysis_rows())
+    store = BinaryStore(target)
+
+    assert store.column('image_path')[0] == 'images/sofa.jpg'
+    with pytest.raises(ValueError):
+        store.column('product_id')          # null in one row
+    with pytest.raises(ValueError):
+        store.column('analysis.confidence')  # absent in one row
+    with pytest.raises(KeyError):
+        store.column('analysis.nonexistent')
+
+
+def test_float_dicts_become_matrices(tmp_path):
+    rows = [{'style': {'modern': 0.9, 'classic': 0.1}}, {'style': {'modern': 0.2, 'classic': 0.8}}]
+    target = str(tmp_path / 'styles.xbs')
+    write_store(target, rows)
+    store = BinaryStore(target)
+
+    assert store.labels('style') == ['modern', 'classic']
+    np.testing.assert_allclose(store.column('style'), [[0.9, 0.1], [0.2, 0.8]])
+    assert store.records.to_list() == rows
+
+
+def test_irregular_values_round_trip(tmp_path):
+    rows = [
+        {'price': 1, 'flag': True, 'tags': ['a'], 'ids': [1, 2], 'extra': {'x': 1}},
+        {'price': 2.5, 'flag': False, 'tags': [], 'ids': [], 'extra': None},
+        {'price': None, 'tags': ['b', 'c'], 'ids': [3], 'note': 'only here'},
+    ]
+    target = str(tmp_path / 'mixed.xbs')
+    write_store(target, rows)
+    decoded = BinaryStore(target).records.to_list()
+
+    assert decoded == rows
+    # Mixed int/float is kept as JSON, so 1 does not come back as 1.0
+    assert type(decoded[0]['price']) is int
+
+
+def test_record_identity(tmp_path, catalog):
+    target = str(tmp_path / 'catalog.xbs')
+    write_store(target, catalog)
+    records = BinaryStore(target).records
+
+    first = records[0]
+    assert records[0] is first
+    rows = list(records)
+    # Rows handed out before iteration keep their identity
+    assert rows[0] is first
+    assert rows[1] is records[1]
+    assert records[-1] is rows[-1]
+    assert records[1:3] == rows[1:3]
+
+
+def test_filter_products_on_columns(tmp_path, catalog):
+    target = str(tmp_path / 'catalog.xbs')
+    write_store(target, catalog)
+    records = BinaryStore(target).records
+    products = catalog['products']
+
+    for query, category, max_price in [('', '', None), ('sofa', '', None), ('', 'sofa', None),
+                                       ('', '', 3000000), ('MEJA', '', 5000000), ('zzz', '', None)]:
+        assert filter_products(records, query, category, max_price) == \
+            filter_products(products, query, category, max_price)
+    matched = filter_products(records, 'sofa')
+    assert matched and all(row is records[products.index(row)] for row in matched)
+
+
+def test_filter_products_falls_back_for_irregular_columns(tmp_path, catalog):
+    products = catalog['products']
+    products[0]['price'] = float(products[0]['price'])  # mixed int/float: stored as JSON, no flat column
+    target = str(tmp_path / 'catalog.xbs')
+    write_store(target, catalog)
+    records = BinaryStore(target).records
+
+    with pytest.raises(ValueError):
+        records.store.column('price')
+    assert filter_products(records, '', '', 3000000) == filter_products(products, '', '', 3000000)
+    assert filter_products(records, 'sofa', 'sofa', 10000000) == \
+        filter_products(products, 'sofa', 'sofa', 10000000)
+
+
+def test_twin_used_only_when_current(tmp_path, catalog):
+    source = write_json(tmp_path / 'products_catalog.json', catalog)
+    assert resolve_path(source) == source
+    assert isinstance(load_document(source), dict)
+
+    twin = convert(source)
+    assert twin == binary_twin(source)
+    assert resolve_path(source) == twin
+    assert isinstance(load_catalog(source), RecordList)
+
+    # A JSON edited after the twin was written wins again
+    stat = os.stat(twin)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert resolve_path(source) == source
+    assert load_catalog(source) == catalog['products']
+
+
+def test_rejects_other_files_and_newer_versions(tmp_path, catalog):
+    other = write_json(tmp_path / 'plain.xbs', catalog)
+    with pytest.raises(ValueError):
+        BinaryStore(other)
+
+    target = str(tmp_path / 'catalog.xbs')
+    write_store(target, catalog)
+    with open(target, 'r+b') as f:
+        f.seek(4)
+        f.write((99).to_bytes(4, 'little'))
+    with pytest.raises(ValueError):
+        BinaryStore(target)